@@ -54,6 +54,7 @@ from utils import (
     is_ffmpeg_available, is_ffprobe_available, validate_video_file,
     is_telegram_compatible_video, needs_video_processing,
     compress_video_for_telegram, get_video_attributes_and_thumbnail, convert_video_for_recovery,
+    warm_media_binaries,
     
     # Cache and persistence
     CacheManager, ProcessManager, FailedOperationsManager,
@@ -143,7 +144,6 @@ telegram_ops_module.client = client
 # Global state variables
 pending_password = None
 current_processing = None
-semaphore = asyncio.Semaphore(1)  # Will be updated with config
 cancelled_operations = set()
 
 # Interactive login state
@@ -464,6 +464,19 @@ async def handle_torbox_link(event, torbox_url: str):
         await event.reply(f'❌ Error processing Torbox link: {e}')
 
 
+async def enqueue_download(event, download_task):
+    """Queue a download. Returns whether it was the first item, or None if the queue was full (the user is told)."""
+    try:
+        return await queue_manager.add_download_task(download_task)
+    except asyncio.QueueFull as e:
+        logger.warning(f"⏳ {e}")
+        await event.reply(
+            f'⏳ Download queue is full ({queue_manager.download_queue.maxsize} tasks). '
+            f'{download_task.get("filename", "This item")} was not queued - please send it again later.'
+        )
+        return None
+
+
 async def handle_webdav_link(event, webdav_url: str):
     """Queue a WebDAV folder for recursive download and upload."""
     from config import config
@@ -507,7 +520,9 @@ async def handle_webdav_link(event, webdav_url: str):
         'display_name': display_name
     }
 
-    was_first_item = await queue_manager.add_download_task(download_task)
+    was_first_item = await enqueue_download(event, download_task)
+    if was_first_item is None:
+        return
     queue_position = queue_manager.download_queue.qsize()
 
     if status_msg:
@@ -679,7 +694,9 @@ async def watcher(event):
                     await event.reply(f'⏩ Archive {filename} was already processed. Skipping.')
                     return
                 
-                was_first_item = await queue_manager.add_download_task(download_task)
+                was_first_item = await enqueue_download(event, download_task)
+                if was_first_item is None:
+                    return
                 
                 # Check queue position
                 queue_position = queue_manager.download_queue.qsize()
@@ -700,7 +717,9 @@ async def watcher(event):
                     'temp_path': temp_path
                 }
                 
-                was_first_item = await queue_manager.add_download_task(download_task)
+                was_first_item = await enqueue_download(event, download_task)
+                if was_first_item is None:
+                    return
                 
                 # Check queue position
                 queue_position = queue_manager.download_queue.qsize()
@@ -751,6 +770,13 @@ async def main_async():
     """Main async function."""
     logger.info('Starting Telegram Compressed File Extractor...')
     
+    # Python 3.12+: start tasks eagerly so ones that finish without awaiting skip a loop round trip
+    if hasattr(asyncio, 'eager_task_factory'):
+        asyncio.get_running_loop().set_task_factory(asyncio.eager_task_factory)
+    
+    # Page in ffmpeg's libraries while the client logs in
+    warm_media_binaries()
+    
     # Initialize task variables
     save_task = None
     retry_task = None
@@ -819,13 +845,27 @@ async def main_async():
             logger.error(f'Error during cleanup: {e}')
 
 
+def _run_event_loop(coro):
+    """Run the bot on uvloop when it is installed, otherwise on the default asyncio loop."""
+    try:
+        import uvloop
+    except ImportError:
+        return asyncio.run(coro)
+    logger.info('Using uvloop event loop')
+    if hasattr(uvloop, 'run'):
+        return uvloop.run(coro)
+    # uvloop < 0.18 has no run(); install its policy instead
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return asyncio.run(coro)
+
+
 def main():
     """Main entry point."""
     # Ensure only one instance runs at a time
     create_lock_file(LOCK_FILE, logger)
     atexit.register(lambda: remove_lock_file(LOCK_FILE, logger))
     try:
-        asyncio.run(main_async())
+        _run_event_loop(main_async())
     except KeyboardInterrupt:
         logger.info('Bot stopped by user')
     finally:
@@ -316,3 +316,13 @@ def temp_workspace(tmp_path):
 def mock_telegram_client(mock_client):
     """Alias for compatibility with integration tests expecting mock_telegram_client."""
     return mock_client
+
+@pytest.fixture(autouse=True)
+def isolated_probe_cache_db(tmp_path, monkeypatch):
+    """Keep ffprobe results cached on disk in a per-test database, never data/ffprobe_cache.sqlite."""
+    from utils import media_processing
+    monkeypatch.setattr(media_processing, 'PROBE_CACHE_DB', str(tmp_path / 'ffprobe_cache.sqlite'))
+    monkeypatch.setattr(media_processing, '_probe_db', None)
+    yield
+    if media_processing._probe_db:
+        media_processing._probe_db.close()
@@ -6,6 +6,7 @@ Tests file processing cache, process tracking, and persistent storage.
 
 import os
 import json
+import asyncio
 import tempfile
 import pytest
 from unittest.mock import Mock, patch
@@ -405,5 +406,167 @@ class TestProcessManagerIntegration:
             manager.load_processed_archives()
             assert len(manager.processed_archives) == 15
 
+class TestPersistentQueueCoalescing:
+    """Test that queue persistence batches writes inside an event loop"""
+    
+    @pytest.mark.asyncio
+    async def test_burst_of_changes_saved_once(self, tmp_path):
+        """Adds and removes within the flush window share a single save"""
+        from utils.cache_manager import PersistentQueue
+        queue = PersistentQueue(str(tmp_path / 'queue.json'))
+        
+        with patch.object(queue, 'save_queue', wraps=queue.save_queue) as mock_save:
+            for i in range(20):
+                queue.add_item({'id': i})
+            queue.remove_item({'id': 0})
+            assert mock_save.call_count == 0
+            queue.flush()
+        
+        assert mock_save.call_count == 1
+        with open(tmp_path / 'queue.json') as f:
+            assert [item['id'] for item in json.load(f)] == list(range(1, 20))
+    
+    @pytest.mark.asyncio
+    async def test_pending_changes_flushed_after_delay(self, tmp_path):
+        """A scheduled flush writes pending changes without an explicit call"""
+        from utils.cache_manager import PersistentQueue
+        queue = PersistentQueue(str(tmp_path / 'queue.json'))
+        queue.FLUSH_DELAY = 0.01
+        
+        queue.add_item({'id': 1})
+        await asyncio.sleep(0.05)
+        
+        with open(tmp_path / 'queue.json') as f:
+            assert json.load(f) == [{'id': 1}]
+    
+    @pytest.mark.asyncio
+    async def test_scheduled_flush_writes_off_event_loop(self, tmp_path):
+        """The coalesced save is written from a worker thread and never goes back in time"""
+        import threading
+        from utils.cache_manager import PersistentQueue
+        queue = PersistentQueue(str(tmp_path / 'queue.json'))
+        queue.FLUSH_DELAY = 0.01
+        writer_threads = []
+        real_write = queue._write_snapshot
+        
+        def tracking_write(data, seq):
+            writer_threads.append(threading.current_thread())
+            real_write(data, seq)
+        
+        with patch.object(queue, '_write_snapshot', side_effect=tracking_write):
+            queue.add_item({'id': 1})
+            await asyncio.sleep(0.1)
+        
+        assert writer_threads and writer_threads[0].name.startswith('qpersist')
+        stale = queue._snapshot()
+        queue.add_item({'id': 2})
+        queue.flush()
+        queue._write_snapshot(*stale)
+        with open(tmp_path / 'queue.json') as f:
+            assert json.load(f) == [{'id': 1}, {'id': 2}]
+    
+    def test_remove_item_by_identity_and_by_value(self, tmp_path):
+        """The queued object is removed directly; an equal copy still matches by value"""
+        from utils.cache_manager import PersistentQueue
+        queue = PersistentQueue(str(tmp_path / 'queue.json'))
+        first, twin, last = {'id': 1}, {'id': 1}, {'id': 2}
+        queue.add_items([first, twin, last])
+        
+        queue.remove_item(twin)
+        assert [item is first for item in queue.get_items()] == [True, False]
+        
+        queue.remove_item({'id': 2})
+        queue.remove_item({'id': 3})
+        assert queue.get_items() == [{'id': 1}]
+        with open(tmp_path / 'queue.json') as f:
+            assert json.load(f) == [{'id': 1}]
+    
+    def test_changes_saved_immediately_without_loop(self, tmp_path):
+        """Synchronous callers still get write-through persistence"""
+        from utils.cache_manager import PersistentQueue
+        queue = PersistentQueue(str(tmp_path / 'queue.json'))
+        
+        queue.add_item({'id': 1})
+        
+        with open(tmp_path / 'queue.json') as f:
+            assert json.load(f) == [{'id': 1}]
+    
+    def test_add_items_saves_once(self, tmp_path):
+        """A batch of items is persisted with one write"""
+        from utils.cache_manager import PersistentQueue
+        queue = PersistentQueue(str(tmp_path / 'queue.json'))
+        
+        with patch.object(queue, 'save_queue', wraps=queue.save_queue) as mock_save:
+            queue.add_items([{'id': i} for i in range(50)])
+        
+        assert mock_save.call_count == 1
+        with open(tmp_path / 'queue.json') as f:
+            assert [item['id'] for item in json.load(f)] == list(range(50))
+
+
+class TestRetryLog:
+    """Test the append-only retry queue log"""
+    
+    def test_append_does_not_rewrite(self, tmp_path):
+        """Each failed task is one compact line appended to the log"""
+        from utils.cache_manager import append_retry_task, load_retry_tasks
+        retry_file = str(tmp_path / 'retry_queue.json')
+        
+        append_retry_task(retry_file, {'filename': 'a.zip'})
+        append_retry_task(retry_file, {'filename': 'b.zip'})
+        
+        with open(retry_file + '.log') as f:
+            assert f.read() == '{"filename":"a.zip"}\n{"filename":"b.zip"}\n'
+        assert not os.path.exists(retry_file)
+        tasks, _ = load_retry_tasks(retry_file)
+        assert [t['filename'] for t in tasks] == ['a.zip', 'b.zip']
+    
+    def test_compaction_keeps_late_appends(self, tmp_path):
+        """Tasks appended while the queue is processed survive compaction"""
+        from utils.cache_manager import append_retry_task, load_retry_tasks, rewrite_retry_tasks
+        retry_file = str(tmp_path / 'retry_queue.json')
+        append_retry_task(retry_file, {'filename': 'ready.zip'})
+        append_retry_task(retry_file, {'filename': 'waiting.zip'})
+        
+        tasks, offset = load_retry_tasks(retry_file)
+        append_retry_task(retry_file, {'filename': 'late.zip'})
+        rewrite_retry_tasks(retry_file, [tasks[1]], offset)
+        
+        tasks, _ = load_retry_tasks(retry_file)
+        assert [t['filename'] for t in tasks] == ['waiting.zip', 'late.zip']
+    
+    def test_non_json_values_converted(self, tmp_path):
+        """Datetimes and Telethon-style objects go through make_serializable"""
+        import datetime
+        from utils.cache_manager import append_retry_task, load_retry_tasks
+        retry_file = str(tmp_path / 'retry_queue.json')
+        
+        class _Message:
+            def to_dict(self):
+                return {'id': 7, 'date': datetime.datetime(2024, 1, 2, 3, 4, 5)}
+        
+        append_retry_task(retry_file, {'filename': 'a.zip', 'message': _Message(), 'tags': {'x'}})
+        
+        tasks, _ = load_retry_tasks(retry_file)
+        assert tasks == [{'filename': 'a.zip', 'message': {'id': 7, 'date': '2024-01-02T03:04:05'}, 'tags': ['x']}]
+    
+    def test_legacy_array_migrated_and_torn_line_skipped(self, tmp_path):
+        """An old JSON array file is read, then folded into the log"""
+        from utils.cache_manager import load_retry_tasks, rewrite_retry_tasks
+        retry_file = str(tmp_path / 'retry_queue.json')
+        with open(retry_file, 'w') as f:
+            json.dump([{'filename': 'old.zip'}], f)
+        with open(retry_file + '.log', 'w') as f:
+            f.write('{"filename":"new.zip"}\n{"filena')
+        
+        tasks, offset = load_retry_tasks(retry_file)
+        assert [t['filename'] for t in tasks] == ['old.zip', 'new.zip']
+        
+        rewrite_retry_tasks(retry_file, tasks, offset)
+        assert not os.path.exists(retry_file)
+        tasks, _ = load_retry_tasks(retry_file)
+        assert [t['filename'] for t in tasks] == ['old.zip', 'new.zip']
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
\ No newline at end of file
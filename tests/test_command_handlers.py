@@ -9,7 +9,7 @@ from unittest.mock import AsyncMock, patch, Mock
 
 import pytest
 
-from utils.command_handlers import handle_queue_command
+from utils.command_handlers import handle_queue_command, handle_status_command
 
 
 @pytest.fixture
@@ -72,3 +72,30 @@ async def test_handle_queue_command_with_streaming_progress(mock_event, tmp_path
     assert "Streaming Extraction Progress" in reply_text
     assert f"Stream-Extracting: **{archive_name}**" in reply_text
     assert "Progress: 25/150 files (16.7%)" in reply_text
+
+
+@pytest.mark.asyncio
+async def test_handle_status_command_collects_stats_off_loop(mock_event, tmp_path):
+    """
+    Verify that /status gathers its system probes in a worker thread and
+    still reports them in the reply.
+    """
+    log_file = tmp_path / "bot.log"
+    log_file.write_bytes(b"x" * 2048)
+
+    mock_mem = Mock(percent=50.0, used=1024, total=2048)
+    mock_disk = Mock(percent=25.0, used=512, total=2048)
+
+    with patch('utils.command_handlers.LOG_FILE', str(log_file)), \
+         patch('psutil.cpu_percent', return_value=12.5), \
+         patch('psutil.virtual_memory', return_value=mock_mem), \
+         patch('psutil.disk_usage', return_value=mock_disk), \
+         patch('utils.command_handlers.asyncio.to_thread', wraps=asyncio.to_thread) as mock_to_thread:
+        await handle_status_command(mock_event)
+
+    mock_to_thread.assert_called_once()
+    reply_text = mock_event.reply.call_args[0][0]
+    assert "CPU: 12.5%" in reply_text
+    assert "Memory: 50.0%" in reply_text
+    assert "Disk: 25.0%" in reply_text
+    assert "Log Size: 2.00 KB" in reply_text
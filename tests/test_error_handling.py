@@ -369,6 +369,19 @@ class TestNetworkErrorHandling:
         assert connection_type in [NetworkType.WIFI, NetworkType.MOBILE, NetworkType.ETHERNET, 
                                  NetworkType.UNKNOWN, NetworkType.DISCONNECTED]
 
+    def test_connection_type_is_cached_briefly(self):
+        """Repeated detection within the cache window reuses the last probe"""
+        monitor = NetworkMonitor()
+        
+        with patch.object(monitor, '_probe_connection_type', return_value=NetworkType.WIFI) as probe:
+            assert monitor.detect_connection_type() == NetworkType.WIFI
+            assert monitor.detect_connection_type() == NetworkType.WIFI
+            assert probe.call_count == 1
+            
+            # cache_s=0 forces a fresh probe
+            monitor.detect_connection_type(cache_s=0)
+            assert probe.call_count == 2
+
 class TestFileSystemErrorHandling:
     """Test file system specific error scenarios"""
     
@@ -4,6 +4,7 @@ Tests various extraction scenarios including edge cases.
 """
 
 import os
+import asyncio
 import sys
 import tempfile
 import shutil
@@ -156,8 +157,8 @@ class TestExtractionFix:
         extract_dir = os.path.join(temp_dir, 'extracted')
         os.makedirs(extract_dir, exist_ok=True)
         
-        # Mock check_file_command_supports_mime to return False
-        with patch('utils.file_operations.check_file_command_supports_mime', return_value=False):
+        # Simulate a 'file' command without --mime-type support
+        with patch('utils.file_operations.FILE_CMD_OK', False):
             # Extract should still work using zipfile fallback
             success, error_msg = extract_archive_async(zip_path, extract_dir, 'test_archive.zip')
             
@@ -177,7 +178,7 @@ class TestExtractionFix:
         os.makedirs(extract_dir, exist_ok=True)
         
         # Mock patoolib to raise an exception
-        with patch('utils.file_operations.check_file_command_supports_mime', return_value=True):
+        with patch('utils.file_operations.FILE_CMD_OK', True):
             with patch('patoolib.extract_archive', side_effect=Exception("Patoolib failed")):
                 # Extract should still work using zipfile fallback
                 success, error_msg = extract_archive_async(zip_path, extract_dir, 'test_archive.zip')
@@ -299,5 +300,226 @@ class TestExtractionFix:
         assert isinstance(result, bool), "Should return a boolean value"
 
 
+class TestComputeSha256:
+    """Test suite for file hashing"""
+    
+    @pytest.mark.parametrize('use_file_digest', [True, False])
+    def test_matches_hashlib(self, tmp_path, monkeypatch, use_file_digest):
+        """Both the file_digest path and the readinto fallback hash correctly"""
+        import hashlib
+        from utils.file_operations import compute_sha256
+        
+        data = os.urandom(3 * 1024 * 1024 + 123)
+        path = tmp_path / 'blob.bin'
+        path.write_bytes(data)
+        
+        monkeypatch.setattr('utils.file_operations._sha256_mmap', lambda p: None)
+        if not use_file_digest:
+            monkeypatch.delattr(hashlib, 'file_digest', raising=False)
+        
+        assert compute_sha256(str(path), chunk_size=1024 * 1024) == hashlib.sha256(data).hexdigest()
+    
+    def test_mmap_path(self, tmp_path, monkeypatch):
+        """Regular files are hashed through mmap without the read fallbacks"""
+        import hashlib
+        from utils.file_operations import compute_sha256, _sha256_mmap
+        
+        data = os.urandom(1024 * 1024 + 5)
+        path = tmp_path / 'blob.bin'
+        path.write_bytes(data)
+        import mmap
+        mapped = []
+        real_mmap = mmap.mmap
+        
+        def spy(*args, **kwargs):
+            mapped.append(args)
+            return real_mmap(*args, **kwargs)
+        
+        monkeypatch.setattr(mmap, 'mmap', spy)
+        monkeypatch.setattr(hashlib, 'file_digest', None, raising=False)
+        
+        assert compute_sha256(str(path)) == hashlib.sha256(data).hexdigest()
+        assert len(mapped) == 1
+        # Empty files can't be mapped; the caller falls back to reading
+        empty = tmp_path / 'empty.bin'
+        empty.write_bytes(b'')
+        assert _sha256_mmap(str(empty)) is None
+    
+    def test_uses_file_digest_when_available(self, tmp_path, monkeypatch):
+        """On Python 3.11+ the read/update loop is delegated to hashlib.file_digest"""
+        import hashlib
+        from utils.file_operations import compute_sha256
+        
+        if not hasattr(hashlib, 'file_digest'):
+            pytest.skip('hashlib.file_digest requires Python 3.11+')
+        
+        path = tmp_path / 'blob.bin'
+        path.write_bytes(b'payload')
+        calls = []
+        real_file_digest = hashlib.file_digest
+        
+        def spy(fileobj, digest):
+            calls.append((type(fileobj).__name__, digest))
+            return real_file_digest(fileobj, digest)
+        
+        monkeypatch.setattr(hashlib, 'file_digest', spy)
+        monkeypatch.setattr('utils.file_operations._sha256_mmap', lambda p: None)
+        assert compute_sha256(str(path)) == hashlib.sha256(b'payload').hexdigest()
+        # Unbuffered raw file, so file_digest reads straight into its own buffer
+        assert calls == [('FileIO', 'sha256')]
+    
+    @pytest.mark.parametrize('size', [0, 10, 200 * 1024])
+    def test_fallback_small_files(self, tmp_path, monkeypatch, size):
+        """The readinto fallback sizes its buffer to small files and still hashes them"""
+        import hashlib
+        from utils.file_operations import compute_sha256
+        
+        data = os.urandom(size)
+        path = tmp_path / 'small.bin'
+        path.write_bytes(data)
+        monkeypatch.delattr(hashlib, 'file_digest', raising=False)
+        monkeypatch.setattr('utils.file_operations._sha256_mmap', lambda p: None)
+        
+        assert compute_sha256(str(path)) == hashlib.sha256(data).hexdigest()
+
+
+class TestRunExtractor:
+    """Test suite for the extraction tool subprocess wrapper"""
+    
+    def test_discards_stdout_and_returns_stderr_on_failure(self):
+        """Listing output is dropped; stderr is decoded only when the tool fails"""
+        from utils.file_operations import _run_extractor
+        
+        returncode, err_text = _run_extractor(['sh', '-c', 'echo listing; echo broken >&2; exit 2'])
+        assert returncode == 2
+        assert err_text.strip() == 'broken'
+        
+        returncode, err_text = _run_extractor(['sh', '-c', 'echo listing; echo noise >&2'])
+        assert returncode == 0
+        assert err_text == ''
+
+    
+    @pytest.mark.asyncio
+    async def test_async_variant_matches_and_kills_on_timeout(self):
+        """The coroutine version returns the same result and kills a hung tool"""
+        from utils.file_operations import _run_extractor_async
+        
+        returncode, err_text = await _run_extractor_async(['sh', '-c', 'echo listing; echo broken >&2; exit 2'])
+        assert returncode == 2
+        assert err_text.strip() == 'broken'
+        
+        with pytest.raises(asyncio.TimeoutError):
+            await _run_extractor_async(['sleep', '30'], timeout=0.2)
+
+class TestParallelZipExtraction:
+    """Test suite for thread-pooled ZIP member extraction"""
+    
+    def test_extracts_nested_members(self, tmp_path):
+        """Every member lands at its path, including ones in implicit directories"""
+        import zipfile
+        from utils.file_operations import _extract_zip_members
+        
+        members = {f'dir{i % 3}/sub/file{i}.bin': os.urandom(1000 + i) for i in range(20)}
+        members['top.txt'] = b'top'
+        archive = tmp_path / 'many.zip'
+        with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr('emptydir/', b'')
+            for name, data in members.items():
+                zf.writestr(name, data)
+        
+        out = tmp_path / 'out'
+        out.mkdir()
+        with zipfile.ZipFile(archive) as zf:
+            _extract_zip_members(zf, str(out))
+        
+        assert (out / 'emptydir').is_dir()
+        for name, data in members.items():
+            assert (out / name).read_bytes() == data
+
+class TestTarStreamExtraction:
+    """Test suite for single-pass tarfile extraction"""
+    
+    @pytest.mark.parametrize('suffix,mode', [('.tar', 'w'), ('.tar.gz', 'w:gz'), ('.tgz', 'w:gz'), ('.tar.bz2', 'w:bz2'), ('.tar.xz', 'w:xz')])
+    def test_extracts_compressed_variants(self, tmp_path, suffix, mode):
+        """Each tar flavour is extracted in streaming mode"""
+        from utils.file_operations import _extract_tar
+        
+        src = tmp_path / 'src'
+        (src / 'nested').mkdir(parents=True)
+        (src / 'nested' / 'a.txt').write_bytes(b'alpha')
+        archive = tmp_path / f'archive{suffix}'
+        with tarfile.open(archive, mode) as tf:
+            tf.add(src / 'nested', arcname='nested')
+        
+        out = tmp_path / 'out'
+        out.mkdir()
+        attempted = []
+        assert _extract_tar(str(archive), str(out), archive.name, attempted) is True
+        assert attempted == ['tarfile']
+        assert (out / 'nested' / 'a.txt').read_bytes() == b'alpha'
+
+class TestLibarchiveExtraction:
+    """Test suite for in-process extraction via libarchive"""
+    
+    def test_extracts_files_and_skips_traversal(self, tmp_path):
+        """Regular entries are written; entries escaping the target directory are skipped"""
+        pytest.importorskip('libarchive')
+        from utils.file_operations import _extract_with_libarchive
+        
+        archive_path = tmp_path / 'archive.zip'
+        with zipfile.ZipFile(archive_path, 'w') as zf:
+            zf.writestr('photos/a.jpg', b'jpeg-bytes')
+            zf.writestr('../evil.txt', b'nope')
+        extract_dir = tmp_path / 'out'
+        extract_dir.mkdir()
+        
+        try:
+            written = _extract_with_libarchive(str(archive_path), str(extract_dir))
+        except OSError as e:
+            pytest.skip(f'libarchive shared library unavailable: {e}')
+        
+        assert written == 1
+        assert (extract_dir / 'photos' / 'a.jpg').read_bytes() == b'jpeg-bytes'
+        assert not (tmp_path / 'evil.txt').exists()
+
+
+class TestIsPasswordError:
+    """Test suite for password error detection"""
+    
+    @pytest.mark.parametrize('text, expected', [
+        ('ERROR: Wrong password : photo.jpg', True),
+        ('Incorrect PASSWORD for archive', True),
+        (b'ERROR: Wrong password : photo.jpg', True),
+        ('CRC failed in photo.jpg', False),
+        (b'Data error', False),
+    ])
+    def test_detects_password_errors(self, text, expected):
+        """Both decoded text and raw stderr bytes are recognised"""
+        from utils.file_operations import is_password_error
+        
+        assert is_password_error(text) is expected
+
+
+class TestResolveBinary:
+    """Test suite for the external tool registry"""
+    
+    def test_cached_and_rechecked_when_missing(self, monkeypatch):
+        """Found tools come from the registry; missing ones are looked up again"""
+        from utils import utils as util_mod
+        
+        lookups = []
+        
+        def fake_which(name):
+            lookups.append(name)
+            return '/usr/bin/unrar' if len(lookups) > 1 else None
+        
+        monkeypatch.setattr(util_mod.shutil, 'which', fake_which)
+        monkeypatch.setitem(util_mod.BINARIES, 'unrar', None)
+        
+        assert util_mod.resolve_binary('unrar') is None
+        assert util_mod.resolve_binary('unrar') == '/usr/bin/unrar'
+        assert util_mod.resolve_binary('unrar') == '/usr/bin/unrar'
+        assert lookups == ['unrar', 'unrar']
+
 if __name__ == '__main__':
     pytest.main([__file__, '-v', '-s'])
@@ -127,3 +127,30 @@ async def test_recovery_quarantine_on_upload_failure(monkeypatch, tmp_path):
     assert quarantined_path.exists()
     # Converted file remains for inspection after failure
     assert converted.exists()
+
+
+def test_recovery_conversion_reuses_output_named_by_stat_fingerprint(monkeypatch, tmp_path):
+    """The recovery output name only depends on size/mtime, so a prior conversion is reused."""
+    from unittest.mock import patch
+    from utils import media_processing
+
+    recovery_dir = tmp_path / "recovery"
+    recovery_dir.mkdir()
+    monkeypatch.setattr(media_processing, "RECOVERY_DIR", str(recovery_dir))
+    monkeypatch.setattr(media_processing, "is_ffmpeg_available", lambda: True)
+
+    source = tmp_path / "clip.avi"
+    source.write_bytes(b"video bytes")
+    os.utime(source, ns=(1_700_000_000_000_000_000, 1_700_000_000_000_000_000))
+
+    with patch("subprocess.run") as mock_run:
+        mock_run.return_value.returncode = 1
+        media_processing.convert_video_for_recovery(str(source))
+    expected = Path(mock_run.call_args.args[0][-1])
+    assert expected.parent == recovery_dir
+    assert expected.name.startswith("clip_") and expected.name.endswith("_recovery.mp4")
+
+    expected.write_bytes(b"converted")
+    with patch("subprocess.run") as mock_run:
+        assert media_processing.convert_video_for_recovery(str(source)) == str(expected)
+    mock_run.assert_not_called()
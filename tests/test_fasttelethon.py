@@ -65,5 +65,300 @@ async def main():
     print("• FAST_DOWNLOAD_ENABLED=true (enable/disable)")
     print("• FAST_DOWNLOAD_CONNECTIONS=8 (parallel connections)")
 
+
+class _FakeSender:
+    """Minimal DownloadSender stand-in that serves parts from an in-memory payload."""
+
+    def __init__(self, payload, part_size, delay=0):
+        self.sender = None
+        self.payload = payload
+        self.part_size = part_size
+        self.delay = delay
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def next_at(self, offset):
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.delay)
+        self.in_flight -= 1
+        return self.payload[offset:offset + self.part_size]
+
+    async def disconnect(self):
+        pass
+
+
+def _make_downloader(senders):
+    from unittest.mock import Mock
+    from utils.fast_download import ParallelDownloader
+
+    client = Mock()
+    client.loop = asyncio.get_event_loop()
+    downloader = ParallelDownloader(client, dc_id=None)
+
+    async def fake_init(connections, file, part_count, part_size):
+        downloader.senders = list(senders)
+
+    downloader._init_download = fake_init
+    return downloader
+
+
+@pytest.mark.asyncio
+async def test_parallel_download_writes_parts_at_offsets(tmp_path):
+    """Parts are written to their absolute offsets when an output fd is given"""
+    from unittest.mock import Mock
+
+    part_size = 1024
+    payload = bytes(range(256)) * 20  # 5120 bytes -> 5 parts
+    downloader = _make_downloader([_FakeSender(payload, part_size), _FakeSender(payload, part_size)])
+
+    out_path = tmp_path / "out.bin"
+    fd = os.open(out_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+    try:
+        os.ftruncate(fd, len(payload))
+        result = await downloader.download(Mock(), len(payload), part_size_kb=1,
+                                           connection_count=2, output_fd=fd)
+    finally:
+        os.close(fd)
+
+    assert result is None
+    assert out_path.read_bytes() == payload
+
+
+@pytest.mark.asyncio
+async def test_parallel_download_slow_sender_does_not_stall_others():
+    """A fast sender keeps pulling parts while a slow one is still busy"""
+    from unittest.mock import Mock
+
+    part_size = 1024
+    payload = os.urandom(part_size * 10)
+    slow = _FakeSender(payload, part_size, delay=0.05)
+    fast = _FakeSender(payload, part_size)
+    downloader = _make_downloader([slow, fast])
+
+    result = await downloader.download(Mock(), len(payload), part_size_kb=1, connection_count=2)
+
+    assert result == payload
+    assert fast.calls > slow.calls
+
+
+@pytest.mark.asyncio
+async def test_parallel_download_pipelines_requests_per_connection():
+    """Each connection keeps several requests in flight and part size is capped at 1 MiB"""
+    from unittest.mock import Mock
+    from utils.fast_download import MAX_PART_SIZE
+
+    payload = os.urandom(MAX_PART_SIZE * 4 + 100)
+    sender = _FakeSender(payload, MAX_PART_SIZE, delay=0.01)
+    downloader = _make_downloader([sender])
+
+    result = await downloader.download(Mock(), len(payload), part_size_kb=4096,
+                                       connection_count=1, requests_per_connection=2)
+
+    assert result == payload
+    assert sender.calls == 5
+    assert sender.max_in_flight == 2
+
+
+@pytest.mark.asyncio
+async def test_parallel_download_without_taskgroup(monkeypatch):
+    """Interpreters older than 3.11 (no asyncio.TaskGroup) still download in parallel"""
+    from unittest.mock import Mock
+
+    monkeypatch.delattr(asyncio, 'TaskGroup', raising=False)
+    part_size = 1024
+    payload = os.urandom(part_size * 6)
+    downloader = _make_downloader([_FakeSender(payload, part_size), _FakeSender(payload, part_size)])
+
+    result = await downloader.download(Mock(), len(payload), part_size_kb=1, connection_count=2)
+
+    assert result == payload
+
+
+@pytest.mark.asyncio
+async def test_download_sender_does_not_retry_programming_errors():
+    """Only transient network/server errors are retried; others propagate at once"""
+    from unittest.mock import AsyncMock, Mock
+    from utils.fast_download import DownloadSender
+
+    client = Mock()
+    client._call = AsyncMock(side_effect=ValueError("bug"))
+    sender = DownloadSender(client, Mock(), Mock(), 1024)
+
+    with pytest.raises(ValueError):
+        await sender.next_at(0)
+    assert client._call.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_download_sender_samples_rtt_only_for_clean_round_trips():
+    """RTT samples cover a first-attempt request only, never FloodWait sleeps or retries"""
+    from unittest.mock import AsyncMock, Mock
+    from telethon.errors import FloodWaitError
+    from utils.fast_download import DownloadSender
+
+    samples = []
+    result = Mock(bytes=b'data')
+    client = Mock()
+    client._call = AsyncMock(side_effect=[result, FloodWaitError(request=None, capture=0), result])
+    sender = DownloadSender(client, Mock(), Mock(), 1024, on_rtt=samples.append)
+
+    assert await sender.next_at(0) == b'data'
+    assert len(samples) == 1
+    assert await sender.next_at(1024) == b'data'
+    assert len(samples) == 1
+
+
+@pytest.mark.asyncio
+async def test_download_sender_skips_reconnect_while_connected(monkeypatch):
+    """A connection error retries without tearing down a still-connected sender"""
+    from unittest.mock import AsyncMock, Mock
+    from utils.fast_download import DownloadSender
+
+    monkeypatch.setattr(DownloadSender, '_backoff_delay', staticmethod(lambda attempt: 0))
+    result = Mock(bytes=b'data')
+    client = Mock()
+    client._call = AsyncMock(side_effect=[ConnectionResetError("reset"), result])
+    mtproto = Mock()
+    mtproto.is_connected.return_value = True
+    mtproto.disconnect = AsyncMock()
+    sender = DownloadSender(client, mtproto, Mock(), 1024)
+
+    assert await sender.next_at(0) == b'data'
+    mtproto.disconnect.assert_not_awaited()
+
+
+
+def test_connection_count_follows_bandwidth_delay_product():
+    """Connection count scales with the RTT estimate and is capped by parts and max_count"""
+    from utils.fast_download import ParallelDownloader, MAX_PART_SIZE
+
+    big = 500 * MAX_PART_SIZE
+    bandwidth = 10 * MAX_PART_SIZE
+    # Unknown RTT falls back to max_count
+    assert ParallelDownloader._get_connection_count(big, max_count=8) == 8
+    # 0.3s * 10 MiB/s = 3 MiB in flight -> 3 connections of 1 MiB parts
+    assert ParallelDownloader._get_connection_count(big, rtt_s=0.3, bandwidth=bandwidth) == 3
+    assert ParallelDownloader._get_connection_count(big, max_count=4, rtt_s=5, bandwidth=bandwidth) == 4
+    # A two-part file never needs more than two connections
+    assert ParallelDownloader._get_connection_count(2 * MAX_PART_SIZE, rtt_s=5, bandwidth=bandwidth) == 2
+
+
+@pytest.mark.asyncio
+async def test_senders_are_pooled_between_downloads():
+    """Connected senders go back to the per-DC pool and are reused by the next download"""
+    from unittest.mock import AsyncMock, Mock
+    from utils import fast_download
+    from utils.fast_download import ParallelDownloader
+
+    mtproto = Mock()
+    mtproto.is_connected.return_value = True
+    mtproto.disconnect = AsyncMock()
+    wrapped = Mock(sender=mtproto, disconnect=mtproto.disconnect)
+
+    client = Mock()
+    client.loop = asyncio.get_event_loop()
+    client._get_dc = AsyncMock(side_effect=AssertionError("should reuse pooled sender"))
+    downloader = ParallelDownloader(client, dc_id=99)
+    downloader.senders = [wrapped]
+
+    try:
+        await downloader._cleanup()
+        mtproto.disconnect.assert_not_awaited()
+        assert fast_download._SENDER_POOL[99] == [mtproto]
+
+        assert await ParallelDownloader(client, dc_id=99)._create_sender() is mtproto
+        assert fast_download._SENDER_POOL[99] == []
+
+        # Error path never returns senders to the pool
+        downloader.senders = [wrapped]
+        await downloader._cleanup(reuse=False)
+        mtproto.disconnect.assert_awaited_once()
+        assert fast_download._SENDER_POOL[99] == []
+    finally:
+        fast_download._SENDER_POOL.pop(99, None)
+
+
+def test_preallocate_sizes_file(tmp_path):
+    """The destination is preallocated to the full download size"""
+    from utils.fast_download import _preallocate
+
+    path = tmp_path / "prealloc.bin"
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+    try:
+        _preallocate(fd, 3 * 1024 * 1024)
+    finally:
+        os.close(fd)
+
+    assert path.stat().st_size == 3 * 1024 * 1024
+
+
+@pytest.mark.asyncio
+async def test_progress_callback_is_throttled():
+    """Progress is reported roughly per percent, not per part, and always at the end"""
+    from unittest.mock import Mock
+
+    part_size = 1024
+    payload = os.urandom(part_size * 1000)
+    downloader = _make_downloader([_FakeSender(payload, part_size)])
+    calls = []
+
+    await downloader.download(Mock(), len(payload), part_size_kb=1, connection_count=1,
+                              progress_callback=lambda done, total: calls.append(done))
+
+    assert len(calls) <= 101
+    assert calls[-1] == len(payload)
+
+
+@pytest.mark.asyncio
+async def test_parallel_download_streams_in_order_to_file_object(tmp_path):
+    """Out-of-order parts are reordered before being written to a file object"""
+    from unittest.mock import Mock
+
+    part_size = 1024
+    payload = os.urandom(part_size * 12 + 10)
+    slow = _FakeSender(payload, part_size, delay=0.01)
+    fast = _FakeSender(payload, part_size)
+    downloader = _make_downloader([slow, fast])
+
+    out_path = tmp_path / "ordered.bin"
+    with open(out_path, 'wb') as f:
+        result = await downloader.download(Mock(), len(payload), part_size_kb=1,
+                                           connection_count=2, output_file=f)
+
+    assert result is None
+    assert out_path.read_bytes() == payload
+
+
+@pytest.mark.asyncio
+async def test_retry_gate_limits_concurrent_retries_and_shrinks():
+    """Only `limit` retries run at once, and sustained failures lower the limit"""
+    from utils.fast_download import RetryGate
+
+    gate = RetryGate(2, shrink_after=3)
+    active = 0
+    peak = 0
+
+    async def retry():
+        nonlocal active, peak
+        async with gate:
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+
+    await asyncio.gather(*(retry() for _ in range(6)))
+    assert peak == 2
+
+    for _ in range(3):
+        gate.record_failure()
+    assert gate.limit == 1
+
+    peak = 0
+    await asyncio.gather(*(retry() for _ in range(3)))
+    assert peak == 1
+
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
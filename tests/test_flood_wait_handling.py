@@ -169,13 +169,17 @@ class TestFloodWaitErrorHandling:
                 mock_retry.assert_called_once()
                 retry_task = mock_retry.call_args[0][0]
                 
-                # Should use exponential backoff (5s for first retry)
+                # Should use jittered backoff, not the FloodWait delay
                 current_time = time.time()
                 wait_time = retry_task['retry_after'] - current_time
                 
-                # First retry should be ~5 seconds (RETRY_BASE_INTERVAL)
-                assert 3 <= wait_time <= 7, f"Wait time should be ~5s, got {wait_time}s"
+                # First retry lands between RETRY_BASE_INTERVAL and 3x it (5-15s)
+                assert 3 <= wait_time <= 17, f"Wait time should be 5-15s, got {wait_time}s"
+                assert retry_task['_last_delay'] == pytest.approx(wait_time, abs=2)
                 assert 'flood_wait' not in retry_task or not retry_task['flood_wait']
+                # The failed task itself is requeued rather than a copy of it
+                assert retry_task is upload_task
+                assert retry_task['retry_count'] == 1
     
     @pytest.mark.asyncio
     async def test_queue_processor_continues_after_flood_wait(self, queue_manager, upload_task, tmp_path):
@@ -189,7 +193,7 @@ class TestFloodWaitErrorHandling:
         upload_task_2['filename'] = 'test_photo.jpg'
         
         flood_error = FloodWaitError(None)
-        flood_error.seconds = 10
+        flood_error.seconds = 1
         
         # First upload fails with FloodWaitError, second succeeds
         upload_call_count = {'count': 0}
@@ -218,9 +222,12 @@ class TestFloodWaitErrorHandling:
                 await queue_manager.add_upload_task(upload_task)
                 await queue_manager.add_upload_task(upload_task_2)
                 
-                # Wait for processor to handle both tasks
-                # Increase wait time slightly to ensure processing happens
-                await asyncio.sleep(1.0)
+                # New uploads are held back for the FloodWait duration
+                await asyncio.sleep(0.5)
+                assert upload_call_count['count'] == 1, "Processor should pause during FloodWait"
+                
+                # Wait for processor to handle the second task once the wait has passed
+                await asyncio.sleep(1.5)
                 
                 # Both upload attempts should have been made
                 assert upload_call_count['count'] == 2, "Processor should continue after FloodWaitError"
@@ -317,6 +324,61 @@ class TestFloodWaitErrorHandling:
                     # File should exist after each attempt
                     assert os.path.exists(upload_task['file_path']), \
                         f"File should exist after retry attempt {i+1}"
+    
+    @pytest.mark.asyncio
+    async def test_retry_notices_are_coalesced_per_chat(self, queue_manager, mock_event):
+        """Test that a burst of retry notices to one chat sends one reply and folds the rest into the next."""
+        mock_event.chat_id = 42
+        
+        with patch('utils.queue_manager.RETRY_NOTICE_INTERVAL', 60):
+            assert await queue_manager._send_retry_notice(mock_event, 'retry a') is True
+            assert await queue_manager._send_retry_notice(mock_event, 'retry b') is False
+            assert await queue_manager._send_retry_notice(mock_event, 'retry c') is False
+        assert mock_event.reply.await_count == 1
+        
+        with patch('utils.queue_manager.RETRY_NOTICE_INTERVAL', 0):
+            assert await queue_manager._send_retry_notice(mock_event, 'retry d') is True
+        assert mock_event.reply.await_args[0][0] == 'retry d\n(+2 more retries scheduled)'
+    
+    def test_backoff_is_jittered_and_capped(self):
+        """Test that retry delays are decorrelated, capped, and honor a FloodWait floor."""
+        from utils.queue_manager import QueueManager
+        from utils.constants import RETRY_BASE_INTERVAL, MAX_RETRY_DELAY
+        
+        delays = {QueueManager._compute_backoff(RETRY_BASE_INTERVAL) for _ in range(50)}
+        assert len(delays) > 1, "Simultaneous failures should not all get the same delay"
+        assert all(RETRY_BASE_INTERVAL <= d <= RETRY_BASE_INTERVAL * 3 for d in delays)
+        
+        assert QueueManager._compute_backoff(MAX_RETRY_DELAY * 10) <= MAX_RETRY_DELAY
+        assert QueueManager._compute_backoff(RETRY_BASE_INTERVAL, floor=125) >= 125
+    
+    @pytest.mark.asyncio
+    async def test_flood_wait_pauses_upload_limiter(self, queue_manager, upload_task):
+        """Test that a FloodWait halves the upload limit and holds back new uploads."""
+        from utils.queue_manager import AdaptiveLimiter
+        
+        flood_error = FloodWaitError(None)
+        flood_error.seconds = 120
+        
+        with patch('utils.queue_manager.TelegramOperations') as mock_telegram_ops:
+            mock_telegram_ops.return_value.upload_media_file = AsyncMock(side_effect=flood_error)
+            
+            with patch('utils.queue_manager.get_client'), \
+                 patch('utils.queue_manager.ensure_target_entity'), \
+                 patch('utils.queue_manager.CacheManager'), \
+                 patch.object(queue_manager, '_add_to_retry_queue', new=AsyncMock()):
+                
+                await queue_manager._execute_upload_task(upload_task)
+        
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(queue_manager.upload_limiter.acquire(), 0.05)
+        
+        limiter = AdaptiveLimiter(4)
+        limiter.on_backpressure(0)
+        assert limiter.limit == 2
+        for _ in range(2):
+            limiter.on_success()
+        assert limiter.limit == 3
 
 
 class TestProgressCallbackRateLimit:
@@ -85,8 +85,7 @@ class TestGroupedMediaUpload:
         with patch('utils.file_operations.extract_archive_async') as mock_extract:
             mock_extract.return_value = (True, None)
             
-            with patch('os.walk') as mock_walk:
-                mock_walk.return_value = [(str(extract_path), [], [os.path.basename(f) for f in extracted_files])]
+            with patch('utils.queue_manager._iter_files', side_effect=lambda _path: list(os.scandir(extract_path))):
                 
                 # Spy on add_upload_task to see what gets queued
                 original_add = queue_manager.add_upload_task
@@ -410,6 +409,8 @@ class TestGroupedMediaUpload:
         
         extract_path = tmp_path / "extracted"
         extract_path.mkdir()
+        for image_file in image_files:
+            (extract_path / os.path.basename(image_file)).write_text("image")
         
         processing_task = {
             'filename': 'images_only.zip',
@@ -422,8 +423,7 @@ class TestGroupedMediaUpload:
         with patch('utils.file_operations.extract_archive_async') as mock_extract:
             mock_extract.return_value = (True, None)
             
-            with patch('os.walk') as mock_walk:
-                mock_walk.return_value = [(str(extract_path), [], [os.path.basename(f) for f in image_files])]
+            with patch('utils.queue_manager._iter_files', side_effect=lambda _path: list(os.scandir(extract_path))):
                 
                 upload_tasks = []
                 
@@ -444,6 +444,56 @@ class TestGroupedMediaUpload:
                     
                 finally:
                     queue_manager.add_upload_task = original_add
+    
+    def test_extracted_file_scan_matches_os_walk(self, tmp_path):
+        """Test that the scandir-based file scan finds the same files in the same order as os.walk."""
+        from utils.queue_manager import _iter_files, _file_ext
+        
+        (tmp_path / "b.jpg").write_text("b")
+        (tmp_path / "nested" / "deeper").mkdir(parents=True)
+        (tmp_path / "nested" / "clip.MP4").write_text("v")
+        (tmp_path / "nested" / "deeper" / "notes.txt").write_text("t")
+        (tmp_path / ".hidden").write_text("h")
+        os.symlink(tmp_path / "nested", tmp_path / "link")
+        
+        expected = [os.path.join(root, f) for root, _, files in os.walk(tmp_path) for f in files]
+        assert [entry.path for entry in _iter_files(str(tmp_path))] == expected
+        assert _file_ext("clip.MP4") == ".mp4"
+        assert _file_ext(".hidden") == os.path.splitext(".hidden")[1]
+    
+    @pytest.mark.asyncio
+    async def test_extracted_file_scan_runs_off_event_loop(self, queue_manager, tmp_path):
+        """Test that extraction and the folder scan run in worker threads, not on the event loop."""
+        import threading
+        from utils.queue_manager import _iter_files
+        
+        archive_path = tmp_path / "test.zip"
+        archive_path.write_text("fake archive")
+        extract_dir = tmp_path / "extracted"
+        extract_dir.mkdir()
+        (extract_dir / "a.jpg").write_text("a")
+        (extract_dir / "notes.txt").write_text("t")
+        scan_threads = []
+        
+        def tracking_iter(_path):
+            scan_threads.append(threading.current_thread())
+            return _iter_files(str(extract_dir))
+        
+        def tracking_extract(*_args):
+            scan_threads.append(threading.current_thread())
+            return True, None
+        
+        processing_task = {'filename': 'test.zip', 'temp_archive_path': str(archive_path), 'event': None}
+        with patch('utils.file_operations.extract_archive_async', side_effect=tracking_extract), \
+             patch('utils.queue_manager._iter_files', side_effect=tracking_iter), \
+             patch.object(queue_manager, 'add_upload_task', new=AsyncMock()) as mock_add_upload:
+            await queue_manager._process_extraction_and_upload(processing_task)
+        
+        # Extraction runs on its dedicated pool, the scan on a default executor thread
+        assert scan_threads[0].name.startswith('extract')
+        assert not scan_threads[1].name.startswith('extract')
+        assert threading.main_thread() not in scan_threads
+        assert mock_add_upload.call_args[0][0]['file_paths'] == [str(extract_dir / "a.jpg")]
 
 
 if __name__ == '__main__':
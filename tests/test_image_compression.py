@@ -220,6 +220,72 @@ class TestImageCompression:
         compressed_size = os.path.getsize(result)
         assert compressed_size < TELEGRAM_PHOTO_SIZE_LIMIT
     
+    @pytest.mark.asyncio
+    async def test_slightly_oversized_jpeg_rewritten_losslessly(self):
+        """A JPEG just over the limit is re-packed by jpegtran without a Pillow re-encode."""
+        test_image = self.create_test_image(width=200, height=200)
+        original_size = os.path.getsize(test_image)
+        target = int(original_size * 0.9)
+        output_path = os.path.join(self.temp_dir, 'lossless.jpg')
+        
+        def fake_jpegtran(cmd, **kwargs):
+            assert cmd[0] == '/usr/bin/jpegtran' and '-optimize' in cmd
+            with open(cmd[cmd.index('-outfile') + 1], 'wb') as f:
+                f.write(b'x' * (target - 10))
+            return Mock(returncode=0)
+        
+        with patch('utils.media_processing.resolve_binary', return_value='/usr/bin/jpegtran'), \
+             patch('subprocess.run', side_effect=fake_jpegtran), \
+             patch('utils.media_processing._encode_jpeg') as mock_encode:
+            result = await compress_image_for_telegram(test_image, output_path, target_size=target)
+        
+        assert result == output_path
+        assert os.path.getsize(result) == target - 10
+        mock_encode.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_transparency_flattened_onto_white(self):
+        """Transparent pixels become white and translucent ones are blended."""
+        from PIL import Image
+        
+        img = Image.new('RGBA', (64, 64), (0, 0, 0, 0))
+        img.paste((255, 0, 0, 255), (0, 0, 32, 64))
+        test_image = os.path.join(self.temp_dir, 'alpha.png')
+        img.save(test_image, format='PNG')
+        
+        output_path = os.path.join(self.temp_dir, 'alpha.jpg')
+        result = await compress_image_for_telegram(test_image, output_path, target_size=1)
+        
+        assert result == output_path
+        with Image.open(result) as out:
+            assert out.mode == 'RGB'
+            left = out.getpixel((2, out.height // 2))
+            right = out.getpixel((out.width - 3, out.height // 2))
+        assert left[0] > 200 and left[1] < 60 and left[2] < 60
+        assert min(right) > 230
+    
+    @pytest.mark.asyncio
+    async def test_compress_falls_back_to_resize(self):
+        """When quality 50 is still too big, the image is downscaled to fit."""
+        from PIL import Image
+        from utils.media_processing import _encode_jpeg
+        
+        width, height = 800, 600
+        img = Image.frombytes('RGB', (width, height), os.urandom(width * height * 3))
+        test_image = os.path.join(self.temp_dir, 'noise.png')
+        img.save(test_image, format='PNG')
+        
+        # Half of the quality-50 size can only be met by resizing
+        target = _encode_jpeg(img, 50).tell() // 2
+        output_path = os.path.join(self.temp_dir, 'resized.jpg')
+        result = await compress_image_for_telegram(test_image, output_path, target_size=target)
+        
+        assert result == output_path
+        assert os.path.getsize(result) <= target
+        with Image.open(result) as out:
+            assert out.width < width and out.height < height
+            assert out.width % 2 == 0 and out.height % 2 == 0
+    
     @pytest.mark.asyncio
     async def test_compress_with_pillow_not_installed(self):
         """Test graceful handling when Pillow is not installed."""
@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+"""
+Tests for shared ffprobe metadata probing in media_processing.
+"""
+
+import os
+import sys
+import json
+import asyncio
+from unittest.mock import patch, Mock, AsyncMock
+
+import pytest
+
+# Add the project directory to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import media_processing
+
+# Unpatched reference; the autouse fixture below stubs the PyAV probe out
+_probe_with_pyav = media_processing._probe_with_pyav
+
+FFPROBE_OUTPUT = json.dumps({
+    'format': {'format_name': 'mov,mp4,m4a,3gp,3g2,mj2'},
+    'streams': [
+        {'codec_type': 'audio', 'codec_name': 'aac'},
+        {'codec_type': 'video', 'codec_name': 'h264', 'width': 640, 'height': 360, 'duration': '12.5'},
+    ],
+})
+
+
+@pytest.fixture(autouse=True)
+def clear_probe_cache():
+    media_processing.clear_probe_cache()
+    # Exercise the ffprobe path even where PyAV is installed (conftest keeps the on-disk cache per test)
+    with patch('utils.media_processing._probe_with_pyav', return_value=None), \
+         patch('utils.media_processing._thumbnail_with_pyav', return_value=False):
+        yield
+    media_processing.clear_probe_cache()
+
+
+def _programs(calls):
+    """Executable names of spawned commands, whether resolved to absolute paths or not"""
+    return [os.path.basename(c.args[0]) for c in calls]
+
+
+def _ffprobe_only(mock_run):
+    return [c for c in mock_run.call_args_list if os.path.basename(c.args[0][0]) == 'ffprobe']
+
+
+def _fake_exec(stdout=FFPROBE_OUTPUT, returncode=0):
+    """Stand-in for asyncio.create_subprocess_exec returning a finished process"""
+    proc = Mock(returncode=returncode)
+    proc.communicate = AsyncMock(return_value=(stdout.encode(), b''))
+    return AsyncMock(return_value=proc)
+
+
+@pytest.mark.asyncio
+async def test_single_ffprobe_for_compatibility_and_attributes(tmp_path):
+    """Upload attributes, compatibility check and validation share one ffprobe run"""
+    video = tmp_path / 'clip.mp4'
+    video.write_bytes(b'fake video content')
+    fake_exec = _fake_exec()
+
+    with patch('utils.media_processing.is_ffprobe_available', return_value=True), \
+         patch('asyncio.create_subprocess_exec', fake_exec), \
+         patch('subprocess.run') as mock_run:
+        duration, width, height, _ = await media_processing.get_video_attributes_and_thumbnail(str(video))
+        assert media_processing.is_telegram_compatible_video(str(video)) is True
+        assert media_processing.validate_video_file(str(video))['format']['format_name'].startswith('mov')
+
+    assert (duration, width, height) == (12, 640, 360)
+    assert _programs(fake_exec.call_args_list) == ['ffprobe', 'ffmpeg']
+    mock_run.assert_not_called()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('stream_duration', [None, '0', 'N/A'])
+async def test_duration_falls_back_to_format(tmp_path, stream_duration):
+    """Fragmented MP4 without a stream duration reports the container duration"""
+    video = tmp_path / 'clip.mp4'
+    video.write_bytes(b'fake video content')
+    stream = {'codec_type': 'video', 'codec_name': 'h264', 'width': 640, 'height': 360}
+    if stream_duration is not None:
+        stream['duration'] = stream_duration
+    output = json.dumps({
+        'format': {'format_name': 'mov,mp4,m4a,3gp,3g2,mj2', 'duration': '42.7'},
+        'streams': [stream],
+    })
+
+    with patch('utils.media_processing.is_ffprobe_available', return_value=True), \
+         patch('asyncio.create_subprocess_exec', _fake_exec(output)):
+        duration, width, height, _ = await media_processing.get_video_attributes_and_thumbnail(str(video))
+
+    assert (duration, width, height) == (42, 640, 360)
+
+
+def test_admission_semaphores_created_per_loop():
+    """Semaphores are made inside the running loop, so each loop gets its own"""
+    async def get_semaphores():
+        return media_processing._transcode_semaphore(), media_processing._probe_semaphore()
+
+    first_transcode, first_probe = asyncio.run(get_semaphores())
+    second_transcode, second_probe = asyncio.run(get_semaphores())
+
+    assert first_transcode is not second_transcode
+    assert first_probe is not second_probe
+
+
+def test_reprobes_when_file_changes(tmp_path):
+    """A modified file is probed again"""
+    video = tmp_path / 'clip.mkv'
+    video.write_bytes(b'v1')
+
+    with patch('utils.media_processing.is_ffprobe_available', return_value=True), \
+         patch('subprocess.run', return_value=Mock(returncode=0, stdout=FFPROBE_OUTPUT, stderr='')) as mock_run:
+        media_processing.probe_video(str(video))
+        video.write_bytes(b'version two')
+        media_processing.probe_video(str(video))
+
+    assert len(_ffprobe_only(mock_run)) == 2
+
+
+def test_failed_probe_falls_back_to_extension(tmp_path):
+    """ffprobe failure falls back to the extension check"""
+    video = tmp_path / 'clip.avi'
+    video.write_bytes(b'not a video')
+
+    with patch('utils.media_processing.is_ffprobe_available', return_value=True), \
+         patch('subprocess.run', return_value=Mock(returncode=1, stdout='', stderr='bad')):
+        assert media_processing.probe_video(str(video)) == {}
+        assert media_processing.is_telegram_compatible_video(str(video)) is False
+
+
+@pytest.mark.asyncio
+async def test_concurrent_async_probes_share_one_ffprobe(tmp_path):
+    """Concurrent async probes of one file wait on a single ffprobe"""
+    video = tmp_path / 'clip.mp4'
+    video.write_bytes(b'fake video content')
+    fake_exec = _fake_exec()
+
+    with patch('utils.media_processing.is_ffprobe_available', return_value=True), \
+         patch('asyncio.create_subprocess_exec', fake_exec):
+        results = await asyncio.gather(*(media_processing.probe_video_async(str(video)) for _ in range(3)))
+
+    assert all(r == json.loads(FFPROBE_OUTPUT) for r in results)
+    assert fake_exec.call_count == 1
+    assert media_processing._probe_locks == {}
+
+def test_needs_video_processing_does_not_probe(tmp_path):
+    """The transcode decision depends only on the .ts check and the setting"""
+    video = tmp_path / 'clip.avi'
+    video.write_bytes(b'fake video content')
+
+    with patch('utils.media_processing.is_ffprobe_available', return_value=True), \
+         patch('utils.media_processing.TRANSCODE_ENABLED', True), \
+         patch('subprocess.run') as mock_run:
+        assert media_processing.needs_video_processing(str(video)) is True
+        assert media_processing.needs_video_processing(str(tmp_path / 'clip.ts')) is False
+
+    mock_run.assert_not_called()
+
+def test_non_mp4_magic_skips_ffprobe(tmp_path):
+    """A Matroska header is rejected from its magic bytes without running ffprobe"""
+    video = tmp_path / 'clip.mp4'
+    video.write_bytes(b'\x1a\x45\xdf\xa3' + b'\x00' * 60)
+
+    with patch('utils.media_processing.is_ffprobe_available', return_value=True), \
+         patch('subprocess.run') as mock_run:
+        assert media_processing.is_telegram_compatible_video(str(video)) is False
+
+    mock_run.assert_not_called()
+
+
+def test_sniff_container_signatures(tmp_path):
+    """Leading magic bytes map to their container"""
+    samples = {
+        'mp4': b'\x00\x00\x00\x20ftypisom' + b'\x00' * 20,
+        'mkv': b'\x1a\x45\xdf\xa3' + b'\x00' * 20,
+        'avi': b'RIFF\x00\x00\x00\x00AVI LIST',
+        'ts': (b'\x47' + b'\x00' * 187) * 2,
+        None: b'not a video',
+    }
+    for expected, data in samples.items():
+        path = tmp_path / f'sample_{expected}'
+        path.write_bytes(data)
+        assert media_processing._sniff_container(str(path)) == expected
+
+def test_ffprobe_window_narrowed_except_for_mpegts():
+    """Header-based containers get a small probe window; MPEG-TS keeps ffprobe's defaults"""
+    mp4_cmd = media_processing._ffprobe_cmd('/videos/clip.mp4')
+    ts_cmd = media_processing._ffprobe_cmd('/videos/clip.TS')
+
+    assert mp4_cmd[:3] == ['ffprobe', '-probesize', '1000000']
+    assert '-threads' in mp4_cmd and mp4_cmd[-1] == '/videos/clip.mp4'
+    assert '-probesize' not in ts_cmd and '-analyzeduration' not in ts_cmd
+
+@pytest.mark.parametrize('loads', [media_processing._json_loads, json.loads])
+def test_probe_parses_raw_ffprobe_bytes(tmp_path, loads):
+    """ffprobe output is parsed from bytes, with orjson or the stdlib fallback"""
+    video = tmp_path / 'clip.mp4'
+    video.write_bytes(b'fake video content')
+
+    with patch('utils.media_processing.is_ffprobe_available', return_value=True), \
+         patch('utils.media_processing._json_loads', loads), \
+         patch('subprocess.run', return_value=Mock(returncode=0, stdout=FFPROBE_OUTPUT.encode(), stderr=b'')) as mock_run:
+        assert media_processing.probe_video(str(video)) == json.loads(FFPROBE_OUTPUT)
+
+    assert 'text' not in mock_run.call_args.kwargs
+
+def test_media_commands_use_resolved_binary_paths():
+    """ffprobe/ffmpeg are exec'd by absolute path once resolved, skipping the PATH walk"""
+    with patch('utils.media_processing.resolve_binary', side_effect=lambda name: f'/opt/bin/{name}'):
+        assert media_processing._ffprobe_cmd('/videos/clip.mp4')[0] == '/opt/bin/ffprobe'
+    with patch('utils.media_processing.resolve_binary', return_value=None):
+        assert media_processing._ffprobe_cmd('/videos/clip.mp4')[0] == 'ffprobe'
+
+def test_warm_media_binaries_does_not_wait():
+    """Warm-up spawns each resolved binary once and never waits on it"""
+    with patch('utils.media_processing.resolve_binary', side_effect=lambda name: f'/opt/bin/{name}' if name == 'ffmpeg' else None), \
+         patch('subprocess.Popen') as mock_popen:
+        media_processing.warm_media_binaries()
+
+    mock_popen.assert_called_once()
+    assert mock_popen.call_args.args[0] == ['/opt/bin/ffmpeg', '-hide_banner', '-version']
+    mock_popen.return_value.wait.assert_not_called()
+
+def test_warm_media_binaries_resolves_hw_encoder_off_thread():
+    """With HW_ENCODE, the encoder trial runs on a background thread at startup"""
+    with patch('utils.media_processing.HW_ENCODE', True), \
+         patch('utils.media_processing.resolve_binary', return_value=None), \
+         patch('utils.media_processing.threading.Thread') as mock_thread:
+        media_processing.warm_media_binaries()
+
+    assert mock_thread.call_args.kwargs['target'] is media_processing._video_encoder_args
+    mock_thread.return_value.start.assert_called_once()
+
+def test_probe_results_persist_across_restarts(tmp_path):
+    """A probe stored on disk is reused after the in-memory cache is lost"""
+    video = tmp_path / 'clip.mp4'
+    video.write_bytes(b'fake video content')
+
+    with patch('utils.media_processing.is_ffprobe_available', return_value=True), \
+         patch('subprocess.run', return_value=Mock(returncode=0, stdout=FFPROBE_OUTPUT, stderr='')) as mock_run:
+        first = media_processing.probe_video(str(video))
+        media_processing.clear_probe_cache()  # simulate a restart
+        assert media_processing.probe_video(str(video)) == first
+
+    assert len(_ffprobe_only(mock_run)) == 1
+
+
+@pytest.mark.asyncio
+async def test_async_probe_uses_disk_cache_off_the_event_loop(tmp_path):
+    """Async probes read and write the on-disk cache from worker threads and reuse it after a restart"""
+    import threading
+    video = tmp_path / 'clip.mp4'
+    video.write_bytes(b'fake video content')
+    fake_exec = _fake_exec()
+    loop_thread = threading.current_thread()
+    db_threads = []
+    real_get_db = media_processing._get_probe_db
+
+    def tracking_get_db():
+        db_threads.append(threading.current_thread())
+        return real_get_db()
+
+    with patch('utils.media_processing.is_ffprobe_available', return_value=True), \
+         patch('utils.media_processing._get_probe_db', side_effect=tracking_get_db), \
+         patch('asyncio.create_subprocess_exec', fake_exec):
+        first = await media_processing.probe_video_async(str(video))
+        media_processing.clear_probe_cache()  # simulate a restart
+        assert await media_processing.probe_video_async(str(video)) == first
+
+    assert fake_exec.call_count == 1
+    assert db_threads and loop_thread not in db_threads
+
+
+def test_failed_probes_are_not_persisted(tmp_path):
+    """An ffprobe failure is retried after a restart instead of being remembered on disk"""
+    video = tmp_path / 'clip.mp4'
+    video.write_bytes(b'fake video content')
+
+    with patch('utils.media_processing.is_ffprobe_available', return_value=True), \
+         patch('subprocess.run', return_value=Mock(returncode=1, stdout='', stderr='bad')) as mock_run:
+        media_processing.probe_video(str(video))
+        media_processing.clear_probe_cache()
+        media_processing.probe_video(str(video))
+
+    assert len(_ffprobe_only(mock_run)) == 2
+
+def test_pyav_probe_skips_ffprobe(tmp_path):
+    """An in-process PyAV probe result is used without spawning ffprobe"""
+    video = tmp_path / 'clip.mp4'
+    video.write_bytes(b'fake video content')
+    info = json.loads(FFPROBE_OUTPUT)
+
+    with patch('utils.media_processing.is_ffprobe_available', return_value=True), \
+         patch('utils.media_processing._probe_with_pyav', return_value=info), \
+         patch('subprocess.run') as mock_run:
+        assert media_processing.probe_video(str(video)) == info
+        assert media_processing.is_telegram_compatible_video(str(video)) is True
+
+    mock_run.assert_not_called()
+
+
+def test_pyav_probe_unavailable_returns_none(tmp_path):
+    """Without PyAV the helper reports None so ffprobe is used"""
+    with patch.dict(sys.modules, {'av': None}):
+        assert _probe_with_pyav(str(tmp_path / 'missing.mp4')) is None
+
+
+@pytest.mark.asyncio
+async def test_ffmpeg_thumbnail_seeks_input_to_a_keyframe(tmp_path):
+    """The ffmpeg thumbnail fallback input-seeks and decodes keyframes only"""
+    video = tmp_path / 'clip.mp4'
+    video.write_bytes(b'fake video content')
+    fake_exec = _fake_exec()
+
+    with patch('utils.media_processing.is_ffprobe_available', return_value=True), \
+         patch('asyncio.create_subprocess_exec', fake_exec):
+        await media_processing.get_video_attributes_and_thumbnail(str(video))
+
+    cmd = list(fake_exec.call_args_list[-1].args)
+    assert os.path.basename(cmd[0]) == 'ffmpeg'
+    assert cmd.index('-skip_frame') < cmd.index('-ss') < cmd.index('-i')
+    assert cmd[cmd.index('-skip_frame') + 1] == 'nokey'
+
+@pytest.mark.asyncio
+async def test_pyav_thumbnail_skips_ffmpeg(tmp_path):
+    """A PyAV-decoded thumbnail avoids the ffmpeg exec"""
+    video = tmp_path / 'clip.mp4'
+    video.write_bytes(b'fake video content')
+    fake_exec = _fake_exec()
+
+    with patch('utils.media_processing.is_ffprobe_available', return_value=True), \
+         patch('utils.media_processing._thumbnail_with_pyav', return_value=True) as mock_thumb, \
+         patch('asyncio.create_subprocess_exec', fake_exec):
+        _, _, _, thumbnail_path = await media_processing.get_video_attributes_and_thumbnail(str(video))
+
+    assert thumbnail_path == str(video) + '.thumb.jpg'
+    mock_thumb.assert_called_once_with(str(video), thumbnail_path)
+    assert _programs(fake_exec.call_args_list) == ['ffprobe']
+
+
+@pytest.mark.asyncio
+async def test_media_command_killed_on_timeout():
+    """A timed-out ffmpeg child is killed rather than left running"""
+    proc = Mock(returncode=None)
+    proc.communicate = AsyncMock(side_effect=asyncio.TimeoutError)
+    proc.wait = AsyncMock()
+
+    with patch('asyncio.create_subprocess_exec', AsyncMock(return_value=proc)):
+        with pytest.raises(asyncio.TimeoutError):
+            await media_processing._run_media_command(['ffmpeg', '-i', 'x'], timeout=1)
+
+    proc.kill.assert_called_once()
+    proc.wait.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_transcode_thumbnail_reused_after_rename(tmp_path):
+    """The thumbnail written by the transcode pass is used for upload attributes, even after a rename"""
+    source = tmp_path / 'clip.avi'
+    source.write_bytes(b'fake video content')
+    compressed = tmp_path / 'clip_compressed.mp4'
+
+    async def fake_exec(*cmd, **kwargs):
+        if os.path.basename(cmd[0]) == 'ffmpeg':
+            compressed.write_bytes(b'compressed video')
+            (tmp_path / 'clip_compressed.mp4.thumb.jpg').write_bytes(b'jpeg')
+        proc = Mock(returncode=0)
+        proc.communicate = AsyncMock(return_value=(FFPROBE_OUTPUT.encode(), b''))
+        return proc
+
+    with patch('utils.media_processing.is_ffmpeg_available', return_value=True), \
+         patch('utils.media_processing.is_ffprobe_available', return_value=True), \
+         patch('asyncio.create_subprocess_exec', side_effect=fake_exec) as mock_exec:
+        assert await media_processing.compress_video_for_telegram(str(source), str(compressed), mode='transcode') == str(compressed)
+        os.replace(compressed, source)
+        _, _, _, thumbnail_path = await media_processing.get_video_attributes_and_thumbnail(str(source))
+
+    assert thumbnail_path == str(compressed) + '.thumb.jpg'
+    assert _programs(mock_exec.call_args_list) == ['ffmpeg', 'ffprobe']
+    assert media_processing._fused_thumbnails == {}
+
+
+@pytest.mark.asyncio
+async def test_compatible_video_is_remuxed_not_reencoded(tmp_path):
+    """An H.264/MP4 input is stream-copied into a streamable MP4 instead of re-encoded"""
+    video = tmp_path / 'clip.mp4'
+    video.write_bytes(b'fake video content')
+    fake_exec = _fake_exec()
+
+    with patch('utils.media_processing.is_ffmpeg_available', return_value=True), \
+         patch('utils.media_processing.is_ffprobe_available', return_value=True), \
+         patch('asyncio.create_subprocess_exec', fake_exec):
+        output = await media_processing.compress_video_for_telegram(str(video))
+
+    assert output == str(tmp_path / 'clip_compressed.mp4')
+    ffmpeg_cmd = fake_exec.call_args_list[-1].args
+    assert _programs(fake_exec.call_args_list) == ['ffprobe', 'ffmpeg']
+    assert ffmpeg_cmd[ffmpeg_cmd.index('-c') + 1] == 'copy'
+    assert '-c:v' not in ffmpeg_cmd
+    assert 'empty_moov' in ffmpeg_cmd[ffmpeg_cmd.index('-movflags') + 1]
+
+
+@pytest.mark.asyncio
+async def test_batch_probe_overlaps_spawns_and_warms_cache(tmp_path):
+    """A batch probe runs ffprobes concurrently and later sync checks reuse the results"""
+    videos = []
+    for i in range(3):
+        video = tmp_path / f'clip{i}.mp4'
+        video.write_bytes(b'fake video content')
+        videos.append(str(video))
+    running = 0
+    peak = 0
+
+    async def slow_ffprobe(*cmd, **kwargs):
+        async def communicate():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return FFPROBE_OUTPUT.encode(), b''
+        proc = Mock(returncode=0)
+        proc.communicate = communicate
+        return proc
+
+    with patch('utils.media_processing.is_ffprobe_available', return_value=True), \
+         patch('asyncio.create_subprocess_exec', side_effect=slow_ffprobe), \
+         patch('subprocess.run') as mock_run:
+        results = await media_processing.probe_videos_async(videos)
+        assert all(media_processing.is_telegram_compatible_video(v) for v in videos)
+
+    assert set(results) == set(videos)
+    assert peak == 3
+    mock_run.assert_not_called()
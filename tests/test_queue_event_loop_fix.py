@@ -103,6 +103,40 @@ async def test_ensure_processors_started(temp_queue_files):
         
         print("✅ Processors started successfully when event loop available")
 
+@pytest.mark.asyncio
+async def test_ensure_processors_started_uses_restored_counts(temp_queue_files):
+    """Test that restored-item counts alone start the processors, once"""
+    download_file, upload_file = temp_queue_files
+    
+    with open(download_file, 'w') as f:
+        json.dump([{'type': 'direct_media_download', 'filename': 'test1.mp4'}], f)
+    with open(upload_file, 'w') as f:
+        json.dump([{'type': 'upload_media', 'filename': 'test2.mp4'}], f)
+    
+    with patch('utils.constants.DOWNLOAD_QUEUE_FILE', download_file), \
+         patch('utils.constants.UPLOAD_QUEUE_FILE', upload_file):
+        from utils.queue_manager import QueueManager
+        queue_manager = QueueManager()
+    
+    # Drain the queues so only the restore bookkeeping says there is work
+    queue_manager.download_queue.get_nowait()
+    queue_manager.upload_queue.get_nowait()
+    
+    def fake_create_task(coro):
+        coro.close()
+        return MagicMock(done=MagicMock(return_value=False))
+    
+    with patch('utils.queue_manager.asyncio.create_task', side_effect=fake_create_task) as create_task:
+        await queue_manager.ensure_processors_started()
+        assert create_task.call_count == 2
+        assert queue_manager._pending_download_items == 0
+        assert queue_manager._pending_upload_items == 0
+        
+        await queue_manager.ensure_processors_started()
+        assert create_task.call_count == 2
+    
+    print("✅ Restored counts start each processor once")
+
 @pytest.mark.asyncio 
 async def test_ensure_processors_started_empty_queue(temp_queue_files):
     """Test that processors don't start for empty queues"""
@@ -258,6 +292,192 @@ async def test_integration_scenario(temp_queue_files):
         
         print("✅ Complete integration scenario works correctly")
 
+@pytest.mark.asyncio
+async def test_download_queue_wakes_waiting_consumer():
+    """Test that the deque-backed download queue wakes a consumer blocked on get()"""
+    from utils.queue_manager import DequeTaskQueue
+    
+    queue = DequeTaskQueue()
+    assert queue.empty()
+    with pytest.raises(asyncio.QueueEmpty):
+        queue.get_nowait()
+    
+    consumer = asyncio.create_task(queue.get())
+    await asyncio.sleep(0)
+    assert not consumer.done()
+    
+    queue.put_nowait({'filename': 'a.zip'})
+    await queue.put({'filename': 'b.zip'})
+    assert (await asyncio.wait_for(consumer, 1))['filename'] == 'a.zip'
+    assert [t['filename'] for t in queue] == ['b.zip']
+    assert (await queue.get())['filename'] == 'b.zip'
+    
+    queue.task_done()
+    queue.task_done()
+    await asyncio.wait_for(queue.join(), 1)
+    print("✅ Download queue wakes waiting consumer")
+
+@pytest.mark.asyncio
+async def test_bounded_download_queue_applies_backpressure():
+    """Test that put() waits for room in a full download queue while put_nowait() never refuses"""
+    from utils.queue_manager import DequeTaskQueue
+    
+    queue = DequeTaskQueue(maxsize=1)
+    await queue.put({'filename': 'a.zip'})
+    assert queue.full()
+    
+    producer = asyncio.create_task(queue.put({'filename': 'b.zip'}))
+    await asyncio.sleep(0)
+    assert not producer.done()
+    
+    queue.put_nowait({'filename': 'restored.zip'})
+    assert queue.qsize() == 2
+    
+    assert (await queue.get())['filename'] == 'a.zip'
+    assert (await queue.get())['filename'] == 'restored.zip'
+    await asyncio.wait_for(producer, 1)
+    assert [t['filename'] for t in queue] == ['b.zip']
+    print("✅ Bounded download queue applies backpressure")
+
+@pytest.mark.asyncio
+async def test_full_download_queue_fail_policy_rejects():
+    """Test that the 'fail' policy rejects a download instead of waiting for room"""
+    from utils.queue_manager import QueueManager, DequeTaskQueue
+    
+    qm = QueueManager()
+    qm._disable_download_worker_start = True
+    qm.download_queue = DequeTaskQueue(maxsize=1)
+    qm.download_queue.put_nowait({'filename': 'a.zip'})
+    
+    with patch('utils.queue_manager.DOWNLOAD_QUEUE_FULL_POLICY', 'fail'):
+        with pytest.raises(asyncio.QueueFull):
+            await qm._put_download_with_backpressure({'filename': 'b.zip'})
+    with patch('utils.queue_manager.DOWNLOAD_QUEUE_FULL_POLICY', 'timeout'), \
+         patch('utils.queue_manager.DOWNLOAD_QUEUE_PUT_TIMEOUT', 0.01):
+        with pytest.raises(asyncio.QueueFull):
+            await qm._put_download_with_backpressure({'filename': 'c.zip'})
+    assert qm.download_queue.qsize() == 1
+    print("✅ Full download queue policies reject when configured")
+
+@pytest.mark.asyncio
+async def test_retry_kept_when_download_queue_full():
+    """Test that a retry rejected by a full download queue stays in the retry queue"""
+    from utils.queue_manager import QueueManager, DequeTaskQueue
+    
+    qm = QueueManager()
+    qm._disable_download_worker_start = True
+    qm.download_queue = DequeTaskQueue(maxsize=1)
+    qm.download_queue.put_nowait({'filename': 'a.zip'})
+    retry_task = {'type': 'archive_download', 'filename': 'b.zip', 'retry_after': 0}
+    
+    with patch('utils.queue_manager.DOWNLOAD_QUEUE_FULL_POLICY', 'fail'), \
+         patch('utils.queue_manager.load_retry_tasks', return_value=([retry_task], 0)), \
+         patch('utils.queue_manager.rewrite_retry_tasks') as rewrite:
+        await qm.process_retry_queue()
+    
+    assert rewrite.call_args[0][1] == [retry_task]
+    assert qm.download_queue.qsize() == 1
+    print("✅ Retry kept when the download queue is full")
+
+@pytest.mark.asyncio
+async def test_download_processor_runs_one_worker_per_slot():
+    """Test that the download processor runs as many tasks at once as the limiter allows"""
+    from utils.queue_manager import QueueManager, AdaptiveLimiter
+    
+    qm = QueueManager()
+    qm.download_limiter = AdaptiveLimiter(2)
+    running = 0
+    max_running = 0
+    
+    async def fake_execute(task):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+    
+    qm._execute_download_task = fake_execute
+    for i in range(4):
+        qm.download_queue.put_nowait({'filename': f'file{i}.zip'})
+    
+    processor = asyncio.create_task(qm._process_download_queue())
+    await asyncio.wait_for(qm.download_queue.join(), timeout=5)
+    processor.cancel()
+    await asyncio.gather(processor, return_exceptions=True)
+    
+    assert max_running == 2
+    print("✅ Download processor runs one worker per slot")
+
+@pytest.mark.asyncio
+async def test_extend_nowait_enqueues_in_bulk():
+    """Test that restored tasks can be enqueued in one call on both queue types"""
+    from utils.queue_manager import DequeTaskQueue, BackwardsCompatibleQueue
+    
+    for queue in (DequeTaskQueue(maxsize=1), BackwardsCompatibleQueue()):
+        waiter = asyncio.create_task(queue.get())
+        await asyncio.sleep(0)
+        queue.extend_nowait([{'filename': 'a.zip'}, {'filename': 'b.zip'}, {'filename': 'c.zip'}])
+        assert (await asyncio.wait_for(waiter, 1))['filename'] == 'a.zip'
+        assert queue.qsize() == 2
+        for _ in range(3):
+            queue.task_done()
+        queue.get_nowait()
+        queue.get_nowait()
+        await asyncio.wait_for(queue.join(), 1)
+    print("✅ extend_nowait enqueues restored tasks in bulk")
+
+@pytest.mark.asyncio
+async def test_queue_stats_use_status_counts():
+    """Test that queues count task statuses as tasks go in and out"""
+    from utils.queue_manager import QueueManager, DequeTaskQueue, BackwardsCompatibleQueue
+    
+    for queue in (DequeTaskQueue(), BackwardsCompatibleQueue()):
+        queue.put_nowait({'status': 'pending'})
+        queue.extend_nowait([{'status': 'pending'}, {'status': 'failed'}])
+        assert queue.status_counts == {'pending': 2, 'failed': 1}
+        queue.get_nowait()
+        await queue.get()
+        assert queue.status_counts == {'failed': 1}
+    
+    qm = QueueManager()
+    qm.download_queue = DequeTaskQueue()
+    qm.upload_queue = BackwardsCompatibleQueue()
+    qm.download_queue.extend_nowait([{'status': 'pending'}, {'status': 'pending'}])
+    qm.upload_queue.put_nowait({'status': 'pending'})
+    
+    stats = await qm.get_queue_stats()
+    assert stats['download'] == {'pending': 2, 'processing': 0, 'completed': 0, 'failed': 0}
+    assert stats['upload']['pending'] == 1
+    assert stats['total_tasks'] == 3
+    print("✅ Queue stats come from per-queue status counts")
+
+@pytest.mark.asyncio
+async def test_bounded_upload_queue_applies_backpressure():
+    """Test that upload producers wait for room, except inside upload workers"""
+    from utils.queue_manager import QueueManager, BackwardsCompatibleQueue, _in_upload_worker
+    
+    qm = QueueManager()
+    qm._disable_upload_worker_start = True
+    qm.upload_persistent = MagicMock()
+    qm.upload_queue = BackwardsCompatibleQueue(maxsize=1)
+    await qm.add_upload_task({'filename': 'a.jpg'})
+    
+    producer = asyncio.create_task(qm.add_upload_task({'filename': 'b.jpg'}))
+    await asyncio.sleep(0.05)
+    assert not producer.done()
+    
+    async def from_upload_worker():
+        _in_upload_worker.set(True)
+        await qm.add_upload_task({'filename': 'deferred.mp4'})
+    await asyncio.wait_for(asyncio.create_task(from_upload_worker()), 1)
+    assert qm.upload_queue.qsize() == 2
+    
+    assert qm.upload_queue.get_nowait()['filename'] == 'a.jpg'
+    assert qm.upload_queue.get_nowait()['filename'] == 'deferred.mp4'
+    await asyncio.wait_for(producer, 1)
+    assert [t['filename'] for t in qm.upload_queue] == ['b.jpg']
+    print("✅ Bounded upload queue applies backpressure")
+
 if __name__ == "__main__":
     # Run tests directly
     pytest.main([__file__, "-v"])
\ No newline at end of file
@@ -328,6 +328,43 @@ class TestQueueManager:
         task_data = json_data['download_queue'][0]
         assert task_data['document']['file_name'] == mock_document.file_name
         assert task_data['document']['size'] == mock_document.size
+    
+    def test_queue_serialization_reuses_document_serialization(self, queue_manager, mock_document):
+        """Test that repeated snapshots serialize each queued document once"""
+        queue_manager.download_queue.append({'id': 'test-123', 'document': mock_document, 'status': 'pending'})
+        
+        from utils.cache_manager import make_serializable
+        with patch('utils.queue_manager.make_serializable', wraps=make_serializable) as serialize:
+            first = queue_manager._queue_to_json_data()
+            second = queue_manager._queue_to_json_data()
+        
+        assert serialize.call_count == 1
+        assert first['download_queue'][0]['document'] == second['download_queue'][0]['document']
+        assert queue_manager.download_queue[0]['document'] is mock_document
+    
+    @pytest.mark.asyncio
+    async def test_run_workers_awaits_cancelled_extras(self, queue_manager):
+        """Stopping the worker pool waits for every extra worker to finish cancelling"""
+        started = 0
+        unwound = []
+        
+        async def worker():
+            nonlocal started
+            started += 1
+            try:
+                await asyncio.Event().wait()
+            finally:
+                await asyncio.sleep(0)
+                unwound.append(True)
+        
+        pool = asyncio.create_task(queue_manager._run_workers(worker, 3))
+        while started < 3:
+            await asyncio.sleep(0)
+        pool.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await pool
+        
+        assert len(unwound) == 3
 
 class TestQueueManagerIntegration:
     """Integration tests for QueueManager"""
@@ -389,5 +426,136 @@ class TestQueueManagerIntegration:
             assert "/test/path1" in paths
             assert "/test/path2" in paths
 
+class TestProcessingQueueWorkers:
+    """Test suite for the ProcessingQueue worker pool"""
+    
+    @pytest.mark.asyncio
+    async def test_workers_respect_worker_count(self):
+        """Only worker_count tasks run at once and all queued tasks complete"""
+        from utils.queue_manager import ProcessingQueue
+        
+        pq = ProcessingQueue(worker_count=2)
+        running = 0
+        max_running = 0
+        done = []
+        
+        async def fake_execute(task):
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            done.append(task['filename'])
+        
+        pq._execute_processing_task = fake_execute
+        for i in range(6):
+            await pq.add_processing_task({'filename': f'file{i}'})
+        
+        await asyncio.wait_for(pq.processing_queue.join(), timeout=5)
+        
+        assert len(pq._workers) == 2
+        assert max_running == 2
+        assert sorted(done) == [f'file{i}' for i in range(6)]
+        
+        pq.set_worker_count(1)
+        await asyncio.sleep(0)
+        assert len(pq._workers) == 1
+        
+        for worker in pq._workers:
+            worker.cancel()
+
+    @pytest.mark.asyncio
+    async def test_downloaded_file_routed_to_upload_queue(self, tmp_path):
+        """Direct media is handed to the QueueManager's upload queue"""
+        from utils.queue_manager import ProcessingQueue
+        
+        media = tmp_path / 'clip.mp4'
+        media.write_bytes(b'data')
+        manager = Mock()
+        manager.add_upload_task = AsyncMock()
+        
+        pq = ProcessingQueue()
+        with patch('utils.queue_manager.get_queue_manager', return_value=manager):
+            await pq._process_downloaded_file({'file_path': str(media), 'filename': 'clip.mp4'})
+        
+        manager.add_upload_task.assert_awaited_once()
+        upload_task = manager.add_upload_task.await_args.args[0]
+        assert upload_task['type'] == 'direct_media'
+        assert upload_task['size_bytes'] == 4
+
+    @pytest.mark.asyncio
+    async def test_upload_tasks_batch_persisted_once(self, tmp_path):
+        """A batch of upload tasks is queued together and saved in one write"""
+        with patch('utils.constants.UPLOAD_QUEUE_FILE', str(tmp_path / 'upload_queue.json')), \
+             patch('utils.constants.DOWNLOAD_QUEUE_FILE', str(tmp_path / 'download_queue.json')), \
+             patch.object(QueueManager, '_restore_queues'):
+            qm = QueueManager()
+        qm._disable_upload_worker_start = True
+        tasks = [{'filename': f'file{i}.jpg', 'type': 'extracted_media'} for i in range(5)]
+        
+        with patch.object(qm.upload_persistent, 'save_queue') as mock_save:
+            await qm.add_upload_tasks_batch(tasks)
+            qm.upload_persistent.flush()
+        
+        assert qm.upload_queue.qsize() == 5
+        assert mock_save.call_count == 1
+        assert qm.upload_persistent.get_items() == tasks
+
+    @pytest.mark.asyncio
+    async def test_archive_extraction_failure_reported_through_manager(self, tmp_path):
+        """A failed extraction is handed to the QueueManager's failure handler"""
+        from utils.queue_manager import ProcessingQueue
+        
+        archive = tmp_path / 'broken.zip'
+        archive.write_bytes(b'not a zip')
+        event = Mock()
+        event.reply = AsyncMock()
+        manager = Mock()
+        manager._handle_extraction_failure = AsyncMock()
+        
+        pq = ProcessingQueue()
+        with patch('utils.queue_manager.get_queue_manager', return_value=manager), \
+             patch('utils.file_operations.extract_archive_async', return_value=(False, 'bad archive')):
+            await pq._process_archive_extraction({
+                'temp_archive_path': str(archive), 'filename': 'broken.zip', 'event': event})
+        
+        manager._handle_extraction_failure.assert_awaited_once()
+        kwargs = manager._handle_extraction_failure.await_args.kwargs
+        assert kwargs['filename'] == 'broken.zip'
+        assert kwargs['error_msg'] == 'bad archive'
+        assert not os.path.exists(kwargs['extract_path'])
+        assert not archive.exists()
+
+    @pytest.mark.asyncio
+    async def test_archive_extraction_keeps_folder_for_queued_uploads(self, tmp_path):
+        """Extracted media stays on disk and is registered for cleanup after upload"""
+        from utils.queue_manager import ProcessingQueue, ExtractionCleanupRegistry
+        
+        archive = tmp_path / 'photos.zip'
+        archive.write_bytes(b'zip')
+        
+        def fake_extract(archive_path, extract_path, filename):
+            with open(os.path.join(extract_path, 'a.jpg'), 'wb') as f:
+                f.write(b'img')
+            return True, None
+        
+        event = Mock()
+        event.reply = AsyncMock()
+        manager = Mock()
+        manager.extraction_cleanup_registry = ExtractionCleanupRegistry()
+        manager.add_upload_tasks_batch = AsyncMock()
+        
+        pq = ProcessingQueue()
+        with patch('utils.queue_manager.get_queue_manager', return_value=manager), \
+             patch('utils.file_operations.extract_archive_async', side_effect=fake_extract):
+            await pq._process_archive_extraction({
+                'temp_archive_path': str(archive), 'filename': 'photos.zip', 'event': event})
+        
+        upload_tasks = manager.add_upload_tasks_batch.await_args.args[0]
+        extract_path = upload_tasks[0]['extraction_folder']
+        assert os.path.exists(upload_tasks[0]['file_path'])
+        assert manager.extraction_cleanup_registry.registry[extract_path] == {'total': 1, 'uploaded': 0}
+        assert not archive.exists()
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
\ No newline at end of file
@@ -327,11 +327,10 @@ class TestLiveExtractionBatching:
             
             # Mock extraction to return success
             with patch('utils.file_operations.extract_archive_async') as mock_extract, \
-                 patch('os.walk') as mock_walk, \
+                 patch('utils.queue_manager._iter_files', side_effect=lambda _path: list(os.scandir(extract_dir))), \
                  patch.object(queue_manager, 'add_upload_task', new=AsyncMock()) as mock_add_upload:
                 
                 mock_extract.return_value = (True, None)
-                mock_walk.return_value = [(extract_dir, [], [f'image_{i}.jpg' for i in range(25)])]
                 
                 await queue_manager._process_extraction_and_upload(processing_task)
                 
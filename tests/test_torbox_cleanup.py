@@ -97,6 +97,25 @@ class TestExtractionCleanupRegistry:
         
         # Should not raise exception
         await registry.cleanup_folder("/tmp/nonexistent_folder_12345")
+    
+    @pytest.mark.asyncio
+    async def test_cleanup_folder_runs_off_event_loop(self):
+        """Test that removing the folder tree happens in a worker thread."""
+        import threading
+        registry = ExtractionCleanupRegistry()
+        test_folder = tempfile.mkdtemp(prefix="test_cleanup_")
+        rmtree_threads = []
+        real_rmtree = shutil.rmtree
+        
+        def tracking_rmtree(path, **kwargs):
+            rmtree_threads.append(threading.current_thread())
+            real_rmtree(path, **kwargs)
+        
+        with patch('utils.queue_manager.shutil.rmtree', side_effect=tracking_rmtree):
+            await registry.cleanup_folder(test_folder)
+        
+        assert not os.path.exists(test_folder)
+        assert rmtree_threads and rmtree_threads[0] is not threading.main_thread()
 
 
 class TestTorboxArchiveCleanup:
@@ -103,6 +103,179 @@ class TestUploadTaskFixes(unittest.IsolatedAsyncioTestCase):
             except FileNotFoundError:
                 pass
 
+    async def test_upload_components_reused_across_tasks(self):
+        """Test that consecutive uploads share one TelegramOperations and CacheManager."""
+        temp_files = [self.create_temp_file() for _ in range(2)]
+        
+        try:
+            with patch('utils.queue_manager.get_client', return_value=Mock()), \
+                 patch('utils.queue_manager.TelegramOperations') as mock_telegram_ops, \
+                 patch('utils.queue_manager.CacheManager') as mock_cache_manager, \
+                 patch('utils.queue_manager.ensure_target_entity', return_value=Mock()), \
+                 patch('utils.queue_manager.needs_video_processing', return_value=False), \
+                 patch('utils.queue_manager.compute_sha256', return_value='fake_hash'):
+                
+                mock_telegram_ops.return_value.upload_media_file = AsyncMock()
+                mock_cache_manager.return_value.add_to_cache = AsyncMock()
+                
+                for i, temp_file in enumerate(temp_files):
+                    task = self.create_upload_task(temp_file)
+                    task['file_hash'] = f'fake_hash_{i}'
+                    await self.queue_manager._execute_upload_task(task)
+                
+                assert mock_telegram_ops.return_value.upload_media_file.call_count == 2
+                mock_telegram_ops.assert_called_once()
+                mock_cache_manager.assert_called_once()
+        finally:
+            for temp_file in temp_files:
+                try:
+                    os.remove(temp_file)
+                except FileNotFoundError:
+                    pass
+
+    async def test_upload_reuses_known_hash(self):
+        """Test that a precomputed file_hash skips rehashing and a missing one is computed."""
+        temp_files = [self.create_temp_file() for _ in range(2)]
+        
+        try:
+            with patch('utils.queue_manager.get_client', return_value=Mock()), \
+                 patch('utils.queue_manager.TelegramOperations') as mock_telegram_ops, \
+                 patch('utils.queue_manager.CacheManager') as mock_cache_manager, \
+                 patch('utils.queue_manager.ensure_target_entity', return_value=Mock()), \
+                 patch('utils.queue_manager.needs_video_processing', return_value=False), \
+                 patch('utils.queue_manager.compute_sha256', return_value='computed_hash') as mock_sha:
+                
+                mock_telegram_ops.return_value.upload_media_file = AsyncMock()
+                add_to_cache = mock_cache_manager.return_value.add_to_cache = AsyncMock()
+                
+                await self.queue_manager._execute_upload_task(self.create_upload_task(temp_files[0]))
+                mock_sha.assert_not_called()
+                assert add_to_cache.call_args[0][0] == 'fake_hash'
+                
+                task = self.create_upload_task(temp_files[1])
+                del task['file_hash']
+                await self.queue_manager._execute_upload_task(task)
+                mock_sha.assert_called_once_with(temp_files[1])
+                assert add_to_cache.call_args[0][0] == 'computed_hash'
+        finally:
+            for temp_file in temp_files:
+                try:
+                    os.remove(temp_file)
+                except FileNotFoundError:
+                    pass
+
+    async def test_compressed_video_rehashed_for_cache(self):
+        """Test that a carried hash is replaced when the video is swapped for its compressed version."""
+        temp_file = self.create_temp_file()
+        
+        async def fake_compress(input_path, output_path):
+            with open(output_path, 'wb') as f:
+                f.write(b'compressed video content')
+            return output_path
+        
+        try:
+            with patch('utils.queue_manager.get_client', return_value=Mock()), \
+                 patch('utils.queue_manager.TelegramOperations') as mock_telegram_ops, \
+                 patch('utils.queue_manager.CacheManager') as mock_cache_manager, \
+                 patch('utils.queue_manager.ensure_target_entity', return_value=Mock(id=1)), \
+                 patch('utils.media_processing.needs_video_processing', return_value=True), \
+                 patch('utils.media_processing.compress_video_for_telegram', side_effect=fake_compress), \
+                 patch('utils.queue_manager.compute_sha256', return_value='compressed_hash') as mock_sha:
+                
+                mock_telegram_ops.return_value.upload_media_file = AsyncMock()
+                add_to_cache = mock_cache_manager.return_value.add_to_cache = AsyncMock()
+                
+                task = self.create_upload_task(temp_file)
+                await self.queue_manager._execute_upload_task(task)
+                
+                mock_sha.assert_called_once_with(temp_file)
+                assert add_to_cache.call_args[0][0] == 'compressed_hash'
+                assert (1, 'fake_hash') in self.queue_manager._recent_hashes
+                assert (1, 'compressed_hash') in self.queue_manager._recent_hashes
+        finally:
+            try:
+                os.remove(temp_file)
+            except FileNotFoundError:
+                pass
+
+    async def test_recently_uploaded_hash_skips_upload(self):
+        """Test that a requeued file whose hash was just uploaded to the same chat is cleaned up instead of re-sent."""
+        temp_files = [self.create_temp_file() for _ in range(3)]
+        first_chat, other_chat = Mock(id=1), Mock(id=2)
+        
+        try:
+            with patch('utils.queue_manager.get_client', return_value=Mock()), \
+                 patch('utils.queue_manager.TelegramOperations') as mock_telegram_ops, \
+                 patch('utils.queue_manager.CacheManager') as mock_cache_manager, \
+                 patch('utils.queue_manager.ensure_target_entity', return_value=first_chat) as mock_target, \
+                 patch('utils.queue_manager.needs_video_processing', return_value=False):
+                
+                upload = mock_telegram_ops.return_value.upload_media_file = AsyncMock()
+                mock_cache_manager.return_value.add_to_cache = AsyncMock()
+                
+                # The temp files share their content, so each is hashed to the same value
+                tasks = [self.create_upload_task(temp_file) for temp_file in temp_files]
+                tasks[1] = self.create_upload_task(temp_files[1], with_event=True)
+                for task in tasks:
+                    del task['file_hash']
+                
+                await self.queue_manager._execute_upload_task(tasks[0])
+                await self.queue_manager._execute_upload_task(tasks[1])
+                
+                upload.assert_awaited_once()
+                self.assertFalse(os.path.exists(temp_files[1]))
+                self.assertIn('already uploaded', tasks[1]['event'].reply.call_args[0][0])
+                self.assertEqual(tasks[0]['file_hash'], tasks[1]['file_hash'])
+                
+                # The same file is still sent to a different target
+                mock_target.return_value = other_chat
+                await self.queue_manager._execute_upload_task(tasks[2])
+                self.assertEqual(upload.await_count, 2)
+        finally:
+            for temp_file in temp_files:
+                try:
+                    os.remove(temp_file)
+                except FileNotFoundError:
+                    pass
+
+    async def test_grouped_upload_records_hashes(self):
+        """Test that files sent in an album are not uploaded again on their own to the same chat."""
+        temp_files = [self.create_temp_file() for _ in range(2)]
+        chat = Mock(id=1)
+        
+        try:
+            with patch('utils.queue_manager.get_client', return_value=Mock()), \
+                 patch('utils.queue_manager.TelegramOperations') as mock_telegram_ops, \
+                 patch('utils.queue_manager.CacheManager') as mock_cache_manager, \
+                 patch('utils.queue_manager.ensure_target_entity', return_value=chat), \
+                 patch('utils.queue_manager.needs_video_processing', return_value=False):
+                
+                mock_telegram_ops.return_value.upload_media_grouped = AsyncMock()
+                upload = mock_telegram_ops.return_value.upload_media_file = AsyncMock()
+                mock_cache_manager.return_value.add_to_cache = AsyncMock()
+                
+                await self.queue_manager._execute_grouped_upload({
+                    'filename': 'test_archive.zip - Videos',
+                    'file_paths': [temp_files[0]],
+                    'event': None,
+                    'is_grouped': True,
+                    'media_type': 'videos',
+                    'source_archive': 'test_archive.zip'
+                })
+                mock_telegram_ops.return_value.upload_media_grouped.assert_awaited_once()
+                
+                task = self.create_upload_task(temp_files[1])
+                del task['file_hash']
+                await self.queue_manager._execute_upload_task(task)
+                upload.assert_not_awaited()
+                self.assertFalse(os.path.exists(temp_files[1]))
+        finally:
+            for temp_file in temp_files:
+                try:
+                    os.remove(temp_file)
+                except FileNotFoundError:
+                    pass
+
 
 if __name__ == '__main__':
     async def run_tests():
@@ -8,8 +8,7 @@ import pytest
 import os
 import tempfile
 import asyncio
-from unittest.mock import patch
-import subprocess
+from unittest.mock import patch, Mock, AsyncMock
 import sys
 from pathlib import Path
 
@@ -31,15 +30,19 @@ async def test_video_compression_timeout_cleanup():
     
     try:
         # Test 1: Timeout scenario
-        def mock_timeout_process(*args, **kwargs):
+        async def mock_timeout_process(*args, **kwargs):
             # Create a partial output file to simulate ffmpeg starting
             with open(output_path, 'w') as f:
                 f.write('partial compressed data')
             
-            # Simulate timeout
-            raise subprocess.TimeoutExpired(cmd=['ffmpeg'], timeout=1)
+            # Simulate timeout while waiting on the child
+            proc = Mock(returncode=None)
+            proc.communicate = AsyncMock(side_effect=asyncio.TimeoutError)
+            proc.wait = AsyncMock()
+            return proc
         
-        with patch('subprocess.run', side_effect=mock_timeout_process):
+        with patch('utils.media_processing.is_ffmpeg_available', return_value=True), \
+             patch('asyncio.create_subprocess_exec', side_effect=mock_timeout_process):
             # Run compression - should timeout and clean up
             result = await compress_video_for_telegram(input_path, output_path)
             
@@ -51,19 +54,18 @@ async def test_video_compression_timeout_cleanup():
             assert not os.path.exists(output_path), f"Output file {output_path} should be cleaned up after timeout"
         
         # Test 2: Process failure scenario  
-        def mock_failed_process(*args, **kwargs):
+        async def mock_failed_process(*args, **kwargs):
             # Create a partial output file to simulate ffmpeg starting
             with open(output_path, 'w') as f:
                 f.write('partial compressed data')
             
-            # Mock failed subprocess result
-            class MockResult:
-                returncode = 1
-                stderr = "Mock ffmpeg error"
-            
-            return MockResult()
+            # Mock failed ffmpeg process
+            proc = Mock(returncode=1)
+            proc.communicate = AsyncMock(return_value=(b'', b'Mock ffmpeg error'))
+            return proc
         
-        with patch('subprocess.run', side_effect=mock_failed_process):
+        with patch('utils.media_processing.is_ffmpeg_available', return_value=True), \
+             patch('asyncio.create_subprocess_exec', side_effect=mock_failed_process):
             # Run compression - should fail and clean up
             result = await compress_video_for_telegram(input_path, output_path)
             
@@ -72,19 +74,18 @@ async def test_video_compression_timeout_cleanup():
             assert not os.path.exists(output_path), f"Output file {output_path} should be cleaned up after failure"
         
         # Test 3: Success scenario (no cleanup)
-        def mock_success_process(*args, **kwargs):
+        async def mock_success_process(*args, **kwargs):
             # Create successful output file
             with open(output_path, 'w') as f:
                 f.write('successfully compressed data')
             
-            # Mock successful subprocess result
-            class MockResult:
-                returncode = 0
-                stderr = ""
-            
-            return MockResult()
+            # Mock successful ffmpeg process
+            proc = Mock(returncode=0)
+            proc.communicate = AsyncMock(return_value=(b'', b''))
+            return proc
         
-        with patch('subprocess.run', side_effect=mock_success_process):
+        with patch('utils.media_processing.is_ffmpeg_available', return_value=True), \
+             patch('asyncio.create_subprocess_exec', side_effect=mock_success_process):
             # Run compression - should succeed and keep file
             result = await compress_video_for_telegram(input_path, output_path)
             
@@ -112,6 +113,72 @@ def test_timeout_configuration():
     assert isinstance(COMPRESSION_TIMEOUT_SECONDS, int), "COMPRESSION_TIMEOUT_SECONDS should be an integer"
     assert COMPRESSION_TIMEOUT_SECONDS > 0, "COMPRESSION_TIMEOUT_SECONDS should be positive"
 
+@pytest.mark.asyncio
+async def test_transcodes_are_admission_controlled(tmp_path):
+    """Concurrent compressions never run more ffmpeg jobs than the transcode semaphore allows"""
+    from utils import media_processing
+    
+    running = 0
+    peak = 0
+    
+    async def slow_ffmpeg(*args, **kwargs):
+        async def communicate():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return b'', b''
+        proc = Mock(returncode=0)
+        proc.communicate = communicate
+        return proc
+    
+    inputs = []
+    for i in range(4):
+        path = tmp_path / f'clip{i}.avi'
+        path.write_bytes(b'dummy video data')
+        inputs.append(str(path))
+    
+    with patch('utils.media_processing.is_ffmpeg_available', return_value=True), \
+         patch('utils.media_processing._transcode_semaphore', return_value=asyncio.Semaphore(2)), \
+         patch('asyncio.create_subprocess_exec', side_effect=slow_ffmpeg) as mock_exec:
+        await asyncio.gather(*(media_processing.compress_video_for_telegram(p) for p in inputs))
+    
+    assert mock_exec.call_count == 4
+    assert peak == 2
+    assert '-threads' in mock_exec.call_args.args
+    assert '-copyts' not in mock_exec.call_args.args
+    assert '-max_muxing_queue_size' in mock_exec.call_args.args
+    video_filter = mock_exec.call_args.args[mock_exec.call_args.args.index('-vf') + 1]
+    assert video_filter == 'crop=iw-mod(iw\\,2):ih-mod(ih\\,2)'
+
+def test_hw_encoder_detection_skips_unusable_encoders():
+    """A listed encoder that fails its trial encode is skipped for the next one"""
+    from utils import media_processing
+    
+    encoders_listing = " V....D h264_nvenc           NVIDIA NVENC H.264 encoder\n V....D h264_qsv             H.264 (Intel Quick Sync Video)\n"
+    
+    def fake_run(cmd, **kwargs):
+        if '-encoders' in cmd:
+            return Mock(returncode=0, stdout=encoders_listing)
+        return Mock(returncode=0 if 'h264_qsv' in cmd else 1)
+    
+    media_processing._detect_hw_encoder.cache_clear()
+    try:
+        with patch('utils.media_processing.resolve_binary', return_value='/usr/bin/ffmpeg'), \
+             patch('subprocess.run', side_effect=fake_run):
+            assert media_processing._detect_hw_encoder() == 'h264_qsv'
+        
+        with patch('utils.media_processing.HW_ENCODE', True):
+            assert media_processing._video_encoder_args()[:2] == ['-c:v', 'h264_qsv']
+        with patch('utils.media_processing.HW_ENCODE', False):
+            software_args = media_processing._video_encoder_args()
+            assert software_args[:2] == ['-c:v', 'libx264']
+            assert software_args[software_args.index('-preset') + 1] == 'veryfast'
+    finally:
+        media_processing._detect_hw_encoder.cache_clear()
+
+
 if __name__ == "__main__":
     # Run tests directly
     pytest.main([__file__, "-v"])
\ No newline at end of file
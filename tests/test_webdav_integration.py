@@ -126,6 +126,42 @@ async def test_webdav_walk_enqueues_download_tasks(queue_manager, monkeypatch):
     assert 'Skipped 1 non-media' in event.messages[-1]
 
 
+@pytest.mark.asyncio
+async def test_webdav_walk_larger_than_bounded_queue(queue_manager, monkeypatch):
+    """A walk run by the download worker must not block on the bounded queue it drains."""
+    from utils.queue_manager import DequeTaskQueue
+
+    items = [
+        WebDAVItem(path=f'Big/photo{i}.jpg', name=f'Big/photo{i}.jpg', is_dir=False, size=1024)
+        for i in range(20)
+    ]
+    monkeypatch.setattr('utils.webdav_client.get_webdav_client', AsyncMock(return_value=StubWebDAVClient(items)))
+
+    queue_manager.download_queue = DequeTaskQueue(maxsize=5)
+    ran_files = []
+
+    async def fake_file_task(task):
+        ran_files.append(task['filename'])
+
+    queue_manager._execute_webdav_file_task = fake_file_task
+    queue_manager.download_queue.put_nowait({
+        'type': 'webdav_walk_download',
+        'remote_path': '/Big',
+        'display_name': 'Big',
+        'filename': 'WebDAV: Big',
+        'event': DummyEvent()
+    })
+
+    processor = asyncio.create_task(queue_manager._process_download_queue())
+    try:
+        await asyncio.wait_for(queue_manager.download_queue.join(), timeout=5)
+    finally:
+        processor.cancel()
+        await asyncio.gather(processor, return_exceptions=True)
+
+    assert len(ran_files) == 20
+
+
 @pytest.mark.asyncio
 async def test_webdav_file_download_media_enqueue(queue_manager, monkeypatch):
     """WebDAV media files should be downloaded and enqueued for media upload."""
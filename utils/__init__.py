@@ -17,11 +17,14 @@ This module contains all utility functions organized by functionality:
 # Import key modules for easy access
 from .constants import *
 from .utils import human_size, format_eta, setup_logger
-from .file_operations import compute_sha256, extract_with_password, is_password_error, extract_archive_async
+from .file_operations import (
+    compute_sha256, extract_with_password, extract_with_password_async, is_password_error, extract_archive_async
+)
 from .media_processing import (
     is_ffmpeg_available, is_ffprobe_available, validate_video_file,
     is_telegram_compatible_video, needs_video_processing,
-    compress_video_for_telegram, get_video_attributes_and_thumbnail, convert_video_for_recovery
+    compress_video_for_telegram, get_video_attributes_and_thumbnail, convert_video_for_recovery,
+    probe_video, probe_video_async, probe_videos_async, warm_media_binaries
 )
 from .cache_manager import CacheManager, PersistentQueue, ProcessManager, FailedOperationsManager
 from .queue_manager import QueueManager, ProcessingQueue, get_queue_manager, get_processing_queue
@@ -48,9 +51,10 @@ from .webdav_client import (
 
 __all__ = [
     'human_size', 'format_eta', 'setup_logger', 'compute_sha256', 'extract_with_password',
-    'is_password_error', 'extract_archive_async', 'is_ffmpeg_available', 'is_ffprobe_available',
+    'extract_with_password_async', 'is_password_error', 'extract_archive_async', 'is_ffmpeg_available', 'is_ffprobe_available',
     'validate_video_file', 'is_telegram_compatible_video', 'needs_video_processing',
     'compress_video_for_telegram', 'get_video_attributes_and_thumbnail', 'convert_video_for_recovery',
+    'probe_video', 'probe_video_async', 'probe_videos_async', 'warm_media_binaries',
     'CacheManager', 'PersistentQueue', 'ProcessManager', 'FailedOperationsManager',
     'QueueManager', 'ProcessingQueue', 'get_queue_manager', 'get_processing_queue',
     'TelegramOperations', 'get_client', 'ensure_target_entity', 'create_download_progress_callback',
@@ -9,10 +9,15 @@ import asyncio
 import logging
 import datetime
 import threading
+from concurrent.futures import ThreadPoolExecutor
 try:
     from unittest.mock import Mock as _Mock  # type: ignore
 except Exception:  # pragma: no cover
     _Mock = None
+try:
+    import orjson as _orjson
+except ImportError:  # pragma: no cover - stdlib json fallback
+    _orjson = None
 from .constants import (
     PROCESSED_CACHE_PATH, DOWNLOAD_QUEUE_FILE, UPLOAD_QUEUE_FILE,
     CURRENT_PROCESS_FILE, FAILED_OPERATIONS_FILE
@@ -334,14 +339,43 @@ class CacheManager:
         return file_hash in self.processed_cache
 
 
+# One writer thread for every queue file: background saves keep their order and
+# don't wait behind extraction or hashing work on the default executor
+_PERSIST_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix='qpersist')
+
+
 class PersistentQueue:
-    """Manages persistent queues for downloads and uploads."""
+    """Manages persistent queues for downloads and uploads.
+
+    Changes made while an event loop is running are coalesced: bursts of adds/removes
+    within FLUSH_DELAY seconds share one save, and that save is written from a worker
+    thread dedicated to queue files. Outside a loop every change saves at once.
+    """
+    
+    FLUSH_DELAY = 0.5
     
     def __init__(self, queue_file: str):
         self.queue_file = queue_file
-        self.queue_data = []
+        # Items keyed by id(): a dict keeps insertion order and removes the stored
+        # object in O(1) instead of comparing it against every queued task
+        self._items = {}
+        self._flush_handle = None
+        self._dirty = False
+        # Snapshots are numbered so a slow background write never overwrites a newer one
+        self._write_lock = threading.Lock()
+        self._snapshot_seq = 0
+        self._saved_seq = 0
         self.load_queue()
     
+    @property
+    def queue_data(self) -> list:
+        """Queued items in insertion order."""
+        return list(self._items.values())
+    
+    @queue_data.setter
+    def queue_data(self, items: list):
+        self._items = {id(item): item for item in items}
+    
     def load_queue(self):
         """Load queue from disk."""
         if os.path.exists(self.queue_file):
@@ -355,35 +389,169 @@ class PersistentQueue:
     
     def save_queue(self):
         """Save queue to disk."""
+        self._dirty = False
+        self._write_snapshot(*self._snapshot())
+    
+    def _snapshot(self):
+        """Serializable copy of the queue, taken on the caller's thread."""
+        self._snapshot_seq += 1
+        return make_serializable(self.queue_data), self._snapshot_seq
+    
+    def _write_snapshot(self, serializable_data, seq: int):
+        """Write a snapshot unless a newer one has already been saved."""
+        with self._write_lock:
+            if seq <= self._saved_seq:
+                return
+            try:
+                tmp_path = self.queue_file + '.tmp'
+                with open(tmp_path, 'w') as f:
+                    json.dump(serializable_data, f, indent=2)
+                os.replace(tmp_path, self.queue_file)
+                self._saved_seq = seq
+            except Exception as e:
+                logger.error(f"Failed to save queue to {self.queue_file}: {e}")
+    
+    def _mark_dirty(self):
+        """Schedule a coalesced save, or save immediately when no event loop is running."""
         try:
-            tmp_path = self.queue_file + '.tmp'
-            # Make queue data serializable before saving
-            serializable_data = make_serializable(self.queue_data)
-            with open(tmp_path, 'w') as f:
-                json.dump(serializable_data, f, indent=2)
-            os.replace(tmp_path, self.queue_file)
-        except Exception as e:
-            logger.error(f"Failed to save queue to {self.queue_file}: {e}")
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.save_queue()
+            return
+        self._dirty = True
+        if self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.FLUSH_DELAY, self._flush_in_background, loop)
+    
+    def _flush_in_background(self, loop):
+        """Scheduled flush: snapshot on the loop, write the JSON in a worker thread."""
+        self._flush_handle = None
+        if not self._dirty:
+            return
+        self._dirty = False
+        loop.run_in_executor(_PERSIST_EXECUTOR, self._write_snapshot, *self._snapshot())
+    
+    def flush(self):
+        """Write any pending changes to disk now."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._dirty:
+            self._dirty = False
+            self.save_queue()
     
     def add_item(self, item: dict):
         """Add item to queue."""
-        self.queue_data.append(item)
-        self.save_queue()
+        self._items[id(item)] = item
+        self._mark_dirty()
+    
+    def add_items(self, items: list):
+        """Add several items to queue with a single save."""
+        if not items:
+            return
+        for item in items:
+            self._items[id(item)] = item
+        self._mark_dirty()
     
     def remove_item(self, item: dict):
         """Remove item from queue."""
-        if item in self.queue_data:
-            self.queue_data.remove(item)
-            self.save_queue()
+        if self._items.pop(id(item), None) is None:
+            # Not the queued object itself (e.g. a reloaded copy): match by value
+            key = next((k for k, queued in self._items.items() if queued == item), None)
+            if key is None:
+                return
+            del self._items[key]
+        self._mark_dirty()
     
     def get_items(self) -> list:
         """Get all items in queue."""
-        return self.queue_data.copy()
+        return self.queue_data
     
     def clear(self):
         """Clear all items from queue."""
-        self.queue_data.clear()
-        self.save_queue()
+        self._items.clear()
+        self._dirty = True
+        self.flush()
+
+
+# Retry queue: an append-only JSONL log next to the legacy JSON array file, so recording a
+# failure is a one-line append instead of a read-modify-rewrite of every pending retry.
+_retry_log_lock = threading.Lock()
+
+
+def _retry_log_path(retry_queue_file: str) -> str:
+    return retry_queue_file + '.log'
+
+
+def _encode_retry_line(task) -> bytes:
+    """Serialize one task as a JSON line, converting Telethon objects as needed."""
+    if _orjson is not None:
+        # orjson only calls make_serializable for objects it can't encode natively
+        return _orjson.dumps(task, default=make_serializable,
+                             option=_orjson.OPT_APPEND_NEWLINE | _orjson.OPT_NON_STR_KEYS)
+    return (json.dumps(make_serializable(task), separators=(',', ':')) + '\n').encode()
+
+
+def _decode_retry_line(line: bytes):
+    return _orjson.loads(line) if _orjson is not None else json.loads(line)
+
+
+def _read_retry_log_lines(log_path: str, offset: int = 0) -> tuple:
+    """Parse log entries from byte offset on. Returns (tasks, end_offset)."""
+    tasks = []
+    if not os.path.exists(log_path):
+        return tasks, offset
+    with open(log_path, 'rb') as f:
+        f.seek(offset)
+        data = f.read()
+    for line in data.splitlines():
+        if not line.strip():
+            continue
+        try:
+            tasks.append(_decode_retry_line(line))
+        except ValueError:
+            # A torn final line from a crash mid-append; the rest of the log is still usable
+            logger.warning(f"Skipping unreadable retry log entry in {log_path}")
+    return tasks, offset + len(data)
+
+
+def append_retry_task(retry_queue_file: str, task: dict) -> None:
+    """Record one failed task by appending a compact JSON line to the retry log."""
+    line = _encode_retry_line(task)
+    with _retry_log_lock:
+        with open(_retry_log_path(retry_queue_file), 'ab') as f:
+            f.write(line)
+
+
+def load_retry_tasks(retry_queue_file: str) -> tuple:
+    """
+    Read every pending retry task: the legacy JSON array (if any) followed by the log.
+    Returns (tasks, log_offset); pass log_offset to rewrite_retry_tasks so entries
+    appended in the meantime are kept.
+    """
+    tasks = []
+    if os.path.exists(retry_queue_file):
+        try:
+            with open(retry_queue_file, 'rb') as f:
+                tasks = _decode_retry_line(f.read())
+        except Exception as e:
+            logger.error(f"Failed to load legacy retry queue {retry_queue_file}: {e}")
+    with _retry_log_lock:
+        log_tasks, offset = _read_retry_log_lines(_retry_log_path(retry_queue_file))
+    return tasks + log_tasks, offset
+
+
+def rewrite_retry_tasks(retry_queue_file: str, tasks: list, log_offset: int) -> None:
+    """Compact the retry log down to tasks plus anything appended after log_offset."""
+    log_path = _retry_log_path(retry_queue_file)
+    tmp_path = log_path + '.tmp'
+    with _retry_log_lock:
+        appended, _ = _read_retry_log_lines(log_path, log_offset)
+        with open(tmp_path, 'wb') as f:
+            f.write(b''.join(_encode_retry_line(task) for task in tasks + appended))
+        os.replace(tmp_path, log_path)
+        # Legacy array contents are now carried in the log
+        if os.path.exists(retry_queue_file):
+            os.remove(retry_queue_file)
 
 
 class ProcessManager:
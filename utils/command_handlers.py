@@ -4,15 +4,11 @@ Contains functions to handle user commands and interactions.
 """
 
 import os
-import json
 import shutil
-import subprocess
 import asyncio
 import logging
 import time
 import inspect
-from datetime import datetime
-import psutil
 from .constants import (
     MAX_ARCHIVE_GB, MAX_CONCURRENT, FAST_DOWNLOAD_ENABLED, 
     WIFI_ONLY_MODE, TRANSCODE_ENABLED, DATA_DIR, LOG_FILE,
@@ -28,7 +24,6 @@ logger = logging.getLogger('extractor')
 pending_password = None
 current_processing = None
 processing_queue = None
-semaphore = None
 start_time = None
 
 
@@ -60,10 +55,10 @@ async def handle_password_command(event, password: str):
         await event.reply(f'🔐 Attempting extraction with provided password for {filename}...')
         
         # Import here to avoid circular imports
-        from .file_operations import extract_with_password
+        from .file_operations import extract_with_password_async
         
         # Try extraction with password
-        extract_with_password(archive_path, extract_path, password)
+        await extract_with_password_async(archive_path, extract_path, password)
         
         logger.info(f'Password extraction successful for {filename}')
         await event.reply(f'✅ Password extraction successful for {filename}! Starting media processing...')
@@ -122,7 +117,7 @@ async def handle_password_command(event, password: str):
 
 async def handle_max_concurrent_command(event, value: int):
     """Handle the /max_concurrent command to change the maximum concurrent downloads"""
-    global MAX_CONCURRENT, semaphore
+    global MAX_CONCURRENT
     
     try:
         # Update the configuration
@@ -135,9 +130,8 @@ async def handle_max_concurrent_command(event, value: int):
         # Update global variables
         MAX_CONCURRENT = value
         
-        # Create a new semaphore with the new value
-        if semaphore:
-            semaphore = asyncio.Semaphore(MAX_CONCURRENT)
+        # Resize the processing worker pool to the new value
+        get_processing_queue().set_worker_count(MAX_CONCURRENT)
         
         await event.reply(f'✅ Maximum concurrent downloads set to {value}.')
         
@@ -308,6 +302,9 @@ async def handle_compression_timeout_command(event, value: str):
 
 async def handle_battery_status_command(event):
     """Show battery status using termux-battery-status"""
+    import json
+    import subprocess
+    
     try:
         # Check if termux-battery-status is available
         if not shutil.which('termux-battery-status'):
@@ -351,11 +348,11 @@ async def handle_battery_status_command(event):
         await event.reply(f"❌ An error occurred while fetching battery status: {e}")
 
 
-async def handle_status_command(event):
-    """Show a comprehensive status of the bot and system"""
-    global start_time
+def _collect_stats():
+    """Gather blocking system probes (psutil, log file stat) for /status in one pass."""
+    # Imported lazily: psutil is only needed by /status and adds to startup RSS
+    import psutil
     
-    # System Usage
     try:
         cpu_usage = psutil.cpu_percent()
         cpu_status = f"{cpu_usage}%"
@@ -379,9 +376,33 @@ async def handle_status_command(event):
         logger.warning(f"Could not get disk usage: {e}")
         disk_status = "N/A"
 
+    try:
+        log_size = os.path.getsize(LOG_FILE)
+    except OSError:
+        log_size = 0
+
+    return {
+        'cpu': cpu_status,
+        'mem': mem_status,
+        'disk': disk_status,
+        'log_size': log_size,
+    }
+
+
+async def handle_status_command(event):
+    """Show a comprehensive status of the bot and system"""
+    from datetime import datetime
+    global start_time
+    
+    # System probes can block for a while on slow devices; run them off the event loop
+    stats = await asyncio.to_thread(_collect_stats)
+    cpu_status = stats['cpu']
+    mem_status = stats['mem']
+    disk_status = stats['disk']
+    log_size = stats['log_size']
+
     # Bot Status
     uptime = datetime.now() - start_time if start_time else "Unknown"
-    log_size = os.path.getsize(LOG_FILE) if os.path.exists(LOG_FILE) else 0
 
     # Configuration
     config_status = (
@@ -412,6 +433,8 @@ async def _get_streaming_progress_status() -> list[str]:
     if not os.path.exists(STREAMING_MANIFEST_DIR):
         return []
 
+    import json
+
     status_lines = []
     try:
         for entry in os.scandir(STREAMING_MANIFEST_DIR):
@@ -470,10 +493,11 @@ async def handle_queue_command(event):
     download_concurrent = 2 - download_active
     
     if download_queue_size > 0 or download_concurrent > 0:
-        status_line = f"⬇️ **Downloads:**\n"
-        status_line += f"Active: {download_concurrent}/2\n"
-        status_line += f"Queued: {download_queue_size}"
-        status_lines.append(status_line)
+        status_lines.append("\n".join([
+            "⬇️ **Downloads:**",
+            f"Active: {download_concurrent}/2",
+            f"Queued: {download_queue_size}",
+        ]))
     
     # Show upload queue  
     upload_queue_size = queue_status.get('upload_queue_size', 0)
@@ -482,10 +506,11 @@ async def handle_queue_command(event):
     upload_concurrent = 2 - upload_active
     
     if upload_queue_size > 0 or upload_concurrent > 0:
-        status_line = f"📤 **Uploads:**\n"
-        status_line += f"Active: {upload_concurrent}/2\n"
-        status_line += f"Queued: {upload_queue_size}"
-        status_lines.append(status_line)
+        status_lines.append("\n".join([
+            "📤 **Uploads:**",
+            f"Active: {upload_concurrent}/2",
+            f"Queued: {upload_queue_size}",
+        ]))
     
     # Show processing queue (extraction)
     if processing_queue:
@@ -493,11 +518,11 @@ async def handle_queue_command(event):
         current_proc = processing_queue.get_current_processing()
         
         if processing_size > 0 or current_proc:
-            status_line = f"🔄 **Processing:**\n"
+            parts = ["🔄 **Processing:**"]
             if current_proc:
-                status_line += f"Current: {current_proc.get('filename', 'unknown')}\n"
-            status_line += f"Queued: {processing_size}"
-            status_lines.append(status_line)
+                parts.append(f"Current: {current_proc.get('filename', 'unknown')}")
+            parts.append(f"Queued: {processing_size}")
+            status_lines.append("\n".join(parts))
     
     # Show pending password-protected archive
     if pending_password:
@@ -506,15 +531,12 @@ async def handle_queue_command(event):
     
     # Check retry queue
     from .constants import RETRY_QUEUE_FILE
-    import json
+    from .cache_manager import load_retry_tasks
     retry_count = 0
-    if os.path.exists(RETRY_QUEUE_FILE):
-        try:
-            with open(RETRY_QUEUE_FILE, 'r') as f:
-                retry_queue = json.load(f)
-                retry_count = len(retry_queue)
-        except Exception:
-            pass
+    try:
+        retry_count = len((await asyncio.to_thread(load_retry_tasks, RETRY_QUEUE_FILE))[0])
+    except Exception:
+        pass
     
     if retry_count > 0:
         status_lines.append(f"� **Retry Queue:** {retry_count} failed operations waiting for retry")
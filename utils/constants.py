@@ -14,13 +14,17 @@ RECOVERY_DIR = os.path.join(DATA_DIR, 'recovery')
 QUARANTINE_DIR = os.path.join(DATA_DIR, 'quarantine')
 
 # File extensions
-ARCHIVE_EXTENSIONS = ('.zip', '.rar', '.7z', '.tar', '.gz', '.bz2', '.xz')
+# Extension tuples are built from sets (no duplicates) and ordered longest
+# first, so endswith() matches the more specific suffix early.
+_ARCHIVE_EXTENSION_SET = {'.zip', '.rar', '.7z', '.tar', '.gz', '.bz2', '.xz'}
+ARCHIVE_EXTENSIONS = tuple(sorted(_ARCHIVE_EXTENSION_SET, key=lambda ext: (-len(ext), ext)))
 PHOTO_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')  # exclude gif to avoid doc behavior
 ANIMATED_EXTENSIONS = ('.gif',)  # treat as skip or later special handling (skipped for now)
-VIDEO_EXTENSIONS = ('.mp4', '.mkv', '.avi', '.mov', '.webm', '.ts', '.m4v', '.flv', '.wmv', 
-                   '.3gp', '.webm', '.vob', '.m2ts', '.mts', '.m2v', '.mpg', '.mpeg', 
-                   '.ogv', '.ogg', '.drc', '.gifv', '.mng', '.qt', '.yuv', '.rm', '.rmvb', 
-                   '.asf', '.amv', '.m3u8')
+_VIDEO_EXTENSION_SET = {'.mp4', '.mkv', '.avi', '.mov', '.webm', '.ts', '.m4v', '.flv', '.wmv',
+                        '.3gp', '.vob', '.m2ts', '.mts', '.m2v', '.mpg', '.mpeg',
+                        '.ogv', '.ogg', '.drc', '.gifv', '.mng', '.qt', '.yuv', '.rm', '.rmvb',
+                        '.asf', '.amv', '.m3u8'}
+VIDEO_EXTENSIONS = tuple(sorted(_VIDEO_EXTENSION_SET, key=lambda ext: (-len(ext), ext)))
 MEDIA_EXTENSIONS = PHOTO_EXTENSIONS + VIDEO_EXTENSIONS  # only these will be sent
 
 # Configuration values from config
@@ -58,6 +62,8 @@ UPLOAD_QUEUE_FILE = os.path.join(DATA_DIR, 'upload_queue.json')
 CURRENT_PROCESS_FILE = os.path.join(DATA_DIR, 'current_process.json')
 FAILED_OPERATIONS_FILE = os.path.join(DATA_DIR, 'failed_operations.json')
 FAILED_UPLOADS_FILE = os.path.join(DATA_DIR, 'failed_uploads.json')
+PROBE_CACHE_DB = os.path.join(DATA_DIR, 'ffprobe_cache.sqlite')
+PROBE_CACHE_MAX_AGE_DAYS = 30
 
 # Ensure data directories exist
 os.makedirs(DATA_DIR, exist_ok=True)
@@ -88,13 +94,31 @@ def _env_bool(name: str, default: bool) -> bool:
 # This prevents parallel processing and reduces memory usage on low-resource devices
 DOWNLOAD_SEMAPHORE_LIMIT = 1  # Process only 1 download at a time
 UPLOAD_SEMAPHORE_LIMIT = 1    # Process only 1 upload at a time
+# Backpressure for incoming downloads: how many may wait in the queue, and what a producer
+# does when it is full - 'wait' blocks, 'fail' rejects at once, 'timeout' waits DOWNLOAD_QUEUE_PUT_TIMEOUT seconds
+DOWNLOAD_QUEUE_MAXSIZE = int(os.environ.get('DOWNLOAD_QUEUE_MAXSIZE', 256))
+DOWNLOAD_QUEUE_FULL_POLICY = os.environ.get('DOWNLOAD_QUEUE_FULL_POLICY', 'wait').strip().lower()
+DOWNLOAD_QUEUE_PUT_TIMEOUT = float(os.environ.get('DOWNLOAD_QUEUE_PUT_TIMEOUT', 30))
+# Upload queue depth; producers outside the upload workers wait for room when it is full
+UPLOAD_QUEUE_MAXSIZE = int(os.environ.get('UPLOAD_QUEUE_MAXSIZE', 1024))
+# ffmpeg admission control: libx264 scales well to ~4 threads, so run one transcode per 4 cores
+TRANSCODE_THREADS = 4
+TRANSCODE_SEMAPHORE_LIMIT = max(1, (os.cpu_count() or 1) // TRANSCODE_THREADS)
+FFPROBE_SEMAPHORE_LIMIT = 32  # Caps ffprobe fork storms during batch extraction
+EXTRACTION_THREADS = int(os.environ.get('EXTRACTION_THREADS', 2))  # Dedicated archive extraction threads
 # WebDAV sequential mode enforces download -> upload -> cleanup order (memory friendly for Termux)
 WEBDAV_SEQUENTIAL_MODE = _env_bool('WEBDAV_SEQUENTIAL_MODE', True)
 
+# Opt-in hardware H.264 encoding (NVENC/QSV/VideoToolbox) for transcodes; libx264 when none works
+HW_ENCODE = _env_bool('HW_ENCODE', False)
+
 # Retry mechanism settings
 MAX_RETRY_ATTEMPTS = 5        # Maximum retry attempts per operation
 RETRY_BASE_INTERVAL = 5       # Base interval for exponential backoff (seconds)
+MAX_RETRY_DELAY = 300         # Cap for jittered retry backoff (seconds)
 RETRY_QUEUE_FILE = os.path.join(DATA_DIR, 'retry_queue.json')
+RECENT_UPLOAD_HASHES_MAX = 4096  # Uploaded file hashes remembered to skip requeued duplicates
+RETRY_NOTICE_INTERVAL = 5       # Min seconds between retry/rate-limit replies to the same chat
 
 # Deferred video conversion configuration
 CONVERSION_STATE_FILE = os.path.join(DATA_DIR, 'conversion_state.json')
@@ -3,13 +3,15 @@
 # Adapted for our extract-compressed-files.py use case
 
 import asyncio
+import contextlib
+import heapq
 import logging
 import math
 import os
 import time
 import random
 from collections import defaultdict
-from typing import Optional, List, Union, Awaitable, DefaultDict, BinaryIO
+from typing import Optional, Dict, List, Union, Awaitable, Callable, DefaultDict, BinaryIO
 
 from telethon import utils, helpers, TelegramClient
 from telethon.crypto import AuthKey
@@ -20,10 +22,7 @@ from telethon.tl.functions.auth import ExportAuthorizationRequest, ImportAuthori
 from telethon.tl.functions.upload import GetFileRequest
 from telethon.tl.types import (Document, InputFileLocation, InputDocumentFileLocation,
                                InputPhotoFileLocation, InputPeerPhotoFileLocation)
-from telethon.errors import (
-    FloodWaitError, TimeoutError, 
-    ServerError, RPCError, AuthKeyError
-)
+from telethon.errors import FloodWaitError, RPCError, AuthKeyError
 
 # Import network monitoring if available
 try:
@@ -36,40 +35,138 @@ except ImportError:
 
 log: logging.Logger = logging.getLogger("fast_download")
 
+_network_monitor: Optional['NetworkMonitor'] = None
+
+
+def get_network_monitor() -> Optional['NetworkMonitor']:
+    """Get or create the shared network monitor used by WiFi-only downloads."""
+    global _network_monitor
+    if _network_monitor is None and NETWORK_MONITOR_AVAILABLE:
+        _network_monitor = NetworkMonitor()
+    return _network_monitor
+
+
+# Telegram rejects GetFileRequest limits above 1 MiB
+MAX_PART_SIZE = 1024 * 1024
+# In-flight requests kept per connection so each one stays busy across round trips
+DEFAULT_REQUESTS_PER_CONNECTION = 2
+# Assumed per-connection throughput used to turn the RTT estimate into a BDP
+ASSUMED_CONNECTION_BANDWIDTH = 10 * 1024 * 1024
+# Weight of the newest sample in the RTT moving average
+RTT_EWMA_ALPHA = 0.2
+# Progress callbacks fire at most this often, or after this fraction of the file
+PROGRESS_MIN_INTERVAL_S = 1.0
+PROGRESS_MIN_FRACTION = 0.01
+
+# Idle authorised connections kept per DC so back-to-back downloads skip the handshake
+SENDER_POOL_MAX_PER_DC = 16
+_SENDER_POOL: Dict[int, List[MTProtoSender]] = {}
+
+
+def _acquire_pooled_sender(dc_id: int) -> Optional[MTProtoSender]:
+    """Take a still-connected sender for dc_id from the pool, if any."""
+    pool = _SENDER_POOL.get(dc_id)
+    while pool:
+        sender = pool.pop()
+        if sender.is_connected():
+            return sender
+    return None
+
+
+def _release_sender(dc_id: int, sender: Optional[MTProtoSender]) -> bool:
+    """Return a sender to the pool; False means the caller should disconnect it."""
+    if sender is None or not sender.is_connected():
+        return False
+    pool = _SENDER_POOL.setdefault(dc_id, [])
+    if len(pool) >= SENDER_POOL_MAX_PER_DC:
+        return False
+    pool.append(sender)
+    return True
+
+
 TypeLocation = Union[Document, InputDocumentFileLocation, InputPeerPhotoFileLocation,
                      InputFileLocation, InputPhotoFileLocation]
 
 
+class RetryGate:
+    """Caps how many senders may back off and retry at the same time.
+
+    The cap starts at `limit` and drops by one (down to 1) after every
+    `shrink_after` consecutive failures, so a struggling DC gets fewer retries.
+    """
+
+    def __init__(self, limit: int, shrink_after: int = 5) -> None:
+        self.limit = max(1, limit)
+        self.shrink_after = shrink_after
+        self.consecutive_failures = 0
+        self._active = 0
+        self._condition = asyncio.Condition()
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= self.shrink_after and self.limit > 1:
+            self.limit -= 1
+            self.consecutive_failures = 0
+            log.warning(f"Sustained download failures, allowing {self.limit} concurrent retries")
+
+    def record_success(self) -> None:
+        self.consecutive_failures = 0
+
+    async def __aenter__(self) -> 'RetryGate':
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._active < self.limit)
+            self._active += 1
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        async with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+
+
 class DownloadSender:
     client: TelegramClient
     sender: MTProtoSender
-    request: GetFileRequest
-    remaining: int
-    stride: int
+    location: TypeLocation
+    limit: int
 
     def __init__(self, client: TelegramClient, sender: MTProtoSender, file: TypeLocation, 
-                 offset: int, limit: int, stride: int, count: int) -> None:
+                 limit: int, dc_id: Optional[int] = None,
+                 retry_gate: Optional['RetryGate'] = None,
+                 on_rtt: Optional[Callable[[float], None]] = None) -> None:
         self.sender = sender
+        self.dc_id = dc_id
+        self.retry_gate = retry_gate
+        # Called with the duration of each first-attempt request (retries are not sampled)
+        self.on_rtt = on_rtt
         self.client = client
-        self.request = GetFileRequest(file, offset=offset, limit=limit)
-        self.stride = stride
-        self.remaining = count
+        self.location = file
+        self.limit = limit
 
-    async def next(self) -> Optional[bytes]:
-        if not self.remaining:
-            return None
+    async def next_at(self, offset: int) -> bytes:
+        """Fetch the part starting at the given absolute offset.
+
+        Builds its own request so several calls can be in flight on one sender.
+        """
+        request = GetFileRequest(self.location, offset=offset, limit=self.limit)
         
-        # Retry with exponential backoff
-        max_retries = None  # Infinite retries
-        base_delay = 1  # Start with 1 second
-        max_delay = 300  # Max 5 minutes
+        # Retry transient failures with exponential backoff (no retry limit)
         attempt = 0
+        backoff = 0.0
+        reconnect = False
         
         while True:
             try:
-                result = await self.client._call(self.sender, self.request)
-                self.remaining -= 1
-                self.request.offset += self.stride
+                if backoff:
+                    result = await self._retry_call(request, backoff, reconnect)
+                else:
+                    started = time.monotonic()
+                    result = await self.client._call(self.sender, request)
+                    # Only a clean round trip: FloodWait sleeps and backoff would inflate the RTT
+                    if not attempt and self.on_rtt is not None:
+                        self.on_rtt(time.monotonic() - started)
+                if attempt and self.retry_gate is not None:
+                    self.retry_gate.record_success()
                 return result.bytes
                 
             except FloodWaitError as e:
@@ -77,33 +174,7 @@ class DownloadSender:
                 log.warning(f"Rate limited, waiting {wait_time} seconds")
                 await asyncio.sleep(wait_time)
                 attempt += 1
-                continue
-                
-            except (TimeoutError, ServerError, OSError, Exception) as e:
-                # OSError covers network connection issues, Exception catches other connectivity problems
-                attempt += 1
-                # Calculate delay with exponential backoff + jitter
-                delay = min(base_delay * (2 ** min(attempt - 1, 10)), max_delay)
-                jitter = random.uniform(0.5, 1.5)
-                actual_delay = delay * jitter
-                
-                log.warning(f"Connection error (attempt {attempt}): {e}. Retrying in {actual_delay:.1f}s")
-                await asyncio.sleep(actual_delay)
-                
-                # Try to reconnect sender after connection errors
-                if isinstance(e, (OSError, TimeoutError)):
-                    try:
-                        await self.sender.disconnect()
-                        # Recreate connection
-                        dc = await self.client._get_dc(self.sender._dc_id if hasattr(self.sender, '_dc_id') else None)
-                        await self.sender.connect(self.client._connection(
-                            dc.ip_address, dc.port, dc.id,
-                            loggers=self.client._log,
-                            proxy=self.client._proxy
-                        ))
-                    except Exception as reconnect_error:
-                        log.debug(f"Reconnection attempt failed: {reconnect_error}")
-                
+                backoff = 0.0
                 continue
                 
             except AuthKeyError as e:
@@ -111,28 +182,62 @@ class DownloadSender:
                 raise  # Re-authentication required, don't retry
                 
             except RPCError as e:
-                if e.code in [500, 503]:  # Server errors that might be temporary
+                # ServerError (500) and Telegram-side TimeoutError (503) are temporary
+                if e.code in [500, 503]:
                     attempt += 1
-                    delay = min(base_delay * (2 ** min(attempt - 1, 10)), max_delay)
-                    jitter = random.uniform(0.5, 1.5)
-                    actual_delay = delay * jitter
-                    
-                    log.warning(f"Server error (attempt {attempt}): {e}. Retrying in {actual_delay:.1f}s")
-                    await asyncio.sleep(actual_delay)
+                    backoff = self._backoff_delay(attempt)
+                    reconnect = False
+                    if self.retry_gate is not None:
+                        self.retry_gate.record_failure()
+                    log.warning(f"Server error (attempt {attempt}): {e}. Retrying in {backoff:.1f}s")
                     continue
-                else:
-                    log.error(f"Non-retryable RPC error: {e}")
-                    raise
-                    
-            except Exception as e:
-                log.error(f"Unexpected error in download: {e}")
+                log.error(f"Non-retryable RPC error: {e}")
                 raise
+                
+            except (ConnectionError, OSError, asyncio.TimeoutError) as e:
+                attempt += 1
+                backoff = self._backoff_delay(attempt)
+                reconnect = True
+                if self.retry_gate is not None:
+                    self.retry_gate.record_failure()
+                log.warning(f"Connection error (attempt {attempt}): {e}. Retrying in {backoff:.1f}s")
+                continue
+
+    async def _retry_call(self, request: GetFileRequest, delay: float, reconnect: bool):
+        """Back off and retry; the shared retry gate limits how many senders do this at once."""
+        async with (self.retry_gate or contextlib.nullcontext()):
+            await asyncio.sleep(delay)
+            # MTProtoSender reconnects on its own; only rebuild it once it has given up
+            if reconnect and not self.sender.is_connected():
+                await self._reconnect()
+            return await self.client._call(self.sender, request)
+
+    @staticmethod
+    def _backoff_delay(attempt: int, base_delay: float = 1, max_delay: float = 300) -> float:
+        """Exponential backoff with jitter, capped at max_delay seconds."""
+        delay = min(base_delay * (2 ** min(attempt - 1, 10)), max_delay)
+        return delay * random.uniform(0.5, 1.5)
+
+    async def _reconnect(self) -> None:
+        try:
+            await self.sender.disconnect()
+            dc = await self.client._get_dc(self.dc_id)
+            await self.sender.connect(self.client._connection(
+                dc.ip_address, dc.port, dc.id,
+                loggers=self.client._log,
+                proxy=self.client._proxy
+            ))
+        except Exception as reconnect_error:
+            log.debug(f"Reconnection attempt failed: {reconnect_error}")
 
     def disconnect(self) -> Awaitable[None]:
         return self.sender.disconnect()
 
 
 class ParallelDownloader:
+    # Shared across downloads so the next one can be sized from what the last one saw
+    rtt_estimate_s: Optional[float] = None
+
     client: TelegramClient
     loop: asyncio.AbstractEventLoop
     dc_id: int
@@ -152,38 +257,58 @@ class ParallelDownloader:
         self.auth_key = (None if dc_id and self.client.session.dc_id != dc_id
                         else self.client.session.auth_key)
         self.senders = None
+        self._retry_gate: Optional[RetryGate] = None
         self.network_monitor = network_monitor
         self.allow_mobile_data = allow_mobile_data
+        # Resolved once so the per-part permission check is a single attribute test
+        self._net_check_enabled = bool(NETWORK_MONITOR_AVAILABLE and network_monitor
+                                       and not allow_mobile_data)
         self.paused = False
         self.pause_callback = None
         self.resume_callback = None
 
-    async def _cleanup(self) -> None:
+    async def _cleanup(self, reuse: bool = True) -> None:
+        """Release senders to the shared pool (or disconnect them when reuse is False)."""
         if self.senders:
-            await asyncio.gather(*[sender.disconnect() for sender in self.senders])
+            to_disconnect = [sender.disconnect() for sender in self.senders
+                             if not (reuse and _release_sender(self.dc_id, sender.sender))]
+            await asyncio.gather(*to_disconnect)
         self.senders = None
 
     @staticmethod
     def _get_connection_count(file_size: int, max_count: int = 8,
-                             full_size: int = 100 * 1024 * 1024) -> int:
-        """Get optimal connection count based on file size.
+                             part_size: int = MAX_PART_SIZE,
+                             rtt_s: Optional[float] = None,
+                             bandwidth: int = ASSUMED_CONNECTION_BANDWIDTH) -> int:
+        """Get connection count from the bandwidth-delay product.
         
         Args:
             file_size: Size of file in bytes
             max_count: Maximum connections (reduced from 20 to 8 to avoid rate limits)
-            full_size: File size threshold for max connections
+            part_size: Bytes fetched per request
+            rtt_s: Estimated request round trip in seconds (None uses max_count)
+            bandwidth: Assumed throughput of one connection in bytes/s
         """
-        if file_size > full_size:
-            return max_count
-        return max(1, math.ceil((file_size / full_size) * max_count))
+        if rtt_s:
+            wanted = math.ceil(rtt_s * bandwidth / part_size)
+        else:
+            wanted = max_count
+        # More connections than parts would only sit idle
+        part_count = max(1, math.ceil(file_size / part_size))
+        return max(1, min(max_count, wanted, part_count))
+
+    @classmethod
+    def _record_rtt(cls, sample_s: float) -> None:
+        """Fold one request latency sample into the shared EWMA estimate."""
+        if cls.rtt_estimate_s is None:
+            cls.rtt_estimate_s = sample_s
+        else:
+            cls.rtt_estimate_s += RTT_EWMA_ALPHA * (sample_s - cls.rtt_estimate_s)
     
     async def _check_network_permission(self):
         """Check if current network connection is allowed for downloads"""
-        if not NETWORK_MONITOR_AVAILABLE or not self.network_monitor:
-            return  # No network monitoring available, allow all connections
-        
-        if self.allow_mobile_data:
-            return  # Mobile data allowed, no restrictions
+        if not self._net_check_enabled:
+            return  # No monitor, or mobile data allowed: no restrictions
         
         # Check current connection type
         connection_type = self.network_monitor.detect_connection_type()
@@ -236,31 +361,26 @@ class ParallelDownloader:
 
     async def _init_download(self, connections: int, file: TypeLocation, part_count: int,
                            part_size: int) -> None:
-        minimum, remainder = divmod(part_count, connections)
-
-        def get_part_count() -> int:
-            nonlocal remainder
-            if remainder > 0:
-                remainder -= 1
-                return minimum + 1
-            return minimum
-
-        # Create download senders
+        # Create download senders; parts are handed out per request, not per sender.
+        # The first sender is created alone so it can export the auth key for the others
         self.senders = [
-            await self._create_download_sender(file, 0, part_size, connections * part_size,
-                                             get_part_count()),
+            await self._create_download_sender(file, part_size),
             *await asyncio.gather(
-                *[self._create_download_sender(file, i, part_size, connections * part_size,
-                                             get_part_count())
-                  for i in range(1, connections)])
+                *[self._create_download_sender(file, part_size)
+                  for _ in range(1, connections)])
         ]
 
-    async def _create_download_sender(self, file: TypeLocation, index: int, part_size: int,
-                                    stride: int, part_count: int) -> DownloadSender:
+    async def _create_download_sender(self, file: TypeLocation, part_size: int) -> DownloadSender:
         return DownloadSender(self.client, await self._create_sender(), file, 
-                            index * part_size, part_size, stride, part_count)
+                            part_size, self.dc_id, self._retry_gate, self._record_rtt)
 
     async def _create_sender(self) -> MTProtoSender:
+        pooled = _acquire_pooled_sender(self.dc_id)
+        if pooled:
+            log.debug(f"Reusing pooled sender for DC {self.dc_id}")
+            self.auth_key = self.auth_key or pooled.auth_key
+            return pooled
+        
         dc = await self.client._get_dc(self.dc_id)
         sender = MTProtoSender(self.auth_key, loggers=self.client._log)
         await sender.connect(self.client._connection(dc.ip_address, dc.port, dc.id,
@@ -281,92 +401,147 @@ class ParallelDownloader:
                       connection_count: Optional[int] = None,
                       progress_callback=None,
                       pause_callback=None,
-                      resume_callback=None) -> bytes:
+                      resume_callback=None,
+                      output_fd: Optional[int] = None,
+                      output_file: Optional[BinaryIO] = None,
+                      requests_per_connection: int = DEFAULT_REQUESTS_PER_CONNECTION,
+                      max_connections: int = 8) -> Optional[bytes]:
         """Download file using parallel connections.
         
         Args:
             file: File location to download
             file_size: Size of file in bytes
-            part_size_kb: Part size in KB (default: auto-calculated)
+            part_size_kb: Part size in KB (default and maximum: 1024)
             connection_count: Number of connections (default: auto-calculated)
             progress_callback: Function called with (downloaded_bytes, total_bytes)
+            output_fd: Open file descriptor; parts are written at their offsets
+                instead of being buffered in memory
+            output_file: Binary file object written sequentially; only parts that
+                arrive ahead of the write position are buffered (used without pwrite)
+            requests_per_connection: Requests pipelined on each connection
+            max_connections: Upper bound for the auto-calculated connection count
         
         Returns:
-            Complete file data as bytes
+            Complete file data as bytes, or None when writing to output_fd/output_file
         """
         # Store callbacks
         self.pause_callback = pause_callback
         self.resume_callback = resume_callback
         
-        connection_count = connection_count or self._get_connection_count(file_size)
-        part_size = int((part_size_kb or utils.get_appropriated_part_size(file_size)) * 1024)
+        # Fewer, larger requests: each GetFileRequest pays a full MTProto round trip
+        part_size = min(int((part_size_kb or MAX_PART_SIZE / 1024) * 1024), MAX_PART_SIZE)
+        connection_count = connection_count or self._get_connection_count(
+            file_size, max_count=max_connections, part_size=part_size,
+            rtt_s=self.rtt_estimate_s)
         part_count = math.ceil(file_size / part_size)
         
         log.info(f"Starting parallel download: {connection_count} connections, "
-                f"part_size={part_size}, part_count={part_count}")
+                f"part_size={part_size}, part_count={part_count}, "
+                f"requests_per_connection={requests_per_connection}")
         
         # Check network connection before starting
         await self._check_network_permission()
         
+        # At most half the connections may sit in backoff/retry at once
+        self._retry_gate = RetryGate(connection_count // 2)
         await self._init_download(connection_count, file, part_count, part_size)
 
-        # Download all parts
-        downloaded_parts = []
+        # Every sender pulls the next pending offset from a shared iterator as soon
+        # as its previous part lands, so one slow connection never stalls the rest
+        offsets = iter(range(0, part_count * part_size, part_size))
+        # Indexed by part number, so completion order can never reorder the file
+        in_memory = output_fd is None and output_file is None
+        downloaded_parts: List[Optional[bytes]] = [None] * part_count if in_memory else []
+        pending_parts = []  # min-heap of (offset, data) waiting for output_file
+        next_write_offset = 0
         downloaded_bytes = 0
-        part = 0
-        
-        while part < part_count:
-            # Check network permission before each batch of downloads
-            await self._check_network_permission()
-            
-            # Wait if paused
-            while self.paused:
-                log.info("Download paused, waiting for resume...")
-                await asyncio.sleep(1)
-            
-            tasks = []
-            for sender in self.senders:
-                tasks.append(self.loop.create_task(sender.next()))
-            
-            # Use asyncio.gather with return_exceptions to handle individual failures
-            try:
-                results = await asyncio.gather(*tasks, return_exceptions=True)
+        parts_done = 0
+        # Progress usually drives a Telegram message edit, so don't report every part
+        last_cb_ts = time.monotonic()
+        last_cb_bytes = 0
+        cb_byte_step = file_size * PROGRESS_MIN_FRACTION
+
+        async def run_sender(sender: DownloadSender) -> None:
+            nonlocal downloaded_bytes, parts_done, last_cb_ts, last_cb_bytes, next_write_offset
+            for offset in offsets:
+                # Check network permission before each part
+                await self._check_network_permission()
+                
+                # Wait if paused
+                while self.paused:
+                    log.info("Download paused, waiting for resume...")
+                    await asyncio.sleep(1)
+                
+                data = await sender.next_at(offset)
+                if not data:
+                    return
                 
-                for i, result in enumerate(results):
-                    if isinstance(result, Exception):
-                        log.error(f"Sender {i} failed: {result}")
-                        # Don't add failed result, let retry handle it
-                        continue
-                    
-                    data = result
-                    if not data:
-                        break
-                    
-                    downloaded_parts.append(data)
-                    downloaded_bytes += len(data)
-                    
-                    # Call progress callback if provided
-                    if progress_callback:
+                if output_fd is not None:
+                    os.pwrite(output_fd, data, offset)
+                elif output_file is not None:
+                    heapq.heappush(pending_parts, (offset, data))
+                    while pending_parts and pending_parts[0][0] == next_write_offset:
+                        _, chunk = heapq.heappop(pending_parts)
+                        output_file.write(chunk)
+                        next_write_offset += len(chunk)
+                else:
+                    downloaded_parts[offset // part_size] = data
+                downloaded_bytes += len(data)
+                
+                # Call progress callback if provided (throttled)
+                if progress_callback:
+                    now = time.monotonic()
+                    if (downloaded_bytes - last_cb_bytes > cb_byte_step
+                            or now - last_cb_ts > PROGRESS_MIN_INTERVAL_S):
+                        last_cb_ts = now
+                        last_cb_bytes = downloaded_bytes
                         progress_callback(downloaded_bytes, file_size)
-                    
-                    part += 1
-                    log.debug(f"Part {part}/{part_count} downloaded ({len(data)} bytes)")
-                    
-            except Exception as e:
-                log.error(f"Batch download error: {e}")
-                # Continue to next batch, individual senders will retry
+                
+                parts_done += 1
+                log.debug(f"Part {parts_done}/{part_count} downloaded ({len(data)} bytes)")
+
+        await _run_together([run_sender(sender)
+                             for sender in self.senders
+                             for _ in range(max(1, requests_per_connection))])
+
+        # Always report the final state once
+        if progress_callback and last_cb_bytes != downloaded_bytes:
+            progress_callback(downloaded_bytes, file_size)
 
         log.debug("Parallel download finished, cleaning up connections")
         await self._cleanup()
 
+        if not in_memory:
+            return None
+
         # Combine all parts
         return b''.join(downloaded_parts)
 
 
+async def _run_together(coros) -> None:
+    """Run coroutines concurrently; the first failure cancels the rest.
+
+    asyncio.TaskGroup on Python 3.11+, an equivalent gather() on older interpreters.
+    """
+    if hasattr(asyncio, 'TaskGroup'):
+        async with asyncio.TaskGroup() as group:
+            for coro in coros:
+                group.create_task(coro)
+        return
+    tasks = [asyncio.ensure_future(coro) for coro in coros]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
 async def fast_download_file(client: TelegramClient, document: Document, 
                            progress_callback=None, max_connections: int = 8,
                            wifi_only: bool = True, pause_callback=None,
-                           resume_callback=None) -> bytes:
+                           resume_callback=None, output_fd: Optional[int] = None,
+                           output_file: Optional[BinaryIO] = None) -> Optional[bytes]:
     """Fast parallel download of a Telegram file.
     
     Args:
@@ -377,9 +552,11 @@ async def fast_download_file(client: TelegramClient, document: Document,
         wifi_only: Only download when connected to WiFi (not mobile data)
         pause_callback: Function called when download is paused
         resume_callback: Function called when download is resumed
+        output_fd: Open file descriptor to write parts into directly
+        output_file: Binary file object to write parts into sequentially
     
     Returns:
-        Complete file data as bytes
+        Complete file data as bytes, or None when writing to output_fd/output_file
     """
     file_size = document.size
     dc_id, location = utils.get_input_location(document)
@@ -388,7 +565,7 @@ async def fast_download_file(client: TelegramClient, document: Document,
     network_monitor = None
     if wifi_only and NETWORK_MONITOR_AVAILABLE:
         try:
-            network_monitor = NetworkMonitor()
+            network_monitor = get_network_monitor()
             log.info("Network monitoring enabled for WiFi-only downloads")
         except Exception as e:
             log.warning(f"Failed to initialize network monitor: {e}")
@@ -406,22 +583,38 @@ async def fast_download_file(client: TelegramClient, document: Document,
         data = await downloader.download(
             location, 
             file_size,
-            connection_count=min(max_connections, downloader._get_connection_count(file_size)),
+            max_connections=max_connections,
             progress_callback=progress_callback,
             pause_callback=pause_callback,
-            resume_callback=resume_callback
+            resume_callback=resume_callback,
+            output_fd=output_fd,
+            output_file=output_file
         )
         return data
     except Exception as e:
         log.error(f"Fast download failed: {e}")
         # Cleanup on error
         try:
-            await downloader._cleanup()
+            await downloader._cleanup(reuse=False)
         except:
             pass
         raise
 
 
+def _preallocate(fd: int, size: int) -> None:
+    """Reserve the file's extents up front so parallel writes land contiguously."""
+    if size <= 0:
+        return
+    if hasattr(os, 'posix_fallocate'):
+        try:
+            os.posix_fallocate(fd, 0, size)
+            return
+        except OSError as e:
+            # e.g. filesystems without fallocate support (some Android storage)
+            log.debug(f"posix_fallocate unavailable, falling back to ftruncate: {e}")
+    os.ftruncate(fd, size)
+
+
 async def fast_download_to_file(client: TelegramClient, document: Document, 
                                file_path: str, progress_callback=None, 
                                max_connections: int = 8, wifi_only: bool = True,
@@ -438,18 +631,30 @@ async def fast_download_to_file(client: TelegramClient, document: Document,
         pause_callback: Function called when download is paused
         resume_callback: Function called when download is resumed
     """
-    # Download to memory first, then write to file
-    # This is simpler than coordinating parallel writes to disk
-    data = await fast_download_file(
-        client, document, progress_callback, max_connections, 
-        wifi_only, pause_callback, resume_callback
-    )
+    if not hasattr(os, 'pwrite'):
+        # No positional writes (e.g. Windows): stream parts in order through a
+        # buffered writer, holding only out-of-order parts in memory
+        with open(file_path, 'wb') as f:
+            await fast_download_file(
+                client, document, progress_callback, max_connections,
+                wifi_only, pause_callback, resume_callback, output_file=f
+            )
+        log.info(f"Fast download completed: {file_path} ({document.size} bytes)")
+        return
     
-    # Write to file
-    with open(file_path, 'wb') as f:
-        f.write(data)
+    # Preallocate the file and write each part at its absolute offset so the
+    # whole file is never held in memory
+    fd = os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        _preallocate(fd, document.size)
+        await fast_download_file(
+            client, document, progress_callback, max_connections, 
+            wifi_only, pause_callback, resume_callback, output_fd=fd
+        )
+    finally:
+        os.close(fd)
     
-    log.info(f"Fast download completed: {file_path} ({len(data)} bytes)")
+    log.info(f"Fast download completed: {file_path} ({document.size} bytes)")
 
 
 # Convenience function for WiFi-only downloads
@@ -4,66 +4,360 @@ Contains functions for file hashing, extraction, and file system operations.
 """
 
 import os
+import re
+import sys
+import mmap
+import asyncio
 import hashlib
-import shutil
 import subprocess
 import logging
-from .constants import BASE_DIR
+import tarfile
+import traceback
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Union
+from .utils import resolve_binary
 
 logger = logging.getLogger('extractor')
 
+# Compiled once at import; is_password_error runs on every failed extraction.
+# One case-insensitive pass, no lowercased copy; bytes variant for raw tool stderr.
+_PASSWORD_ERROR_RE = re.compile(r'(?:wrong |incorrect )?password', re.IGNORECASE)
+_PASSWORD_ERROR_RE_BYTES = re.compile(rb'(?:wrong |incorrect )?password', re.IGNORECASE)
 
+
+@lru_cache(maxsize=1)
 def check_file_command_supports_mime():
     """Checks if the system's 'file' command supports the --mime-type flag."""
     # On some systems like Termux, the 'file' command is older and uses -i.
     # patoolib uses --mime-type, causing errors. This check prevents that.
-    dummy_path = os.path.join(BASE_DIR, 'file_check.tmp')
+    # The result cannot change while the process runs, so it is computed once.
     try:
-        with open(dummy_path, 'w') as f:
-            f.write('test')
+        # Sample is piped on stdin, so no temp file is written.
         # We capture stderr to prevent it from printing to the console.
         result = subprocess.run(
-            ['file', '--brief', '--mime-type', dummy_path],
-            check=True, capture_output=True
+            ['file', '--brief', '--mime-type', '-'],
+            input=b'test', check=True, capture_output=True
         )
         # Check for the expected output format
         return 'text/plain' in result.stdout.decode().lower()
-    except (subprocess.CalledProcessError, FileNotFoundError):
+    except (subprocess.CalledProcessError, OSError):
         return False
-    finally:
-        if os.path.exists(dummy_path):
-            os.remove(dummy_path)
 
 
-def compute_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+_patoolib = None
+
+
+def _get_patoolib():
+    """Import patoolib once on first use; raises ImportError if it is not installed."""
+    global _patoolib
+    if _patoolib is None:
+        import patoolib
+        _patoolib = patoolib
+    return _patoolib
+
+
+def _advise_sequential(fd: int) -> None:
+    """Hint the kernel to use a larger readahead window for a front-to-back read."""
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+    except (AttributeError, OSError):
+        # Not available on every platform (e.g. Windows); the hint is optional
+        pass
+
+
+# Largest file hashed through a memory map; 32-bit builds can't map multi-GB files
+_MMAP_HASH_MAX = sys.maxsize if sys.maxsize > 2 ** 32 else 512 * 1024 * 1024
+
+
+def _sha256_mmap(path: str):
+    """Hash a file through a read-only memory map, so no read() copies are made.
+
+    Returns None when the file can't be mapped (empty, too large, pipes,
+    restricted filesystems) so the caller can fall back to reading it.
+    """
+    try:
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0 or size > _MMAP_HASH_MAX:
+                return None
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                advice = getattr(mmap, 'MADV_SEQUENTIAL', None)
+                if advice is not None:
+                    # Aggressive readahead, early eviction of pages already hashed
+                    mm.madvise(advice)
+                return hashlib.sha256(mm).hexdigest()
+    except (OSError, ValueError):
+        return None
+
+
+def compute_sha256(path: str, chunk_size: int = 4 * 1024 * 1024) -> str:
     """Compute SHA256 hash of a file."""
+    digest = _sha256_mmap(path)
+    if digest is not None:
+        return digest
+    if hasattr(hashlib, 'file_digest'):
+        # Python 3.11+: read loop runs in C; unbuffered so it can readinto its own buffer
+        with open(path, 'rb', buffering=0) as f:
+            _advise_sequential(f.fileno())
+            return hashlib.file_digest(f, 'sha256').hexdigest()
     h = hashlib.sha256()
-    with open(path, 'rb') as f:
+    with open(path, 'rb', buffering=0) as f:
+        _advise_sequential(f.fileno())
+        # Don't allocate a multi-MiB buffer for small files
+        size = os.fstat(f.fileno()).st_size
+        chunk_size = max(64 * 1024, min(chunk_size, size))
+        # Reuse one buffer instead of allocating a new bytes object per chunk
+        buf = bytearray(chunk_size)
+        mv = memoryview(buf)
         while True:
-            chunk = f.read(chunk_size)
-            if not chunk:
+            n = f.readinto(mv)
+            if not n:
                 break
-            h.update(chunk)
+            h.update(mv[:n])
     return h.hexdigest()
 
 
-def extract_with_password(archive_path: str, extract_path: str, password: str) -> None:
-    """Extract password-protected archive using 7z."""
+def _run_extractor(cmd, timeout=None):
+    """Run an extraction tool, discarding its file listing.
+
+    Only stderr is captured (as bytes) and decoded on failure. subprocess.run
+    kills the child if the timeout expires.
+    Returns tuple: (returncode: int, stderr_text: str)
+    """
+    res = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=timeout)
+    err_text = res.stderr.decode('utf-8', 'replace') if res.returncode != 0 else ''
+    return res.returncode, err_text
+
+
+async def _run_extractor_async(cmd, timeout=None):
+    """Coroutine counterpart of _run_extractor that doesn't tie up an executor thread.
+
+    The child is killed if the timeout expires or the caller is cancelled.
+    Returns tuple: (returncode: int, stderr_text: str)
+    """
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        _, err = await asyncio.wait_for(proc.communicate(), timeout)
+    except (asyncio.TimeoutError, asyncio.CancelledError):
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        raise
+    err_text = err.decode('utf-8', 'replace') if proc.returncode != 0 else ''
+    return proc.returncode, err_text
+
+
+def _password_extract_cmd(archive_path: str, extract_path: str, password: str) -> list:
     # Use 7z for universal extraction; requires p7zip (Termux: pkg install p7zip)
-    sevenzip = shutil.which('7z') or shutil.which('7za')
+    sevenzip = resolve_binary('7z')
     if not sevenzip:
         raise RuntimeError('7z binary not found; install p7zip to extract password-protected archives')
-    cmd = [sevenzip, 'x', '-y', f'-p{password}', f'-o{extract_path}', archive_path]
+    return [sevenzip, 'x', '-y', f'-p{password}', f'-o{extract_path}', archive_path]
+
+
+def extract_with_password(archive_path: str, extract_path: str, password: str) -> None:
+    """Extract password-protected archive using 7z."""
+    cmd = _password_extract_cmd(archive_path, extract_path, password)
+    logger.info('Running password extraction via 7z')
+    returncode, err_text = _run_extractor(cmd)
+    if returncode != 0:
+        raise RuntimeError(f'7z extraction failed (code {returncode}): {err_text[-400:]}')
+
+
+async def extract_with_password_async(archive_path: str, extract_path: str, password: str) -> None:
+    """Extract password-protected archive using 7z without blocking the event loop."""
+    cmd = _password_extract_cmd(archive_path, extract_path, password)
     logger.info('Running password extraction via 7z')
-    res = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-    if res.returncode != 0:
-        raise RuntimeError(f'7z extraction failed (code {res.returncode}): {res.stdout[-400:]}')
+    returncode, err_text = await _run_extractor_async(cmd)
+    if returncode != 0:
+        raise RuntimeError(f'7z extraction failed (code {returncode}): {err_text[-400:]}')
+
+
+def is_password_error(err_text: Union[str, bytes]) -> bool:
+    """Check if error text (str or raw stderr bytes) indicates a password-related error."""
+    if isinstance(err_text, bytes):
+        return _PASSWORD_ERROR_RE_BYTES.search(err_text) is not None
+    return _PASSWORD_ERROR_RE.search(err_text) is not None
 
 
-def is_password_error(err_text: str) -> bool:
-    """Check if error text indicates a password-related error."""
-    t = err_text.lower()
-    return 'password' in t or 'wrong password' in t or 'incorrect password' in t
+def _extract_with_libarchive(archive_path: str, extract_path: str) -> int:
+    """Extract an archive in-process with libarchive. Returns the number of files written."""
+    import libarchive
+    
+    root = os.path.realpath(extract_path)
+    written = 0
+    with libarchive.file_reader(archive_path) as archive:
+        for entry in archive:
+            target = os.path.realpath(os.path.join(root, entry.pathname))
+            if target != root and not target.startswith(root + os.sep):
+                logger.warning(f'Skipping archive entry outside extraction directory: {entry.pathname}')
+                continue
+            if entry.isdir:
+                os.makedirs(target, exist_ok=True)
+                continue
+            if not entry.isfile:
+                # Symlinks, devices etc. are never sent as media
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as out:
+                for block in entry.get_blocks():
+                    out.write(block)
+            written += 1
+    return written
+
+
+def _extract_zip_members(zip_ref, extract_path):
+    """Extract ZIP members on a thread pool; zlib/bz2/lzma release the GIL while inflating."""
+    infos = zip_ref.infolist()
+    files = [info for info in infos if not info.is_dir()]
+    workers = min(os.cpu_count() or 1, len(files))
+    if workers <= 1:
+        zip_ref.extractall(extract_path)
+        return
+    
+    # Create directories up front so workers don't race on makedirs
+    for info in infos:
+        if info.is_dir():
+            zip_ref.extract(info, extract_path)
+    root = os.path.realpath(extract_path)
+    for parent in {os.path.dirname(info.filename) for info in files}:
+        target = os.path.realpath(os.path.join(root, parent))
+        if parent and target.startswith(root + os.sep):
+            os.makedirs(target, exist_ok=True)
+    
+    # ZipFile serialises reads of the shared handle internally; decompression runs in parallel
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for _ in pool.map(lambda info: zip_ref.extract(info, extract_path), files):
+            pass
+
+
+def _extract_zip(temp_archive_path, extract_path, filename, attempted_methods) -> bool:
+    """Extract with Python's zipfile module. Returns True on success."""
+    try:
+        logger.info('Attempting extraction with Python zipfile module')
+        attempted_methods.append('zipfile')
+        
+        # First, verify it's a valid zip file
+        if not zipfile.is_zipfile(temp_archive_path):
+            logger.warning(f'File does not appear to be a valid ZIP file: {filename}')
+            return False
+        with zipfile.ZipFile(temp_archive_path, 'r') as zip_ref:
+            # Get info about archive contents
+            file_list = zip_ref.namelist()
+            logger.info(f'ZIP archive contains {len(file_list)} files')
+            
+            # Extract all files
+            _extract_zip_members(zip_ref, extract_path)
+            logger.info(f'✓ ZIP archive extracted successfully using zipfile: {filename}')
+            return True
+            
+    except zipfile.BadZipFile as e:
+        logger.error(f'zipfile failed - BadZipFile: {e}')
+    except zipfile.LargeZipFile as e:
+        logger.error(f'zipfile failed - LargeZipFile (requires ZIP64): {e}')
+    except Exception as e:
+        logger.error(f'zipfile extraction failed with unexpected error: {e}')
+        logger.error(f'Traceback: {traceback.format_exc()}')
+    return False
+
+
+@contextmanager
+def _open_tar_stream(temp_archive_path, filename):
+    """Open a tar archive for one forward pass (no seeking back, no member index up front)."""
+    if _archive_suffix(filename) in ('.tar.gz', '.tgz'):
+        try:
+            # python-isal's igzip is a drop-in gzip replacement backed by ISA-L
+            from isal import igzip
+        except ImportError:
+            pass
+        else:
+            with igzip.open(temp_archive_path, 'rb') as gz, tarfile.open(fileobj=gz, mode='r|') as tar_ref:
+                yield tar_ref
+            return
+    # Compression is detected from the stream header
+    with tarfile.open(temp_archive_path, 'r|*') as tar_ref:
+        yield tar_ref
+
+
+def _extract_tar(temp_archive_path, extract_path, filename, attempted_methods) -> bool:
+    """Extract with Python's tarfile module. Returns True on success."""
+    try:
+        logger.info('Attempting extraction with Python tarfile module')
+        attempted_methods.append('tarfile')
+        
+        with _open_tar_stream(temp_archive_path, filename) as tar_ref:
+            # Extract all files
+            tar_ref.extractall(extract_path)
+            # Members are only known once the stream has been read through
+            logger.info(f'TAR archive contained {len(tar_ref.getmembers())} members')
+            logger.info(f'✓ TAR archive extracted successfully using tarfile: {filename}')
+            return True
+            
+    except tarfile.TarError as e:
+        logger.error(f'tarfile failed - TarError: {e}')
+    except Exception as e:
+        logger.error(f'tarfile extraction failed with unexpected error: {e}')
+        logger.error(f'Traceback: {traceback.format_exc()}')
+    return False
+
+
+def _extract_rar(temp_archive_path, extract_path, filename, attempted_methods) -> bool:
+    """Extract with the unrar command. Returns True on success."""
+    try:
+        unrar = resolve_binary('unrar')
+        if not unrar:
+            logger.warning('unrar command not found in PATH')
+            return False
+        logger.info(f'Attempting extraction with unrar command: {unrar}')
+        attempted_methods.append('unrar')
+        
+        returncode, err_text = _run_extractor(
+            [unrar, 'x', '-y', temp_archive_path, extract_path],
+            timeout=300  # 5 minute timeout
+        )
+        
+        if returncode == 0:
+            logger.info(f'✓ RAR archive extracted successfully using unrar: {filename}')
+            return True
+        logger.error(f'unrar failed with return code {returncode}')
+        logger.error(f'unrar stderr: {err_text}')
+            
+    except subprocess.TimeoutExpired:
+        logger.error('unrar extraction timed out after 5 minutes')
+    except Exception as e:
+        logger.error(f'unrar extraction failed with unexpected error: {e}')
+        logger.error(f'Traceback: {traceback.format_exc()}')
+    return False
+
+
+# Format-specific extractors keyed by (lowercase) extension, built once at import
+_EXT_HANDLERS = {
+    '.zip': _extract_zip,
+    '.tar': _extract_tar,
+    '.tar.gz': _extract_tar,
+    '.tgz': _extract_tar,
+    '.tar.bz2': _extract_tar,
+    '.tbz2': _extract_tar,
+    '.tar.xz': _extract_tar,
+    '.rar': _extract_rar,
+}
+
+
+def _archive_suffix(filename: str) -> str:
+    """Return the lowercase archive suffix, preferring known two-part ones such as .tar.gz."""
+    root, ext = os.path.splitext(filename.lower())
+    ext2 = os.path.splitext(root)[1] + ext
+    return ext2 if ext2 in _EXT_HANDLERS else ext
+
+
+def _format_handler(filename: str):
+    """Return the format-specific extractor for filename, or None."""
+    return _EXT_HANDLERS.get(_archive_suffix(filename))
 
 
 def extract_archive_async(temp_archive_path, extract_path, filename):
@@ -72,9 +366,10 @@ def extract_archive_async(temp_archive_path, extract_path, filename):
     Returns tuple: (success: bool, error_msg: str or None)
     
     This function tries multiple extraction methods in order:
-    1. patoolib (if 'file' command supports --mime-type)
-    2. Format-specific Python libraries (zipfile, tarfile)
-    3. Command-line tools (unrar, 7z)
+    1. libarchive (in-process, if python-libarchive-c is installed)
+    2. patoolib (if 'file' command supports --mime-type)
+    3. Format-specific Python libraries (zipfile, tarfile)
+    4. Command-line tools (unrar, 7z)
     
     The function is robust and will try all available methods before giving up.
     """
@@ -98,10 +393,24 @@ def extract_archive_async(temp_archive_path, extract_path, filename):
     # Track which methods we try
     attempted_methods = []
     
-    # Try patoolib first (only if file command is compatible)
+    # Try libarchive first: handles zip/7z/rar/tar without spawning a subprocess
     try:
-        import patoolib
-        if check_file_command_supports_mime():
+        import libarchive  # noqa: F401
+        logger.info('Attempting extraction with libarchive')
+        attempted_methods.append('libarchive')
+        written = _extract_with_libarchive(temp_archive_path, extract_path)
+        logger.info(f'✓ Archive extracted successfully using libarchive: {filename} ({written} files)')
+        return True, None
+    except ImportError:
+        logger.debug('libarchive not installed; skipping in-process extraction')
+    except Exception as libarchive_err:
+        logger.warning(f'libarchive extraction failed: {libarchive_err}')
+        logger.info('Falling back to alternative extraction methods')
+    
+    # Try patoolib next (only if file command is compatible)
+    try:
+        patoolib = _get_patoolib()
+        if FILE_CMD_OK:
             logger.info('Attempting extraction with patoolib')
             attempted_methods.append('patoolib')
             patoolib.extract_archive(temp_archive_path, outdir=extract_path, verbosity=-1)
@@ -116,114 +425,29 @@ def extract_archive_async(temp_archive_path, extract_path, filename):
     
     # Try format-specific extractors based on file extension
     logger.info('Trying format-specific extraction methods')
-    
-    # Method 1: Try zipfile for .zip files
-    if filename.lower().endswith('.zip'):
-        try:
-            import zipfile
-            logger.info('Attempting extraction with Python zipfile module')
-            attempted_methods.append('zipfile')
-            
-            # First, verify it's a valid zip file
-            if not zipfile.is_zipfile(temp_archive_path):
-                logger.warning(f'File does not appear to be a valid ZIP file: {filename}')
-            else:
-                with zipfile.ZipFile(temp_archive_path, 'r') as zip_ref:
-                    # Get info about archive contents
-                    file_list = zip_ref.namelist()
-                    logger.info(f'ZIP archive contains {len(file_list)} files')
-                    
-                    # Extract all files
-                    zip_ref.extractall(extract_path)
-                    logger.info(f'✓ ZIP archive extracted successfully using zipfile: {filename}')
-                    return True, None
-                    
-        except zipfile.BadZipFile as e:
-            logger.error(f'zipfile failed - BadZipFile: {e}')
-        except zipfile.LargeZipFile as e:
-            logger.error(f'zipfile failed - LargeZipFile (requires ZIP64): {e}')
-        except Exception as e:
-            logger.error(f'zipfile extraction failed with unexpected error: {e}')
-            import traceback
-            logger.error(f'Traceback: {traceback.format_exc()}')
-    
-    # Method 2: Try tarfile for tar archives
-    elif filename.lower().endswith(('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz')):
-        try:
-            import tarfile
-            logger.info('Attempting extraction with Python tarfile module')
-            attempted_methods.append('tarfile')
-            
-            with tarfile.open(temp_archive_path, 'r:*') as tar_ref:
-                # Get info about archive contents
-                members = tar_ref.getmembers()
-                logger.info(f'TAR archive contains {len(members)} members')
-                
-                # Extract all files
-                tar_ref.extractall(extract_path)
-                logger.info(f'✓ TAR archive extracted successfully using tarfile: {filename}')
-                return True, None
-                
-        except tarfile.TarError as e:
-            logger.error(f'tarfile failed - TarError: {e}')
-        except Exception as e:
-            logger.error(f'tarfile extraction failed with unexpected error: {e}')
-            import traceback
-            logger.error(f'Traceback: {traceback.format_exc()}')
-    
-    # Method 3: Try unrar for .rar files
-    elif filename.lower().endswith('.rar'):
-        try:
-            unrar = shutil.which('unrar')
-            if unrar:
-                logger.info(f'Attempting extraction with unrar command: {unrar}')
-                attempted_methods.append('unrar')
-                
-                result = subprocess.run(
-                    [unrar, 'x', '-y', temp_archive_path, extract_path], 
-                    capture_output=True, 
-                    text=True,
-                    timeout=300  # 5 minute timeout
-                )
-                
-                if result.returncode == 0:
-                    logger.info(f'✓ RAR archive extracted successfully using unrar: {filename}')
-                    return True, None
-                else:
-                    logger.error(f'unrar failed with return code {result.returncode}')
-                    logger.error(f'unrar stderr: {result.stderr}')
-            else:
-                logger.warning('unrar command not found in PATH')
-                
-        except subprocess.TimeoutExpired:
-            logger.error('unrar extraction timed out after 5 minutes')
-        except Exception as e:
-            logger.error(f'unrar extraction failed with unexpected error: {e}')
-            import traceback
-            logger.error(f'Traceback: {traceback.format_exc()}')
+    handler = _format_handler(filename)
+    if handler and handler(temp_archive_path, extract_path, filename, attempted_methods):
+        return True, None
     
     # Method 4: Try 7z as universal fallback for all formats
     logger.info('Trying 7z as universal fallback extractor')
     try:
-        sevenzip = shutil.which('7z') or shutil.which('7za')
+        sevenzip = resolve_binary('7z')
         if sevenzip:
             logger.info(f'Attempting extraction with 7z command: {sevenzip}')
             attempted_methods.append('7z')
             
-            result = subprocess.run(
-                [sevenzip, 'x', '-y', f'-o{extract_path}', temp_archive_path], 
-                capture_output=True, 
-                text=True,
+            returncode, err_text = _run_extractor(
+                [sevenzip, 'x', '-y', f'-o{extract_path}', temp_archive_path],
                 timeout=300  # 5 minute timeout
             )
             
-            if result.returncode == 0:
+            if returncode == 0:
                 logger.info(f'✓ Archive extracted successfully using 7z: {filename}')
                 return True, None
             else:
-                logger.error(f'7z failed with return code {result.returncode}')
-                logger.error(f'7z stderr: {result.stderr}')
-                logger.error(f'7z stdout: {result.stdout}')
+                logger.error(f'7z failed with return code {returncode}')
+                logger.error(f'7z stderr: {err_text}')
         else:
             logger.warning('7z command not found in PATH')
             
@@ -231,7 +455,6 @@ def extract_archive_async(temp_archive_path, extract_path, filename):
         logger.error('7z extraction timed out after 5 minutes')
     except Exception as e:
         logger.error(f'7z extraction failed with unexpected error: {e}')
-        import traceback
         logger.error(f'Traceback: {traceback.format_exc()}')
     
     # If we get here, all methods failed
@@ -5,12 +5,30 @@ Contains functions for video processing, format validation, and media operations
 
 import os
 import io
-import shutil
 import subprocess
 import asyncio
 import logging
 import hashlib
-from .constants import TRANSCODE_ENABLED, COMPRESSION_TIMEOUT_SECONDS, RECOVERY_DIR
+import json
+import mimetypes
+import traceback
+import sqlite3
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from functools import lru_cache
+try:
+    # orjson parses ffprobe's bytes output directly, without a str decode first
+    from orjson import loads as _json_loads
+except ImportError:
+    _json_loads = json.loads
+from .utils import resolve_binary
+from .constants import (
+    TRANSCODE_ENABLED, COMPRESSION_TIMEOUT_SECONDS, RECOVERY_DIR,
+    TRANSCODE_THREADS, TRANSCODE_SEMAPHORE_LIMIT, FFPROBE_SEMAPHORE_LIMIT, HW_ENCODE,
+    PROBE_CACHE_DB, PROBE_CACHE_MAX_AGE_DAYS
+)
 
 logger = logging.getLogger('extractor')
 
@@ -18,16 +36,359 @@ logger = logging.getLogger('extractor')
 TELEGRAM_PHOTO_SIZE_LIMIT = 10 * 1024 * 1024  # 10MB
 # Conservative list of extensions that typically work with Telegram albums
 COMPATIBLE_VIDEO_EXTENSIONS = {'.mp4', '.mkv', '.mov', '.m4v', '.webm', '.ts'}
+# Video codecs Telegram streams natively inside an MP4 container
+_TELEGRAM_VIDEO_CODECS = frozenset(('h264', 'avc1'))
+# Admission control for ffmpeg/ffprobe children started from async code, kept per event
+# loop and created on first use (on Python 3.9 a semaphore binds to the loop it was made in)
+_LOOP_SEMAPHORES = weakref.WeakKeyDictionary()
+
+
+def _loop_semaphore(name: str, limit: int) -> asyncio.Semaphore:
+    """Semaphore *name* for the running event loop, created on first use."""
+    semaphores = _LOOP_SEMAPHORES.setdefault(asyncio.get_running_loop(), {})
+    if name not in semaphores:
+        semaphores[name] = asyncio.Semaphore(limit)
+    return semaphores[name]
+
+
+def _transcode_semaphore() -> asyncio.Semaphore:
+    return _loop_semaphore('transcode', TRANSCODE_SEMAPHORE_LIMIT)
+
+
+def _probe_semaphore() -> asyncio.Semaphore:
+    return _loop_semaphore('probe', FFPROBE_SEMAPHORE_LIMIT)
 
 
 def is_ffmpeg_available():
     """Check if ffmpeg is available in the system"""
-    return shutil.which('ffmpeg') is not None
+    return resolve_binary('ffmpeg') is not None
 
 
 def is_ffprobe_available():
     """Check if ffprobe is available in the system"""
-    return shutil.which('ffprobe') is not None
+    return resolve_binary('ffprobe') is not None
+
+
+def _media_bin(name: str) -> str:
+    """Absolute path of ffmpeg/ffprobe when resolved, so exec skips the PATH walk."""
+    return resolve_binary(name) or name
+
+
+def warm_media_binaries() -> None:
+    """
+    Start throwaway `-version` runs of ffmpeg/ffprobe without waiting on them, so their shared
+    libraries (libavcodec, libx264, ...) are in the page cache before the first real transcode.
+    With HW_ENCODE, the hardware encoder is also resolved now, on a background thread.
+    """
+    if HW_ENCODE:
+        threading.Thread(target=_video_encoder_args, name='hw-encoder-probe', daemon=True).start()
+    for name in ('ffmpeg', 'ffprobe'):
+        binary = resolve_binary(name)
+        if not binary:
+            continue
+        try:
+            subprocess.Popen([binary, '-hide_banner', '-version'],
+                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except Exception as e:
+            logger.debug(f"Could not warm up {name}: {e}")
+
+
+def _probe_with_pyav(file_path: str) -> dict:
+    """
+    Read container and stream info in-process with PyAV (libav bindings), no ffprobe exec.
+    Returns a dict shaped like ffprobe's JSON output, or None if PyAV is unavailable or fails.
+    """
+    try:
+        import av
+    except ImportError:
+        return None
+    
+    try:
+        with av.open(file_path) as container:
+            streams = []
+            for stream in container.streams:
+                codec = stream.codec_context
+                entry = {
+                    'index': stream.index,
+                    'codec_type': stream.type,
+                    'codec_name': codec.name if codec else None,
+                }
+                if stream.type == 'video' and codec:
+                    entry['width'] = codec.width
+                    entry['height'] = codec.height
+                if stream.duration is not None and stream.time_base:
+                    entry['duration'] = str(float(stream.duration * stream.time_base))
+                streams.append(entry)
+            fmt = {'format_name': container.format.name}
+            if container.duration is not None:
+                fmt['duration'] = str(container.duration / av.time_base)
+        return {'format': fmt, 'streams': streams}
+    except Exception as e:
+        logger.debug(f"PyAV probe failed for {file_path}, falling back to ffprobe: {e}")
+        return None
+
+
+_PROBE_CACHE_SIZE = 512
+_probe_cache = OrderedDict()
+# Per-path locks so concurrent async callers share one probe instead of racing
+_probe_locks = {}
+
+
+def _probe_key(file_path: str) -> tuple:
+    """Cache key for one version of a file; mtime/size change on edits so they re-probe."""
+    st = os.stat(file_path)
+    return file_path, st.st_mtime_ns, st.st_size
+
+
+# Persistent second tier so probe results survive restarts; opened on first use
+_probe_db = None
+_probe_db_lock = threading.Lock()
+
+
+def _get_probe_db():
+    """Open the on-disk probe cache, pruning stale rows. Returns None if it can't be used."""
+    global _probe_db
+    with _probe_db_lock:
+        if _probe_db is None:
+            try:
+                conn = sqlite3.connect(PROBE_CACHE_DB, check_same_thread=False, timeout=5)
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute('PRAGMA synchronous=NORMAL')
+                conn.execute('CREATE TABLE IF NOT EXISTS probe_cache (key TEXT PRIMARY KEY, json BLOB, ts INTEGER)')
+                conn.execute('DELETE FROM probe_cache WHERE ts < ?',
+                             (int(time.time()) - PROBE_CACHE_MAX_AGE_DAYS * 86400,))
+                conn.commit()
+                _probe_db = conn
+            except sqlite3.Error as e:
+                logger.warning(f"Persistent probe cache unavailable, using memory only: {e}")
+                _probe_db = False
+    return _probe_db or None
+
+
+def _probe_db_key(key: tuple) -> str:
+    file_path, mtime_ns, size = key
+    return f"{hashlib.sha1(file_path.encode('utf-8', 'surrogateescape')).hexdigest()}:{mtime_ns}:{size}"
+
+
+def _probe_memory_get(key: tuple) -> dict:
+    info = _probe_cache.get(key)
+    if info is not None:
+        _probe_cache.move_to_end(key)
+    return info
+
+
+def _probe_memory_put(key: tuple, info: dict) -> None:
+    _probe_cache[key] = info
+    _probe_cache.move_to_end(key)
+    if len(_probe_cache) > _PROBE_CACHE_SIZE:
+        _probe_cache.popitem(last=False)
+
+
+def _probe_db_get(key: tuple) -> dict:
+    """Look a probe up in the on-disk cache (blocking; async callers use a thread)."""
+    db = _get_probe_db()
+    if db is None:
+        return None
+    try:
+        with _probe_db_lock:
+            row = db.execute('SELECT json FROM probe_cache WHERE key = ?', (_probe_db_key(key),)).fetchone()
+    except sqlite3.Error as e:
+        logger.debug(f"Probe cache lookup failed: {e}")
+        return None
+    return _json_loads(row[0]) if row is not None else None
+
+
+def _probe_db_put(key: tuple, info: dict) -> None:
+    """Store a probe in the on-disk cache (blocking; async callers use a thread)."""
+    # Failed probes stay memory-only so a fixed ffprobe install is picked up after a restart
+    if not info:
+        return
+    db = _get_probe_db()
+    if db is None:
+        return
+    try:
+        with _probe_db_lock:
+            db.execute('INSERT OR REPLACE INTO probe_cache (key, json, ts) VALUES (?, ?, ?)',
+                       (_probe_db_key(key), json.dumps(info), int(time.time())))
+            db.commit()
+    except sqlite3.Error as e:
+        logger.debug(f"Probe cache write failed: {e}")
+
+
+def _probe_cache_get(key: tuple) -> dict:
+    info = _probe_memory_get(key)
+    if info is None:
+        info = _probe_db_get(key)
+        if info is not None:
+            _probe_memory_put(key, info)
+    return info
+
+
+def _probe_cache_put(key: tuple, info: dict) -> None:
+    _probe_memory_put(key, info)
+    _probe_db_put(key, info)
+
+
+def _probe_stored_or_pyav(file_path: str, key: tuple) -> tuple:
+    """Thread side of probe_video_async: (info, from_disk) from the on-disk cache, else PyAV."""
+    info = _probe_db_get(key)
+    if info is not None:
+        return info, True
+    return _probe_with_pyav(file_path), False
+
+
+def clear_probe_cache() -> None:
+    """Drop all in-memory probe results (the on-disk cache is left alone)."""
+    _probe_cache.clear()
+
+
+# ffprobe reads up to 5MB / 5s by default; container headers need far less. MPEG-TS has
+# no global header, so its streams are only found by scanning packets at the defaults.
+_FAST_PROBE_ARGS = ('-probesize', '1000000', '-analyzeduration', '1000000', '-threads', '0')
+_DEEP_PROBE_EXTENSIONS = ('.ts', '.m2ts', '.mts')
+
+
+def _ffprobe_cmd(file_path: str) -> list:
+    fast_args = () if file_path.lower().endswith(_DEEP_PROBE_EXTENSIONS) else _FAST_PROBE_ARGS
+    return [
+        _media_bin('ffprobe'),
+        *fast_args,
+        '-v', 'quiet',
+        '-print_format', 'json',
+        '-show_format',
+        '-show_streams',
+        file_path
+    ]
+
+
+def _parse_ffprobe(file_path: str, returncode: int, stdout: bytes, stderr) -> dict:
+    if returncode == 0:
+        return _json_loads(stdout)
+    if isinstance(stderr, bytes):
+        stderr = stderr.decode('utf-8', 'replace')
+    logger.error(f"ffprobe failed for {file_path}: {stderr}")
+    return {}
+
+
+async def _run_media_command(cmd: list, timeout: float = None) -> tuple:
+    """Run ffmpeg/ffprobe without blocking the event loop or an executor thread.
+
+    The child is killed if the timeout expires or the caller is cancelled.
+    Returns tuple: (returncode: int, stdout: bytes, stderr_text: str)
+    """
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        out, err = await asyncio.wait_for(proc.communicate(), timeout)
+    except (asyncio.TimeoutError, asyncio.CancelledError):
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        raise
+    return (
+        proc.returncode,
+        out or b'',
+        (err or b'').decode('utf-8', 'replace'),
+    )
+
+
+def probe_video(file_path: str) -> dict:
+    """
+    Get ffprobe format and stream info for a video, running ffprobe at most once per file version.
+    Returns the parsed ffprobe JSON, or empty dict if probing fails.
+    """
+    if not is_ffprobe_available():
+        return {}
+    try:
+        key = _probe_key(file_path)
+        info = _probe_cache_get(key)
+        if info is None:
+            info = _probe_with_pyav(file_path)
+            if info is None:
+                result = subprocess.run(_ffprobe_cmd(file_path), capture_output=True, timeout=30)
+                info = _parse_ffprobe(file_path, result.returncode, result.stdout, result.stderr)
+            _probe_cache_put(key, info)
+        return info
+    except Exception as e:
+        logger.error(f"Error probing video {file_path}: {e}")
+        return {}
+
+
+async def probe_video_async(file_path: str) -> dict:
+    """Coroutine counterpart of probe_video; shares its cache."""
+    if not is_ffprobe_available():
+        return {}
+    try:
+        key = _probe_key(file_path)
+        info = _probe_memory_get(key)
+        if info is not None:
+            return info
+        lock = _probe_locks.setdefault(file_path, asyncio.Lock())
+        try:
+            async with lock:
+                info = _probe_memory_get(key)
+                if info is None:
+                    # SQLite and PyAV both block, so the disk tier is only touched from threads
+                    info, from_disk = await asyncio.to_thread(_probe_stored_or_pyav, file_path, key)
+                    if info is None:
+                        async with _probe_semaphore():
+                            result = await _run_media_command(_ffprobe_cmd(file_path), timeout=30)
+                        info = _parse_ffprobe(file_path, *result)
+                    _probe_memory_put(key, info)
+                    if not from_disk:
+                        await asyncio.to_thread(_probe_db_put, key, info)
+        finally:
+            if not lock.locked():
+                _probe_locks.pop(file_path, None)
+        return info
+    except Exception as e:
+        logger.error(f"Error probing video {file_path}: {e}")
+        return {}
+
+
+# Top-level box types that can open an ISO BMFF / QuickTime file
+_MP4_LEADING_BOXES = (b'ftyp', b'moov', b'mdat', b'wide', b'free', b'skip')
+
+
+def _sniff_container(file_path: str) -> str:
+    """
+    Identify the container from its leading magic bytes without spawning ffprobe.
+    Returns 'mp4', 'mkv', 'avi', 'ts' or 'flv', or None if unrecognised or unreadable.
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            # One MPEG-TS packet plus the next sync byte covers every signature below
+            buf = f.read(189)
+    except OSError:
+        return None
+    if buf[4:8] in _MP4_LEADING_BOXES:
+        return 'mp4'
+    if buf.startswith(b'\x1a\x45\xdf\xa3'):
+        return 'mkv'  # EBML header, also used by WebM
+    if buf.startswith(b'RIFF') and buf[8:12] == b'AVI ':
+        return 'avi'
+    if buf.startswith(b'FLV'):
+        return 'flv'
+    if buf[:1] == b'\x47' and buf[188:189] == b'\x47':
+        return 'ts'
+    return None
+
+
+async def probe_videos_async(file_paths: list) -> dict:
+    """
+    Probe a batch of files concurrently (bounded by the ffprobe semaphore), warming the shared
+    cache so later per-file checks don't spawn ffprobe one at a time. Returns {path: info}.
+    """
+    results = await asyncio.gather(*(probe_video_async(path) for path in file_paths))
+    return dict(zip(file_paths, results))
+
+
+def _first_video_stream(info: dict) -> dict:
+    for stream in info.get('streams', []):
+        if stream.get('codec_type') == 'video':
+            return stream
+    return None
 
 
 def validate_video_file(file_path: str) -> dict:
@@ -39,28 +400,10 @@ def validate_video_file(file_path: str) -> dict:
         logger.warning("ffprobe not found, skipping video validation")
         return {}
     
-    try:
-        cmd = [
-            'ffprobe',
-            '-v', 'quiet',
-            '-print_format', 'json',
-            '-show_format',
-            '-show_streams',
-            file_path
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-        
-        if result.returncode == 0:
-            import json
-            info = json.loads(result.stdout)
-            return info
-        else:
-            logger.error(f"Video validation failed for {file_path}: {result.stderr}")
-            return {}
-    except Exception as e:
-        logger.error(f"Error during video validation for {file_path}: {e}")
-        return {}
+    info = probe_video(file_path)
+    if not info:
+        logger.error(f"Video validation failed for {file_path}")
+    return info
 
 
 def _is_extension_compatible(file_path: str) -> bool:
@@ -82,38 +425,32 @@ def is_telegram_compatible_video(file_path: str) -> bool:
         return ext_ok
     
     try:
-        # Check if file is MP4 container with H.264 codec
-        cmd = [
-            'ffprobe',
-            '-v', 'quiet',
-            '-show_entries', 'format=format_name,codec_name',
-            '-select_streams', 'v:0',
-            '-of', 'csv=p=0',
-            file_path
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+        container = _sniff_container(file_path)
+        if container is not None and container != 'mp4':
+            logger.info(f"{file_path} is not Telegram compatible (container={container})")
+            return False
         
-        if result.returncode == 0:
-            # Get the video format info
-            output = result.stdout.strip().split(',')
-            if len(output) >= 2:
-                container = output[0].lower()
-                codec = output[1].lower()
-                
-                # Check if it's MP4 container with H.264 codec
-                if container == 'mp4' and codec in ['h264', 'avc1']:
-                    logger.info(f"{file_path} is already Telegram compatible")
-                    return True
-                else:
-                    logger.info(f"{file_path} is not Telegram compatible (container={container}, codec={codec})")
-                    return False
-            else:
-                logger.warning(f"Could not parse ffprobe output for {file_path}")
-                return _is_extension_compatible(file_path)
-        else:
+        info = probe_video(file_path)
+        if not info:
             logger.warning(f"ffprobe failed for {file_path}, falling back to extension check")
             return _is_extension_compatible(file_path)
+        
+        video_stream = _first_video_stream(info)
+        if video_stream is None:
+            logger.warning(f"Could not parse ffprobe output for {file_path}")
+            return _is_extension_compatible(file_path)
+        
+        # ffprobe reports the mp4 family as e.g. "mov,mp4,m4a,3gp,3g2,mj2"
+        format_name = info.get('format', {}).get('format_name', '').lower()
+        codec = (video_stream.get('codec_name') or '').lower()
+        
+        # Check if it's MP4 container with H.264 codec (codec first: cheaper and more selective)
+        if codec in _TELEGRAM_VIDEO_CODECS and 'mp4' in format_name.split(','):
+            logger.info(f"{file_path} is already Telegram compatible")
+            return True
+        else:
+            logger.info(f"{file_path} is not Telegram compatible (container={format_name.partition(',')[0]}, codec={codec})")
+            return False
     except Exception as e:
         logger.error(f"Error checking if video is Telegram compatible: {e}")
         return _is_extension_compatible(file_path)
@@ -139,20 +476,115 @@ def needs_video_processing(file_path: str) -> bool:
         logger.info(f"Transcoding disabled, skipping: {file_path}")
         return False
     
-    # Check if the video is already compatible with Telegram
-    if is_telegram_compatible_video(file_path):
-        # Video is already compatible, and user has transcoding enabled
-        # Still process to ensure optimal settings
-        return True
-    else:
-        # Video is not Telegram compatible, and user has transcoding enabled
-        return True
+    # With transcoding enabled every video is processed (compatible ones still get
+    # optimal settings), so no compatibility probe is needed here
+    return True
+
 
+# H.264 encoder arguments, in order of preference; each replaces libx264's -preset/-crf
+_HW_ENCODER_ARGS = {
+    'h264_nvenc': ['-c:v', 'h264_nvenc', '-preset', 'p5', '-rc', 'vbr', '-cq', '23', '-b:v', '0',
+                   '-b_ref_mode', 'middle', '-spatial-aq', '1'],
+    'h264_qsv': ['-c:v', 'h264_qsv', '-preset', 'medium', '-global_quality', '23'],
+    'h264_videotoolbox': ['-c:v', 'h264_videotoolbox', '-q:v', '65'],
+}
+# veryfast/fastdecode encodes 2-3x faster than medium; crf 24 keeps file sizes comparable
+_SOFTWARE_ENCODER_ARGS = ['-c:v', 'libx264', '-preset', 'veryfast', '-tune', 'fastdecode', '-crf', '24']
 
-async def compress_video_for_telegram(input_path: str, output_path: str = None) -> str:
+
+@lru_cache(maxsize=1)
+def _detect_hw_encoder() -> str:
+    """
+    Return the first hardware H.264 encoder that ffmpeg both lists and can actually open
+    (a listed NVENC build still fails without a GPU), or None. Runs once per process.
+    """
+    ffmpeg = resolve_binary('ffmpeg')
+    if not ffmpeg:
+        return None
+    try:
+        listed = subprocess.run([ffmpeg, '-hide_banner', '-encoders'], capture_output=True, text=True, timeout=10).stdout
+    except Exception as e:
+        logger.warning(f"Could not list ffmpeg encoders: {e}")
+        return None
+    for encoder in _HW_ENCODER_ARGS:
+        if f' {encoder} ' not in listed:
+            continue
+        trial = [ffmpeg, '-hide_banner', '-v', 'error', '-f', 'lavfi', '-i', 'color=black:s=256x256:d=0.1',
+                 '-c:v', encoder, '-f', 'null', '-']
+        try:
+            if subprocess.run(trial, capture_output=True, timeout=15).returncode == 0:
+                logger.info(f"🚀 Using hardware video encoder: {encoder}")
+                return encoder
+        except Exception:
+            pass
+    logger.info("No usable hardware video encoder found, using libx264")
+    return None
+
+
+# Serializes the startup probe and a transcode that arrives before it has finished
+_HW_ENCODER_LOCK = threading.Lock()
+
+
+def _video_encoder_args() -> list:
+    """
+    ffmpeg video encoder arguments for transcodes, honouring HW_ENCODE. The first call with
+    HW_ENCODE runs trial encodes (seconds), so async code calls this through a thread.
+    """
+    if HW_ENCODE:
+        with _HW_ENCODER_LOCK:
+            encoder = _detect_hw_encoder()
+        if encoder:
+            return _HW_ENCODER_ARGS[encoder]
+    return _SOFTWARE_ENCODER_ARGS
+
+
+# Fragmented MP4 with the moov up front, written in one pass; +faststart would rewrite the whole
+# file afterwards to move the moov forward
+_SINGLE_PASS_MOVFLAGS = '+frag_keyframe+empty_moov+default_base_moof'
+
+
+# Thumbnails written by the transcode pass, keyed by the output file's identity so the
+# entry survives the caller renaming the compressed file over the original
+_fused_thumbnails = {}
+
+
+def _file_identity(path: str) -> tuple:
+    st = os.stat(path)
+    return st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns
+
+
+def _discard_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"Failed to clean up {path}: {e}")
+
+
+def _pop_fused_thumbnail(video_path: str) -> str:
+    """Return the thumbnail produced while transcoding video_path, if it is still on disk."""
+    try:
+        thumb_path = _fused_thumbnails.pop(_file_identity(video_path), None)
+    except OSError:
+        return None
+    if thumb_path and os.path.exists(thumb_path):
+        return thumb_path
+    return None
+
+
+def _compression_timeout() -> int:
+    if isinstance(COMPRESSION_TIMEOUT_SECONDS, int) and COMPRESSION_TIMEOUT_SECONDS > 0:
+        return COMPRESSION_TIMEOUT_SECONDS
+    return 300
+
+
+async def compress_video_for_telegram(input_path: str, output_path: str = None, mode: str = None) -> str:
     """
     Compress video to MP4 format optimized for Telegram streaming.
     Uses compatible compression settings to ensure proper metadata, thumbnails, and duration display.
+    mode is 'remux' (copy the streams into a streamable MP4) or 'transcode'; when omitted,
+    videos that probe as H.264 in MP4 are remuxed and everything else is transcoded.
     Returns the path to the compressed file if successful, None if failed.
     """
     if not is_ffmpeg_available():
@@ -163,30 +595,47 @@ async def compress_video_for_telegram(input_path: str, output_path: str = None)
     if output_path is None:
         base_name = os.path.splitext(input_path)[0]
         output_path = base_name + '_compressed.mp4'
+    thumb_path = output_path + '.thumb.jpg'
     
     try:
+        if mode is None:
+            # Warm the shared probe cache without blocking the loop, then reuse it for the check
+            info = await probe_video_async(input_path)
+            mode = 'remux' if info and is_telegram_compatible_video(input_path) else 'transcode'
+        
+        if mode == 'remux':
+            # Already H.264/MP4: rewrite the container with the moov up front, no decode or encode
+            cmd = [_media_bin('ffmpeg'), '-i', input_path, '-c', 'copy', '-movflags', _SINGLE_PASS_MOVFLAGS,
+                   '-y', output_path]
+            logger.info(f"Remuxing compatible video: {input_path} -> {output_path}")
+            returncode, _, stderr = await _run_media_command(cmd, timeout=_compression_timeout())
+            if returncode == 0:
+                logger.info(f"Video remux successful: {output_path}")
+                return output_path
+            logger.warning(f"Video remux failed, transcoding instead: {stderr}")
+        
+        # libx264 (veryfast, crf 24), or a hardware encoder with HW_ENCODE; resolving the
+        # hardware encoder blocks on trial encodes, so keep it off the event loop
+        encoder_args = await asyncio.to_thread(_video_encoder_args)
+        
         # Enhanced MP4 compression settings optimized for Telegram
         # Fixed thumbnail and duration display issues
         cmd = [
-            'ffmpeg',
+            _media_bin('ffmpeg'),
             '-i', input_path,
-            '-c:v', 'libx264',
-            '-preset', 'medium',  # Better quality encoding
-            '-crf', '23',  # Better quality setting for proper thumbnails
+            *encoder_args,
             '-c:a', 'aac',
             '-b:a', '128k',
             '-ar', '48000',  # Higher quality audio sample rate
             # Critical fixes for thumbnail and duration display:
-            '-movflags', '+faststart+use_metadata_tags',  # Proper metadata handling
+            '-movflags', _SINGLE_PASS_MOVFLAGS + '+use_metadata_tags',  # Streamable in one pass, proper metadata
             '-pix_fmt', 'yuv420p',  # Ensures compatibility
             '-profile:v', 'main',  # Main profile is better than baseline for thumbnails
             '-level', '4.0',  # Higher level for better compatibility
-            '-vf', 'scale=trunc(iw/2)*2:trunc(ih/2)*2',  # Ensure even dimensions
-            # Timestamp and duration fixes:
-            '-copyts',  # Copy input timestamps
-            '-start_at_zero',  # Start timestamps at zero
-            '-avoid_negative_ts', 'disabled',  # Don't modify timestamps
-            '-fflags', '+genpts+igndts',  # Generate PTS and ignore DTS issues
+            '-threads', str(TRANSCODE_THREADS),  # Bounded per job; _transcode_semaphore() bounds the job count
+            '-vf', 'crop=iw-mod(iw\\,2):ih-mod(ih\\,2)',  # Ensure even dimensions (trim, no rescale)
+            # Default timestamp handling gives monotonic PTS from zero, which is all Telegram needs
+            '-max_muxing_queue_size', '1024',  # Room for sparse/interleaved streams without aborting
             # Metadata fixes:
             '-map_metadata', '0',  # Copy metadata from input
             '-write_tmcd', '0',  # Disable timecode track that can cause issues
@@ -197,27 +646,29 @@ async def compress_video_for_telegram(input_path: str, output_path: str = None)
             # Force proper frame rate:
             '-r', '24',  # Set output frame rate to ensure consistency
             '-y',  # Overwrite output file
-            output_path
+            output_path,
+            # Second output: grab the upload thumbnail from the same decode instead of a separate ffmpeg run
+            '-map', '0:v:0',
+            '-ss', '00:00:01',
+            '-frames:v', '1',
+            '-f', 'mjpeg',
+            thumb_path
         ]
         
         logger.info(f"Compressing video: {input_path} -> {output_path}")
-        loop = asyncio.get_running_loop()
-        timeout_val = COMPRESSION_TIMEOUT_SECONDS if isinstance(COMPRESSION_TIMEOUT_SECONDS, int) and COMPRESSION_TIMEOUT_SECONDS > 0 else 300
-        result = await loop.run_in_executor(
-            None,
-            lambda: subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=timeout_val
-            )
-        )
+        async with _transcode_semaphore():
+            returncode, _, stderr = await _run_media_command(cmd, timeout=_compression_timeout())
         
-        if result.returncode == 0:
+        if returncode == 0:
             logger.info(f"Video compression successful: {output_path}")
+            if os.path.exists(thumb_path) and os.path.getsize(thumb_path) > 0 and os.path.exists(output_path):
+                _fused_thumbnails[_file_identity(output_path)] = thumb_path
+            else:
+                _discard_file(thumb_path)
             return output_path
         else:
-            logger.error(f"Video compression failed: {result.stderr}")
+            logger.error(f"Video compression failed: {stderr}")
+            _discard_file(thumb_path)
             # Clean up failed output file
             if os.path.exists(output_path):
                 try:
@@ -226,8 +677,9 @@ async def compress_video_for_telegram(input_path: str, output_path: str = None)
                 except Exception as cleanup_e:
                     logger.warning(f"Failed to clean up {output_path}: {cleanup_e}")
             return None
-    except subprocess.TimeoutExpired:
+    except asyncio.TimeoutError:
         logger.error("Video compression timed out")
+        _discard_file(thumb_path)
         # Clean up incomplete compressed file after timeout
         if os.path.exists(output_path):
             try:
@@ -238,6 +690,7 @@ async def compress_video_for_telegram(input_path: str, output_path: str = None)
         return None
     except Exception as e:
         logger.error(f"Error during video compression: {e}")
+        _discard_file(thumb_path)
         # Clean up any partial output file
         if os.path.exists(output_path):
             try:
@@ -248,6 +701,36 @@ async def compress_video_for_telegram(input_path: str, output_path: str = None)
         return None
 
 
+def _thumbnail_with_pyav(input_path: str, thumbnail_path: str, at_seconds: float = 1.0) -> bool:
+    """
+    Decode the frame at at_seconds (or the last one, for shorter clips) in-process with PyAV
+    and save it as JPEG. Returns False if PyAV is unavailable or decoding fails.
+    """
+    try:
+        import av
+    except ImportError:
+        return False
+    
+    try:
+        with av.open(input_path) as container:
+            stream = container.streams.video[0]
+            stream.thread_type = 'AUTO'
+            if stream.time_base:
+                # Lands on the keyframe at or before the target; decode forward from there
+                container.seek(int(at_seconds / stream.time_base), stream=stream)
+            frame = None
+            for frame in container.decode(stream):
+                if frame.time is None or frame.time >= at_seconds:
+                    break
+            if frame is None:
+                return False
+            frame.to_image().save(thumbnail_path, 'JPEG')
+        return True
+    except Exception as e:
+        logger.debug(f"PyAV thumbnail failed for {input_path}, falling back to ffmpeg: {e}")
+        return False
+
+
 async def get_video_attributes_and_thumbnail(input_path: str) -> tuple:
     """
     Get video attributes (duration, dimensions) and generate a thumbnail for Telegram.
@@ -259,36 +742,23 @@ async def get_video_attributes_and_thumbnail(input_path: str) -> tuple:
         return 0, 0, 0, None
     
     try:
-        # Extract video metadata using ffprobe
-        cmd = [
-            'ffprobe',
-            '-v', 'quiet',
-            '-print_format', 'json',
-            '-show_format',
-            '-show_streams',
-            input_path
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+        # Extract video metadata using ffprobe (shared with the compatibility check)
+        info = await probe_video_async(input_path)
         
-        if result.returncode == 0:
-            import json
-            info = json.loads(result.stdout)
-            
+        if info:
             # Find video stream
-            video_stream = None
-            for stream in info.get('streams', []):
-                if stream.get('codec_type') == 'video':
-                    video_stream = stream
-                    break
+            video_stream = _first_video_stream(info)
             
             if video_stream:
-                # Get duration
-                duration_str = video_stream.get('duration', '0')
-                try:
-                    duration = int(float(duration_str))
-                except ValueError:
-                    duration = 0
+                # Get duration; fragmented MP4 (empty_moov) often leaves the stream's unset
+                duration = 0
+                for duration_str in (video_stream.get('duration'), info.get('format', {}).get('duration')):
+                    try:
+                        duration = int(float(duration_str))
+                    except (TypeError, ValueError):
+                        continue
+                    if duration > 0:
+                        break
                 
                 # Get dimensions
                 width = video_stream.get('width', 0)
@@ -297,20 +767,30 @@ async def get_video_attributes_and_thumbnail(input_path: str) -> tuple:
                 # Generate thumbnail
                 thumbnail_path = None
                 if width > 0 and height > 0:
+                    fused_thumb = _pop_fused_thumbnail(input_path)
+                    if fused_thumb:
+                        return duration, width, height, fused_thumb
                     thumbnail_path = input_path + '.thumb.jpg'
+                    if await asyncio.to_thread(_thumbnail_with_pyav, input_path, thumbnail_path):
+                        return duration, width, height, thumbnail_path
                     thumbnail_cmd = [
-                        'ffmpeg',
+                        _media_bin('ffmpeg'),
+                        '-skip_frame', 'nokey',  # Decode keyframes only
+                        '-ss', '00:00:01',  # Input seek: jump via the index to ~1s instead of decoding up to it
                         '-i', input_path,
-                        '-ss', '00:00:01',  # Get thumbnail from 1 second into the video
-                        '-vframes', '1',
+                        '-vsync', 'vfr',
+                        '-frames:v', '1',
                         '-f', 'mjpeg',
-                        thumbnail_path,
-                        '-y'  # Overwrite existing file
+                        '-y',  # Overwrite existing file
+                        thumbnail_path
                     ]
                     
-                    thumb_result = subprocess.run(thumbnail_cmd, capture_output=True, text=True, timeout=30)
-                    if thumb_result.returncode != 0:
-                        logger.warning(f"Thumbnail generation failed: {thumb_result.stderr}")
+                    try:
+                        thumb_code, _, thumb_err = await _run_media_command(thumbnail_cmd, timeout=30)
+                    except asyncio.TimeoutError:
+                        thumb_code, thumb_err = None, 'timed out'
+                    if thumb_code != 0:
+                        logger.warning(f"Thumbnail generation failed: {thumb_err}")
                         thumbnail_path = None
                 
                 return duration, width, height, thumbnail_path
@@ -318,7 +798,7 @@ async def get_video_attributes_and_thumbnail(input_path: str) -> tuple:
                 logger.warning(f"No video stream found in {input_path}")
                 return 0, 0, 0, None
         else:
-            logger.error(f"Video metadata extraction failed for {input_path}: {result.stderr}")
+            logger.error(f"Video metadata extraction failed for {input_path}")
             return 0, 0, 0, None
     except Exception as e:
         logger.error(f"Error extracting video attributes for {input_path}: {e}")
@@ -339,11 +819,12 @@ def convert_video_for_recovery(input_path: str) -> str:
         logger.error("ffmpeg not found for recovery conversion. Please install ffmpeg.")
         return None
     
-    # Stable output name based on file hash to allow resumable conversion
+    # Stable output name from size and mtime (no file read) to allow resumable conversion
     try:
-        with open(input_path, 'rb') as f:
-            file_hash = hashlib.sha256(f.read(8192)).hexdigest()  # partial hash for speed
-    except Exception:
+        st = os.stat(input_path)
+        key = f"{st.st_size:x}_{st.st_mtime_ns:x}"
+        file_hash = hashlib.blake2s(key.encode(), digest_size=4).hexdigest()
+    except OSError:
         file_hash = os.path.basename(input_path)
     
     base_name = os.path.splitext(os.path.basename(input_path))[0]
@@ -356,7 +837,7 @@ def convert_video_for_recovery(input_path: str) -> str:
         return output_path
     
     cmd = [
-        'ffmpeg',
+        _media_bin('ffmpeg'),
         '-y',
         '-i', input_path,
         '-c:v', 'libx264',
@@ -394,19 +875,74 @@ def convert_video_for_recovery(input_path: str) -> str:
         return output_path
     except Exception as e:
         logger.error(f"Unexpected error during recovery conversion: {e}")
-        import traceback
         logger.debug(traceback.format_exc())
     
     return None
 
 
+_pil_image = None
+
+
+def _get_pil_image():
+    """Import PIL.Image once on first use; raises ImportError if Pillow is not installed."""
+    global _pil_image
+    if _pil_image is None:
+        from PIL import Image
+        _pil_image = Image
+    return _pil_image
+
+
+def _lossless_jpeg_rewrite(input_path: str, output_path: str, target_size: int) -> bool:
+    """
+    Re-pack a JPEG with jpegtran (optimized Huffman tables, progressive, metadata dropped)
+    without decoding pixels. Returns True if the result fits target_size.
+    """
+    if mimetypes.guess_type(input_path)[0] != 'image/jpeg':
+        return False
+    jpegtran = resolve_binary('jpegtran')
+    if not jpegtran:
+        return False
+    
+    cmd = [jpegtran, '-copy', 'none', '-optimize', '-progressive', '-outfile', output_path, input_path]
+    try:
+        result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=60)
+        if result.returncode == 0 and 0 < os.path.getsize(output_path) <= target_size:
+            return True
+        logger.debug(f"jpegtran rewrite did not fit {target_size} bytes for {input_path}")
+    except Exception as e:
+        logger.debug(f"jpegtran rewrite failed for {input_path}: {e}")
+    
+    if os.path.exists(output_path):
+        os.remove(output_path)
+    return False
+
+
+def _encode_jpeg(img, quality: int, optimize: bool = False) -> io.BytesIO:
+    """Encode img as JPEG into a memory buffer positioned at its end (tell() is the size)."""
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG', quality=quality, optimize=optimize)
+    return buffer
+
+
+def _downscale(img, scale: float):
+    """Return a LANCZOS-downscaled copy of img with even dimensions.
+    
+    reducing_gap lets Pillow shrink by an integer factor with a cheap box reduce
+    before the LANCZOS pass, so large reductions don't resample every source pixel.
+    """
+    Image = _get_pil_image()
+    new_width = max(2, int(img.width * scale) // 2 * 2)
+    new_height = max(2, int(img.height * scale) // 2 * 2)
+    return img.resize((new_width, new_height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+
 async def compress_image_for_telegram(input_path: str, output_path: str = None, target_size: int = TELEGRAM_PHOTO_SIZE_LIMIT) -> str:
     """
     Compress image to under Telegram's 10MB photo upload limit using iterative quality reduction.
     
     This function uses Pillow to:
     1. Convert PNG/WEBP/other formats to JPEG for better compression
-    2. Iteratively reduce JPEG quality (starting at 95, decreasing by 5) until target size is met
+    2. Reduce JPEG quality (starting at 95, jumping to an estimated quality) until target size is met
     3. Resize image dimensions as a last resort if quality reduction isn't enough
     4. Maintain minimum quality threshold of 50 to ensure usability
     
@@ -419,7 +955,7 @@ async def compress_image_for_telegram(input_path: str, output_path: str = None,
         Path to the compressed image file if successful, None if compression failed
     """
     try:
-        from PIL import Image
+        Image = _get_pil_image()
     except ImportError:
         logger.error("Pillow library not found. Install with: pip install Pillow")
         return None
@@ -442,82 +978,95 @@ async def compress_image_for_telegram(input_path: str, output_path: str = None,
     try:
         logger.info(f"Starting image compression: {input_path} ({original_size} bytes) -> target: {target_size} bytes")
         
+        # Slightly oversized JPEGs can often be brought under the limit losslessly
+        if original_size < target_size * 1.3 and _lossless_jpeg_rewrite(input_path, output_path, target_size):
+            compressed_size = os.path.getsize(output_path)
+            reduction_pct = ((original_size - compressed_size) / original_size) * 100
+            logger.info(f"Image compression successful with lossless jpegtran rewrite: {output_path} ({compressed_size} bytes, {reduction_pct:.1f}% reduction)")
+            return output_path
+        
         # Open image with Pillow
         with Image.open(input_path) as img:
             # Convert to RGB if necessary (for PNG with transparency, WEBP, etc.)
             if img.mode in ('RGBA', 'LA', 'P'):
-                # Create white background for transparency
-                background = Image.new('RGB', img.size, (255, 255, 255))
-                if img.mode == 'P':
-                    img = img.convert('RGBA')
-                background.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
-                img = background
+                # Composite onto a white background in one pass (no per-band split)
+                background = Image.new('RGBA', img.size, (255, 255, 255, 255))
+                img = Image.alpha_composite(background, img.convert('RGBA')).convert('RGB')
             elif img.mode != 'RGB':
                 img = img.convert('RGB')
             
             original_dimensions = img.size
             logger.info(f"Original image dimensions: {original_dimensions[0]}x{original_dimensions[1]}")
             
-            # Strategy 1: Iterative quality reduction
+            # Strategy 1: Quality search. Each step jumps to the quality estimated to hit the
+            # target (JPEG size scales roughly with quality squared) instead of stepping by 5
             quality = 95
             min_quality = 50
-            quality_step = 5
             
-            while quality >= min_quality:
-                # Save to memory buffer to check size
-                buffer = io.BytesIO()
-                img.save(buffer, format='JPEG', quality=quality, optimize=True)
-                compressed_size = buffer.tell()
+            while True:
+                # Search encodes skip optimize=True, which costs an extra Huffman pass
+                compressed_size = _encode_jpeg(img, quality).tell()
                 
                 logger.debug(f"Quality {quality}: {compressed_size} bytes")
                 
                 if compressed_size <= target_size:
-                    # Success! Save to actual file
-                    with open(output_path, 'wb') as f:
-                        f.write(buffer.getvalue())
+                    # Success! Optimized encode is never larger than the search encode;
+                    # write it straight to the file rather than copying out of a buffer
+                    img.save(output_path, format='JPEG', quality=quality, optimize=True)
+                    compressed_size = os.path.getsize(output_path)
                     
                     reduction_pct = ((original_size - compressed_size) / original_size) * 100
                     logger.info(f"Image compression successful at quality={quality}: {output_path} ({compressed_size} bytes, {reduction_pct:.1f}% reduction)")
                     return output_path
                 
-                quality -= quality_step
+                if quality <= min_quality:
+                    break
+                estimate = int(quality * (target_size / compressed_size) ** 0.5)
+                quality = max(min_quality, min(quality - 1, estimate))
             
             # Strategy 2: If quality reduction isn't enough, resize dimensions
             logger.info("Quality reduction insufficient, attempting dimension resize...")
             
-            # Try progressively smaller sizes: 90%, 80%, 70%, 60%, 50%
-            for scale in [0.9, 0.8, 0.7, 0.6, 0.5]:
-                new_width = int(original_dimensions[0] * scale)
-                new_height = int(original_dimensions[1] * scale)
-                
-                # Ensure even dimensions
-                new_width = (new_width // 2) * 2
-                new_height = (new_height // 2) * 2
-                
-                resized_img = img.resize((new_width, new_height), Image.LANCZOS)
+            # Binary search for the largest scale (90% down to 50% in 5% steps) that fits
+            scales = [0.9, 0.85, 0.8, 0.75, 0.7, 0.65, 0.6, 0.55, 0.5]
+            fitting = None
+            smallest_img = None
+            lo, hi = 0, len(scales) - 1
+            while lo <= hi:
+                mid = (lo + hi) // 2
+                scale = scales[mid]
+                resized_img = _downscale(img, scale)
                 
                 # Try with quality 85 for resized image
-                buffer = io.BytesIO()
-                resized_img.save(buffer, format='JPEG', quality=85, optimize=True)
-                compressed_size = buffer.tell()
+                compressed_size = _encode_jpeg(resized_img, 85).tell()
                 
-                logger.debug(f"Resize {scale*100:.0f}% ({new_width}x{new_height}): {compressed_size} bytes")
+                logger.debug(f"Resize {scale*100:.0f}% ({resized_img.width}x{resized_img.height}): {compressed_size} bytes")
                 
                 if compressed_size <= target_size:
-                    # Success! Save resized image
-                    with open(output_path, 'wb') as f:
-                        f.write(buffer.getvalue())
-                    
-                    reduction_pct = ((original_size - compressed_size) / original_size) * 100
-                    logger.info(f"Image compression successful with resize {scale*100:.0f}% at quality=85: {output_path} ({compressed_size} bytes, {reduction_pct:.1f}% reduction)")
-                    return output_path
+                    fitting = (scale, resized_img)
+                    hi = mid - 1
+                else:
+                    if mid == len(scales) - 1:
+                        smallest_img = resized_img
+                    lo = mid + 1
+            
+            if fitting:
+                # Success! Save resized image
+                scale, resized_img = fitting
+                resized_img.save(output_path, format='JPEG', quality=85, optimize=True)
+                compressed_size = os.path.getsize(output_path)
+                
+                reduction_pct = ((original_size - compressed_size) / original_size) * 100
+                logger.info(f"Image compression successful with resize {scale*100:.0f}% at quality=85: {output_path} ({compressed_size} bytes, {reduction_pct:.1f}% reduction)")
+                return output_path
             
             # If we reach here, even aggressive resizing didn't work
             logger.error(f"Failed to compress image under {target_size} bytes even with aggressive resizing")
             
             # Save the most compressed version we have as a last resort
-            resized_img = img.resize((int(original_dimensions[0] * 0.5), int(original_dimensions[1] * 0.5)), Image.LANCZOS)
-            resized_img.save(output_path, format='JPEG', quality=min_quality, optimize=True)
+            if smallest_img is None:
+                smallest_img = _downscale(img, scales[-1])
+            smallest_img.save(output_path, format='JPEG', quality=min_quality, optimize=True)
             
             final_size = os.path.getsize(output_path)
             logger.warning(f"Saved heavily compressed image: {output_path} ({final_size} bytes) - may still exceed Telegram limit")
@@ -535,6 +1084,16 @@ async def compress_image_for_telegram(input_path: str, output_path: str = None,
         return None
 
 
+# Phrases from Telegram's "photo exceeds 10MB" error message
+_PHOTO_SIZE_ERROR_INDICATORS = (
+    'cannot be saved by telegram',
+    'exceeds 10mb',
+    '10 mb',
+    'photo you tried to send',
+    'uploadmediarequest',
+)
+
+
 def is_telegram_photo_size_error(error_message: str) -> bool:
     """
     Check if an error message indicates Telegram's 10MB photo upload limit was exceeded.
@@ -550,16 +1109,12 @@ def is_telegram_photo_size_error(error_message: str) -> bool:
     
     error_lower = str(error_message).lower()
     
-    # Check for the specific error message from Telegram
-    indicators = [
-        'cannot be saved by telegram',
-        'exceeds 10mb',
-        '10 mb',
-        'photo you tried to send',
-        'uploadmediarequest'
-    ]
-    
-    # Must contain at least 2 of these indicators to be considered a photo size error
-    matches = sum(1 for indicator in indicators if indicator in error_lower)
-    
-    return matches >= 2
+    # Must contain at least 2 of these indicators to be considered a photo size error;
+    # stop scanning as soon as the second one is found
+    matches = 0
+    for indicator in _PHOTO_SIZE_ERROR_INDICATORS:
+        if indicator in error_lower:
+            matches += 1
+            if matches >= 2:
+                return True
+    return False
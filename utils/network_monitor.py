@@ -37,6 +37,9 @@ class NetworkMonitor:
         self.is_monitoring = False
         self.callbacks: Dict[str, Callable] = {}
         self._monitor_task: Optional[asyncio.Task] = None
+        # Last probe result, reused for a short window to avoid re-running subprocesses
+        self._last_probe_ts = 0.0
+        self._last_type: Optional[str] = None
         
     def add_callback(self, event: str, callback: Callable):
         """
@@ -50,13 +53,27 @@ class NetworkMonitor:
         """
         self.callbacks[event] = callback
     
-    def detect_connection_type(self) -> str:
+    def detect_connection_type(self, cache_s: float = 2.0) -> str:
         """
         Detect the current network connection type.
         
+        Args:
+            cache_s: Reuse the previous result if it is younger than this many
+                seconds (0 forces a fresh probe)
+        
         Returns:
             NetworkType constant representing the connection type
         """
+        now = time.monotonic()
+        if cache_s > 0 and self._last_type is not None and now - self._last_probe_ts < cache_s:
+            return self._last_type
+        
+        self._last_type = self._probe_connection_type()
+        self._last_probe_ts = time.monotonic()
+        return self._last_type
+    
+    def _probe_connection_type(self) -> str:
+        """Run the detection methods in order and return the first conclusive result"""
         try:
             # Method 1: Check Android network interface (Termux)
             if os.path.exists('/proc/net/route'):
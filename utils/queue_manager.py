@@ -4,30 +4,92 @@ Handles download and upload queues with concurrency control.
 """
 
 import asyncio
+import contextvars
 import logging
 import os
 import time
 import json
+import random
 import re
+import shutil
+import subprocess
+import sys
+import traceback
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from typing import Union
+from telethon import utils as telethon_utils
 from telethon.errors import FloodWaitError
 from .constants import (
-    DOWNLOAD_SEMAPHORE_LIMIT, UPLOAD_SEMAPHORE_LIMIT, MAX_RETRY_ATTEMPTS,
-    RETRY_BASE_INTERVAL, STREAMING_EXTRACTION_ENABLED, STREAMING_MIN_FREE_GB,
+    DOWNLOAD_SEMAPHORE_LIMIT, UPLOAD_SEMAPHORE_LIMIT, MAX_RETRY_ATTEMPTS, MAX_CONCURRENT,
+    RETRY_BASE_INTERVAL, MAX_RETRY_DELAY, STREAMING_EXTRACTION_ENABLED, STREAMING_MIN_FREE_GB,
     STREAMING_LOW_SPACE_CHECK_INTERVAL, STREAMING_MANIFEST_DIR, TORBOX_DIR,
     WEBDAV_DIR, MEDIA_EXTENSIONS, PHOTO_EXTENSIONS, VIDEO_EXTENSIONS, DATA_DIR, FAILED_UPLOADS_FILE,
-    WEBDAV_SEQUENTIAL_MODE, DEFERRED_VIDEO_CONVERSION, QUARANTINE_DIR
+    WEBDAV_SEQUENTIAL_MODE, DEFERRED_VIDEO_CONVERSION, QUARANTINE_DIR, RECENT_UPLOAD_HASHES_MAX,
+    DOWNLOAD_QUEUE_MAXSIZE, DOWNLOAD_QUEUE_FULL_POLICY, DOWNLOAD_QUEUE_PUT_TIMEOUT, EXTRACTION_THREADS,
+    RETRY_NOTICE_INTERVAL, UPLOAD_QUEUE_MAXSIZE
 )
 from .file_operations import compute_sha256
-from .cache_manager import PersistentQueue, CacheManager
+from .cache_manager import (
+    PersistentQueue, CacheManager, make_serializable, append_retry_task, load_retry_tasks, rewrite_retry_tasks
+)
 from .constants import DOWNLOAD_QUEUE_FILE, UPLOAD_QUEUE_FILE, RETRY_QUEUE_FILE
 from .streaming_extractor import StreamingExtractor, mark_streaming_entries_completed
-from .telegram_operations import TelegramOperations, ensure_target_entity, get_client
+from .telegram_operations import (
+    TelegramOperations, ensure_target_entity, get_client, create_download_progress_callback
+)
 
 # Telegram's hard limit for media files per album/grouped message
 # Source: https://limits.tginfo.me/en and official Telegram documentation
 TELEGRAM_ALBUM_MAX_FILES = 10
 
+
+_MEDIA_EXTS = frozenset(MEDIA_EXTENSIONS)
+_PHOTO_EXTS = frozenset(PHOTO_EXTENSIONS)
+_VIDEO_EXTS = frozenset(VIDEO_EXTENSIONS)
+
+
+def _file_ext(name: str) -> str:
+    """Lower-cased extension including the dot, matching os.path.splitext on a bare name."""
+    dot = name.rfind('.')
+    return name[dot:].lower() if dot > 0 else ''
+
+
+# Archive extraction gets its own threads so it never queues behind hashing and
+# directory scans on the default executor (and they never queue behind it)
+_EXTRACT_POOL = ThreadPoolExecutor(max_workers=EXTRACTION_THREADS, thread_name_prefix='extract')
+
+
+def _iter_files(directory: str):
+    """Yield os.DirEntry objects for files under directory, in os.walk order."""
+    subdirs = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    # Like os.walk, list symlinked dirs but don't descend into them
+                    if not entry.is_symlink():
+                        subdirs.append(entry.path)
+                else:
+                    yield entry
+    except OSError:
+        return
+    for subdir in subdirs:
+        yield from _iter_files(subdir)
+
+
+def _scan_media_files(directory: str) -> list:
+    """DirEntry objects for the media files under directory, in os.walk order."""
+    return [entry for entry in _iter_files(directory) if _file_ext(entry.name) in _MEDIA_EXTS]
+
+
+def _safe_size(path: str, default=0):
+    """File size from a single stat() call, or default if the file is missing."""
+    try:
+        return os.stat(path).st_size
+    except (FileNotFoundError, TypeError):
+        return default
+
 # Backwards compatibility shim for tests that patch needs_video_processing at queue_manager level
 try:  # pragma: no cover
     needs_video_processing  # type: ignore
@@ -75,8 +137,8 @@ class ExtractionCleanupRegistry:
         """Clean up an extraction folder."""
         try:
             if os.path.exists(extraction_folder):
-                import shutil
-                shutil.rmtree(extraction_folder, ignore_errors=True)
+                # Removing a large tree takes a while; keep it off the event loop
+                await asyncio.to_thread(shutil.rmtree, extraction_folder, ignore_errors=True)
                 logger.info(f"✅ Cleaned up extraction folder: {extraction_folder}")
             else:
                 logger.warning(f"Extraction folder already removed: {extraction_folder}")
@@ -263,14 +325,46 @@ class WebDAVAlbumBatcher:
         self.buffers[media_type] = []
 
 
+# True inside download/upload workers, which must not wait on the queue they drain
+_in_download_worker = contextvars.ContextVar('in_download_worker', default=False)
+_in_upload_worker = contextvars.ContextVar('in_upload_worker', default=False)
+
+
+def _task_status(item):
+    return item.get('status') if isinstance(item, dict) else None
+
+
+def _uncount_status(status_counts: Counter, item):
+    status = _task_status(item)
+    if status_counts[status] > 1:
+        status_counts[status] -= 1
+    else:
+        status_counts.pop(status, None)
+
+
 class BackwardsCompatibleQueue(asyncio.Queue):
     """
     Extends asyncio.Queue with backwards compatibility methods for legacy tests.
     
     Provides list-like interface (len, iter, subscript) while maintaining async Queue functionality.
     This allows legacy tests to work without modifying production code.
+    status_counts tracks how many queued tasks carry each 'status'.
+    As with DequeTaskQueue, only put() waits for room; put_nowait() never refuses.
     """
     
+    def _init(self, maxsize):
+        super()._init(maxsize)
+        self.status_counts = Counter()
+    
+    def _put(self, item):
+        super()._put(item)
+        self.status_counts[_task_status(item)] += 1
+    
+    def _get(self):
+        item = super()._get()
+        _uncount_status(self.status_counts, item)
+        return item
+    
     def __len__(self):
         """Return queue size for len() compatibility."""
         return self.qsize()
@@ -304,6 +398,190 @@ class BackwardsCompatibleQueue(asyncio.Queue):
     def append(self, item):
         """Provide list-like append for legacy tests."""
         self.put_nowait(item)
+    
+    def put_nowait(self, item):
+        self._put(item)
+        self._unfinished_tasks += 1
+        self._finished.clear()
+        self._wakeup_next(self._getters)
+    
+    def extend_nowait(self, items):
+        """Enqueue many items with one deque extend; like put_nowait, ignores maxsize."""
+        items = list(items)
+        if not items:
+            return
+        self._queue.extend(items)
+        self.status_counts.update(map(_task_status, items))
+        self._unfinished_tasks += len(items)
+        self._finished.clear()
+        for _ in range(min(len(items), len(self._getters))):
+            self._wakeup_next(self._getters)
+
+
+class DequeTaskQueue:
+    """
+    Queue for the download workers: a deque plus one Event.
+    
+    asyncio.Queue allocates a waiter Future per blocked get() and goes through
+    several Python-level helpers per put; here put_nowait is a deque append and
+    consumers only park on the Event when the deque is empty. With several
+    download workers, a put wakes every parked consumer; each re-checks the
+    deque, takes an item if one is left and otherwise parks again. Exposes the
+    asyncio.Queue methods used in this module and the list-like helpers of
+    BackwardsCompatibleQueue.
+    
+    With a maxsize, put() waits for room; put_nowait() never refuses, so tasks
+    restored from disk or re-queued internally are not lost. status_counts
+    tracks how many queued tasks carry each 'status'.
+    """
+    
+    def __init__(self, maxsize: int = 0):
+        self.maxsize = maxsize
+        self._queue = deque()
+        self.status_counts = Counter()
+        self._nonempty = asyncio.Event()
+        self._notfull = asyncio.Event()
+        self._notfull.set()
+        self._unfinished_tasks = 0
+        self._finished = asyncio.Event()
+        self._finished.set()
+    
+    def qsize(self):
+        return len(self._queue)
+    
+    def empty(self):
+        return not self._queue
+    
+    def full(self):
+        return 0 < self.maxsize <= len(self._queue)
+    
+    def put_nowait(self, item):
+        self._queue.append(item)
+        self.status_counts[_task_status(item)] += 1
+        self._unfinished_tasks += 1
+        self._finished.clear()
+        self._nonempty.set()
+    
+    def extend_nowait(self, items):
+        """Enqueue many items with one deque extend; like put_nowait, ignores maxsize."""
+        items = list(items)
+        if not items:
+            return
+        self._queue.extend(items)
+        self.status_counts.update(map(_task_status, items))
+        self._unfinished_tasks += len(items)
+        self._finished.clear()
+        self._nonempty.set()
+    
+    async def put(self, item):
+        while self.full():
+            self._notfull.clear()
+            await self._notfull.wait()
+        self.put_nowait(item)
+    
+    def _popleft(self):
+        item = self._queue.popleft()
+        _uncount_status(self.status_counts, item)
+        if not self.full():
+            self._notfull.set()
+        return item
+    
+    def get_nowait(self):
+        if not self._queue:
+            raise asyncio.QueueEmpty
+        return self._popleft()
+    
+    async def get(self):
+        while not self._queue:
+            self._nonempty.clear()
+            await self._nonempty.wait()
+        return self._popleft()
+    
+    def task_done(self):
+        if self._unfinished_tasks <= 0:
+            raise ValueError('task_done() called too many times')
+        self._unfinished_tasks -= 1
+        if self._unfinished_tasks == 0:
+            self._finished.set()
+    
+    async def join(self):
+        await self._finished.wait()
+    
+    def __len__(self):
+        return len(self._queue)
+    
+    def __iter__(self):
+        return iter(list(self._queue))
+    
+    def __getitem__(self, index):
+        return list(self._queue)[index]
+    
+    def append(self, item):
+        self.put_nowait(item)
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limiter that backs off when Telegram pushes back.
+    
+    Behaves like asyncio.Semaphore(limit) until on_backpressure() is reported
+    (FloodWait): the effective limit halves and no new slots are handed out
+    until the server's required wait has passed. on_success() grows the limit
+    back by one slot per `limit` consecutive successes (AIMD).
+    """
+    
+    def __init__(self, limit: int):
+        self.max_limit = max(1, limit)
+        self.limit = self.max_limit
+        self._active = 0
+        self._successes = 0
+        self._resume_at = 0.0
+        self._released = asyncio.Event()
+    
+    @property
+    def _value(self):
+        """Free slots, mirroring asyncio.Semaphore._value for status reporting."""
+        return max(0, self.limit - self._active)
+    
+    def locked(self):
+        return self._value == 0
+    
+    async def acquire(self):
+        while True:
+            delay = self._resume_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            elif self._active < self.limit:
+                self._active += 1
+                return True
+            else:
+                self._released.clear()
+                await self._released.wait()
+    
+    def release(self):
+        self._active -= 1
+        self._released.set()
+    
+    async def __aenter__(self):
+        await self.acquire()
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+    
+    def on_success(self):
+        if time.monotonic() < self._resume_at:
+            # Still inside a backoff window; the finishing task is the one that was throttled
+            return
+        self._successes += 1
+        if self.limit < self.max_limit and self._successes >= self.limit:
+            self.limit += 1
+            self._successes = 0
+    
+    def on_backpressure(self, retry_after: float = 0):
+        self.limit = max(1, self.limit // 2)
+        self._successes = 0
+        self._resume_at = max(self._resume_at, time.monotonic() + retry_after)
+        logger.warning(f"⏳ Backing off: limit {self.limit}/{self.max_limit}, pausing new tasks for {retry_after}s")
 
 
 class ArchiveCleanupRegistry:
@@ -373,7 +651,6 @@ class QueueManager:
             asyncio.set_event_loop(loop)
             logger.debug("Created new event loop for QueueManager initialization")
 
-        import sys
         from . import constants as consts
         # Allow test patches on this module to override queue file paths
         download_queue_file = getattr(consts, 'DOWNLOAD_QUEUE_FILE', DOWNLOAD_QUEUE_FILE)
@@ -388,8 +665,8 @@ class QueueManager:
             retry_queue_file = globals()['RETRY_QUEUE_FILE']
 
         # Create backwards-compatible queues
-        self.download_queue = BackwardsCompatibleQueue()
-        self.upload_queue = BackwardsCompatibleQueue()
+        self.download_queue = DequeTaskQueue(maxsize=DOWNLOAD_QUEUE_MAXSIZE)
+        self.upload_queue = BackwardsCompatibleQueue(maxsize=UPLOAD_QUEUE_MAXSIZE)
         self.retry_queue = []  # legacy structure used in some tests
         self.client = client  # optional injected client for tests
         self.is_processing = False  # legacy flag used by tests
@@ -411,8 +688,11 @@ class QueueManager:
         logger.info("QueueManager initialized with backwards-compatible queues for legacy test support")
         
         # Semaphores for concurrency control
-        self.download_semaphore = asyncio.Semaphore(DOWNLOAD_SEMAPHORE_LIMIT)
-        self.upload_semaphore = asyncio.Semaphore(UPLOAD_SEMAPHORE_LIMIT)
+        self.download_limiter = AdaptiveLimiter(DOWNLOAD_SEMAPHORE_LIMIT)
+        self.upload_limiter = AdaptiveLimiter(UPLOAD_SEMAPHORE_LIMIT)
+        # Semaphore names kept for status reporting and older callers
+        self.download_semaphore = self.download_limiter
+        self.upload_semaphore = self.upload_limiter
         
         # Persistent storage
         self.download_persistent = PersistentQueue(download_queue_file)
@@ -434,6 +714,20 @@ class QueueManager:
         self.download_task = None
         self.upload_task = None
         
+        # Components shared by every download/upload task, built on first use
+        self._telegram_ops = None
+        self._telegram_ops_key = None
+        self._cache_manager = None
+        self._cache_manager_cls = None
+        
+        # (target peer, file hash) of recent uploads (LRU), so retried or re-forwarded files
+        # aren't re-sent to the same chat
+        self._recent_hashes = OrderedDict()
+        # chat_id -> (monotonic time of last retry notice, notices suppressed since)
+        self._retry_notices = {}
+        # id(document) -> (document, serialized form) for documents in the last queue snapshot
+        self._serialized_docs = {}
+        
         # Pending items counters for deferred task creation
         self._pending_download_items = 0
         self._pending_upload_items = 0
@@ -442,16 +736,39 @@ class QueueManager:
         if not self._skip_restore:
             self._restore_queues()
     
+    @staticmethod
+    def _compute_backoff(prev_delay: float, floor: float = 0) -> float:
+        """
+        Decorrelated-jitter retry delay: a random pick between the base interval and
+        three times the previous delay, capped at MAX_RETRY_DELAY. Tasks that fail
+        together spread out instead of retrying in lockstep. floor is a server-mandated
+        wait (FloodWait) that the delay never undercuts.
+        """
+        delay = min(MAX_RETRY_DELAY, random.uniform(RETRY_BASE_INTERVAL, max(prev_delay, RETRY_BASE_INTERVAL) * 3))
+        return round(max(delay, floor), 1)
+    
+    def _shared_telegram_ops(self):
+        """Return a TelegramOperations reused across tasks while the client is unchanged."""
+        client = get_client()
+        key = (TelegramOperations, client)
+        if self._telegram_ops_key != key:
+            self._telegram_ops = TelegramOperations(client)
+            self._telegram_ops_key = key
+        return self._telegram_ops
+    
+    def _shared_cache_manager(self):
+        """Return one CacheManager instead of reloading the processed cache for every upload."""
+        if self._cache_manager_cls is not CacheManager:
+            self._cache_manager = CacheManager()
+            self._cache_manager_cls = CacheManager
+        return self._cache_manager
+    
     def _restore_queues(self):
         """Restore queues from persistent storage with intelligent grouping."""
         # Restore download queue
-        download_items_restored = 0
-        for item in self.download_persistent.get_items():
-            try:
-                self.download_queue.put_nowait(item)
-                download_items_restored += 1
-            except asyncio.QueueFull:
-                logger.warning("Download queue full, skipping item")
+        download_items = list(self.download_persistent.get_items())
+        self.download_queue.extend_nowait(download_items)
+        download_items_restored = len(download_items)
         
         # Restore upload queue with smart regrouping
         upload_items = list(self.upload_persistent.get_items())
@@ -463,22 +780,12 @@ class QueueManager:
             # Analyze tasks for potential regrouping
             grouped_tasks, individual_tasks = self._regroup_restored_uploads(upload_items)
             
-            # Add grouped tasks first
+            # Add grouped tasks first, then individual tasks that couldn't be grouped
             for grouped_task in grouped_tasks:
-                try:
-                    self.upload_queue.put_nowait(grouped_task)
-                    upload_items_restored += 1
-                    logger.info(f"Restored grouped task: {grouped_task.get('filename')} with {len(grouped_task.get('file_paths', []))} files")
-                except asyncio.QueueFull:
-                    logger.warning("Upload queue full, skipping grouped task")
-            
-            # Add individual tasks that couldn't be grouped
-            for item in individual_tasks:
-                try:
-                    self.upload_queue.put_nowait(item)
-                    upload_items_restored += 1
-                except asyncio.QueueFull:
-                    logger.warning("Upload queue full, skipping item")
+                logger.info(f"Restored grouped task: {grouped_task.get('filename')} with {len(grouped_task.get('file_paths', []))} files")
+            self.upload_queue.extend_nowait(grouped_tasks)
+            self.upload_queue.extend_nowait(individual_tasks)
+            upload_items_restored = len(grouped_tasks) + len(individual_tasks)
         
         # Store the counts for later task creation when event loop is available
         self._pending_download_items = download_items_restored
@@ -505,7 +812,6 @@ class QueueManager:
                 - grouped_tasks: List of tasks with is_grouped=True and multiple file_paths
                 - individual_tasks: List of tasks that should remain individual
         """
-        from .constants import PHOTO_EXTENSIONS, VIDEO_EXTENSIONS
         
         # Separate already-grouped tasks from individual tasks
         already_grouped = []
@@ -690,69 +996,48 @@ class QueueManager:
             self.upload_task = asyncio.create_task(self._process_upload_queue())
             self._pending_upload_items = 0
     
-    async def add_upload_task(self, *args, **kwargs):  # type: ignore[override]
-        if args and not isinstance(args[0], dict):
-            return await self.add_upload_task_legacy(*args, **kwargs)
-        task = args[0] if args else kwargs.get('task')
-        if not isinstance(task, dict):
-            raise TypeError('add_upload_task expects dict or legacy signature (file_path, chat_id, ...)')
-        
-        task.setdefault('id', f'ul-{int(time.time()*1000)}')
-        task.setdefault('status', 'pending')
-        task.setdefault('created_at', time.time())
-
-        filename = task.get('filename', 'unknown')
-        task_type = task.get('type', 'unknown')
-        
-        logger.info(f"Adding upload task: {filename} (type: {task_type})")
-        
-        # Check current queue state before adding
-        was_queue_empty = self.upload_queue.qsize() == 0
-        processor_was_running = self.upload_task is not None and not self.upload_task.done()
-        
-        logger.info(f"Upload queue state before adding {filename}: empty={was_queue_empty}, processor_running={processor_was_running}")
-        
-        await self.upload_queue.put(task)
-        self.upload_persistent.add_item(task)
-        
-        logger.info(f"Upload task {filename} added to queue. New queue size: {self.upload_queue.qsize()}")
-        
-        # Start processor if not running
-        if getattr(self, '_disable_upload_worker_start', False):
-            logger.info("Upload worker start disabled (test mode)")
-        elif self.upload_task is None or self.upload_task.done():
-            logger.info(f"Starting upload processor for {filename} (processor was not running)")
-            self.upload_task = asyncio.create_task(self._process_upload_queue())
-        else:
-            logger.info(f"Upload processor already running for {filename}")
-        
-        return was_queue_empty  # Return if this was the first item
-    
     async def _process_download_queue(self):
-        """Process download queue with concurrency control."""
-        logger.info("Starting download queue processor")
+        """Process download queue with concurrency control.
         
+        Runs one worker per download slot; this task is the first worker and
+        cancelling it stops the others.
+        """
+        logger.info("Starting download queue processor")
+        await self._run_workers(self._download_worker, self.download_limiter.max_limit)
+    
+    async def _run_workers(self, worker, count: int):
+        """Run count copies of a queue worker loop, the first one in this task."""
+        extra_workers = [asyncio.create_task(worker()) for _ in range(count - 1)]
+        try:
+            await worker()
+        finally:
+            for extra in extra_workers:
+                extra.cancel()
+            # Let the extras finish their cancellation before the caller moves on
+            await asyncio.gather(*extra_workers, return_exceptions=True)
+    
+    async def _download_worker(self):
+        """Take download tasks off the queue one at a time until cancelled."""
+        _in_download_worker.set(True)
         while True:
             task = None
             filename = 'unknown'
             remove_from_persistent = False
             cancelled = False
             try:
-                logger.info(f"Download processor waiting for tasks. Current queue size: {self.download_queue.qsize()}")
+                logger.debug("Download processor waiting for tasks. Current queue size: %d", self.download_queue.qsize())
                 
                 # Get next download task
                 task = await self.download_queue.get()
                 
                 filename = task.get('filename', 'unknown')
-                logger.info(f"Download processor got task: {filename}")
+                logger.debug("Download processor got task: %s", filename)
 
                 # Process with semaphore
-                logger.info(f"Acquiring download semaphore for {filename}")
-                async with self.download_semaphore:
-                    logger.info(f"Executing download task for {filename}")
+                async with self.download_limiter:
                     await self._execute_download_task(task)
                     remove_from_persistent = True
-                    logger.info(f"Completed download task for {filename}")
+                    self.download_limiter.on_success()
                 
             except asyncio.CancelledError:
                 cancelled = True
@@ -760,36 +1045,39 @@ class QueueManager:
                 break
             except Exception as e:
                 logger.error(f"Error in download queue processor: {e}")
-                import traceback
                 logger.error(f"Full traceback: {traceback.format_exc()}")
             finally:
                 if task is not None and not cancelled:
                     if remove_from_persistent:
                         self.download_persistent.remove_item(task)
-                        logger.info(f"Removed {filename} from persistent storage")
-                    else:
-                        logger.info(f"Retaining {filename} in persistent storage for retry/resume")
                     
                     self.download_queue.task_done()
-                    logger.info(f"Marked download task done for {filename}. Remaining queue size: {self.download_queue.qsize()}")
+                    # One record per finished task
+                    logger.info("Marked download task done for %s (%s). Remaining queue size: %d",
+                                filename, 'completed' if remove_from_persistent else 'kept for retry/resume',
+                                self.download_queue.qsize())
     
     async def _process_upload_queue(self):
         """Process upload queue with concurrency control and robust FloodWait handling."""
         logger.info("Starting upload queue processor")
-        
+        await self._run_workers(self._upload_worker, self.upload_limiter.max_limit)
+    
+    async def _upload_worker(self):
+        """Take upload tasks off the queue one at a time until cancelled."""
+        _in_upload_worker.set(True)
         while True:
             task = None
             filename = 'unknown'
             remove_from_persistent = False
             cancelled = False
             try:
-                logger.info(f"Upload processor waiting for tasks. Current queue size: {self.upload_queue.qsize()}")
+                logger.debug("Upload processor waiting for tasks. Current queue size: %d", self.upload_queue.qsize())
                 
                 # Get next upload task
                 task = await self.upload_queue.get()
                 
                 filename = task.get('filename', 'unknown')
-                logger.info(f"Upload processor got task: {filename}")
+                logger.debug("Upload processor got task: %s", filename)
                 task_type = task.get('type')
 
                 # Keep deferred conversions at the back until all other work is finished
@@ -799,14 +1087,13 @@ class QueueManager:
                     continue
 
                 # Process with semaphore
-                logger.info(f"Acquiring upload semaphore for {filename}")
-                async with self.upload_semaphore:
+                async with self.upload_limiter:
                     self.active_uploads += 1
                     try:
-                        logger.info(f"Executing upload task for {filename}")
                         success = await self._execute_upload_task(task)
                         remove_from_persistent = success is not False
-                        logger.info(f"Completed upload task for {filename}")
+                        if success is not False:
+                            self.upload_limiter.on_success()
                     finally:
                         self.active_uploads -= 1
                 
@@ -823,18 +1110,17 @@ class QueueManager:
                 
             except Exception as e:
                 logger.error(f"❌ Error in upload queue processor: {e}")
-                import traceback
                 logger.error(f"Full traceback: {traceback.format_exc()}")
             finally:
                 if task is not None and not cancelled:
                     if remove_from_persistent:
                         self.upload_persistent.remove_item(task)
-                        logger.info(f"Removed {filename} from persistent storage")
-                    else:
-                        logger.info(f"Retaining {filename} in persistent storage for retry/resume")
                     
                     self.upload_queue.task_done()
-                    logger.info(f"Marked upload task done for {filename}. Remaining queue size: {self.upload_queue.qsize()}")
+                    # One record per finished task
+                    logger.info("Marked upload task done for %s (%s). Remaining queue size: %d",
+                                filename, 'completed' if remove_from_persistent else 'kept for retry/resume',
+                                self.upload_queue.qsize())
     
     async def _execute_download_task(self, task: dict):
         """Execute a download task with retry mechanism."""
@@ -846,9 +1132,6 @@ class QueueManager:
             await self._execute_webdav_file_task(task)
             return
 
-        from .telegram_operations import create_download_progress_callback
-        from .constants import MAX_RETRY_ATTEMPTS, RETRY_BASE_INTERVAL
-        import time
         
         filename = task.get('filename', 'unknown')
         message = task.get('message')
@@ -866,8 +1149,7 @@ class QueueManager:
         try:
             logger.info(f"Executing download task for {filename} (attempt {retry_count + 1})")
             
-            # Initialize telegram operations
-            telegram_ops = TelegramOperations()
+            telegram_ops = self._shared_telegram_ops()
             
             # Handle status updates based on task type
             status_msg = None
@@ -948,7 +1230,8 @@ class QueueManager:
             
             # Success - update status
             elapsed = time.time() - start_time
-            size_mb = os.path.getsize(temp_path) / (1024 * 1024) if os.path.exists(temp_path) else 0
+            downloaded_bytes = _safe_size(temp_path)
+            size_mb = downloaded_bytes / (1024 * 1024)
             logger.info(f'Download completed: {filename} ({size_mb:.2f} MB) in {elapsed:.1f}s')
             
             if status_msg:
@@ -982,7 +1265,7 @@ class QueueManager:
                     'event': event if not is_restored_task else None,
                     'file_path': temp_path,
                     'filename': filename,
-                    'size_bytes': os.path.getsize(temp_path) if os.path.exists(temp_path) else 0
+                    'size_bytes': downloaded_bytes
                 }
                 
                 # Wait for compression and upload to complete before continuing
@@ -991,23 +1274,25 @@ class QueueManager:
         except Exception as e:
             retry_count += 1
             logger.error(f"Download failed for {filename} (attempt {retry_count}): {e}")
+            if isinstance(e, FloodWaitError):
+                self.download_limiter.on_backpressure(getattr(e, 'seconds', 0) or 0)
             
             if retry_count < MAX_RETRY_ATTEMPTS:
                 # Schedule retry with exponential backoff
-                retry_delay = RETRY_BASE_INTERVAL * (3 ** (retry_count - 1))
+                retry_delay = self._compute_backoff(task.get('_last_delay', RETRY_BASE_INTERVAL))
                 logger.info(f"Scheduling retry for {filename} in {retry_delay}s (attempt {retry_count + 1})")
                 
                 # Add to retry queue
-                retry_task = task.copy()
-                retry_task['retry_count'] = retry_count
-                retry_task['retry_after'] = time.time() + retry_delay
+                task['retry_count'] = retry_count
+                task['retry_after'] = time.time() + retry_delay
+                task['_last_delay'] = retry_delay
                 
-                await self._add_to_retry_queue(retry_task)
+                await self._add_to_retry_queue(task)
                 
                 # Send status update only for live tasks
                 if not is_restored_task and event and hasattr(event, 'reply'):
                     try:
-                        await event.reply(f'⚠️ Download failed for {filename}. Retrying in {retry_delay}s... (attempt {retry_count + 1}/{MAX_RETRY_ATTEMPTS})')
+                        await self._send_retry_notice(event, f'⚠️ Download failed for {filename}. Retrying in {retry_delay}s... (attempt {retry_count + 1}/{MAX_RETRY_ATTEMPTS})')
                     except Exception as reply_e:
                         logger.warning(f"Could not send retry message for {filename}: {reply_e}")
             else:
@@ -1079,7 +1364,7 @@ class QueueManager:
                     'size_bytes': item.size or 0,
                     'display_name': display_name
                 }
-                await self.download_queue.put(file_task)
+                await self._put_download_with_backpressure(file_task)
                 self.download_persistent.add_item(file_task)
                 discovered += 1
         except Exception as exc:
@@ -1121,8 +1406,6 @@ class QueueManager:
     async def _execute_webdav_file_task(self, task: dict):
         """Download an individual WebDAV file and enqueue upload processing."""
         from .webdav_client import get_webdav_client
-        from .telegram_operations import create_download_progress_callback
-        import time
 
         filename = task.get('filename', 'webdav_file')
         remote_path = task.get('remote_path')
@@ -1174,11 +1457,11 @@ class QueueManager:
                     logger.info(f"WebDAV download progress {filename}: {pct}%")
 
         resumed_from_disk = False
-        existing_bytes = os.path.getsize(temp_path) if os.path.exists(temp_path) else 0
-        if existing_bytes > 0:
+        existing_bytes = _safe_size(temp_path, None)
+        if existing_bytes:
             resumed_from_disk = True
             logger.info(f"♻️ Found existing WebDAV file on disk, resuming upload: {temp_path} ({existing_bytes} bytes)")
-        elif os.path.exists(temp_path) and existing_bytes == 0:
+        elif existing_bytes == 0:
             # Clean up empty partials before retrying to avoid disk bloat
             try:
                 os.remove(temp_path)
@@ -1202,7 +1485,7 @@ class QueueManager:
             return
 
         file_ext = os.path.splitext(temp_path)[1].lower()
-        size_bytes = os.path.getsize(temp_path) if os.path.exists(temp_path) else task.get('size_bytes', 0)
+        size_bytes = _safe_size(temp_path, task.get('size_bytes', 0))
         
         # Feed the WebDAV album batcher instead of directly queuing upload
         batcher = self.webdav_batchers.get(display_name)
@@ -1282,14 +1565,14 @@ class QueueManager:
                     f"(reason: {error_type})"
                 )
             
-            retry_task = task.copy()
-            retry_task['retry_count'] = retry_count
-            retry_task['retry_after'] = time.time() + retry_delay
-            await self._add_to_retry_queue(retry_task)
+            task['retry_count'] = retry_count
+            task['retry_after'] = time.time() + retry_delay
+            await self._add_to_retry_queue(task)
             
             if live_event:
                 try:
-                    await event.reply(
+                    await self._send_retry_notice(
+                        event,
                         f'⚠️ WebDAV download failed for {filename} ({error_type}). '
                         f'Retrying in {retry_delay}s (attempt {retry_count}/{MAX_RETRY_ATTEMPTS}).'
                     )
@@ -1322,12 +1605,6 @@ class QueueManager:
     async def _execute_upload_task(self, task: dict):
         """Execute an upload task."""
         from .media_processing import needs_video_processing, compress_video_for_telegram
-        from .utils import human_size
-        from .file_operations import compute_sha256
-        from .constants import VIDEO_EXTENSIONS, PHOTO_EXTENSIONS
-        import os
-        import asyncio
-        import time
         
         task_type = task.get('type')
         if task_type == 'deferred_conversion':
@@ -1356,19 +1633,36 @@ class QueueManager:
                 logger.info(f"❌ File not found: {filename} (no valid event to reply to)")
             
             # Schedule retry so the task isn't lost if the file becomes available later
-            retry_task = task.copy()
-            retry_task['retry_count'] = task.get('retry_count', 0) + 1
-            retry_task['retry_after'] = time.time() + RETRY_BASE_INTERVAL
-            await self._add_to_retry_queue(retry_task)
+            task['retry_count'] = task.get('retry_count', 0) + 1
+            task['retry_after'] = time.time() + RETRY_BASE_INTERVAL
+            await self._add_to_retry_queue(task)
             return
             
         try:
             logger.info(f"Executing upload task for {filename}")
             
-            # Initialize components
+            # Reuse components across tasks
             client = get_client()
-            telegram_ops = TelegramOperations(client)
-            cache_manager = CacheManager()
+            telegram_ops = self._shared_telegram_ops()
+            cache_manager = self._shared_cache_manager()
+            
+            # Get target entity
+            target = await ensure_target_entity(client)
+            target_key = self._upload_target_key(target)
+            
+            # Skip files already uploaded to this target, e.g. a requeued retry or a re-forwarded message.
+            # Hash in a worker thread; large videos would otherwise stall the event loop
+            file_hash = task.get('file_hash') or await asyncio.to_thread(compute_sha256, file_path)
+            task['file_hash'] = source_hash = file_hash
+            if (target_key, file_hash) in self._recent_hashes:
+                logger.info(f"⏭️ Skipping upload of {filename}: already uploaded to this chat (hash {file_hash[:12]})")
+                if event and hasattr(event, 'reply') and callable(getattr(event, 'reply')):
+                    try:
+                        await event.reply(f'⏭️ {filename} was already uploaded to this chat, skipping.')
+                    except Exception as e:
+                        logger.warning(f"Failed to send skip notification for {filename}: {e}")
+                await self._finish_uploaded_file(task, file_path)
+                return
             
             # Notify start of upload (only for active uploads with valid event)
             upload_msg = None
@@ -1381,9 +1675,6 @@ class QueueManager:
             else:
                 logger.info(f"📤 Uploading {filename}... (background task)")
             
-            # Get target entity
-            target = await ensure_target_entity(client)
-            
             # Check if video needs processing
             file_ext = os.path.splitext(file_path)[1].lower()
             if file_ext in VIDEO_EXTENSIONS:
@@ -1412,6 +1703,10 @@ class QueueManager:
                             logger.info(f"Video compression completed: {filename}")
                         except Exception as e:
                             logger.error(f"Error replacing compressed video: {e}")
+                        else:
+                            # The carried hash describes the original; cache the file actually sent
+                            file_hash = await asyncio.to_thread(compute_sha256, file_path)
+                            task['file_hash'] = file_hash
                     else:
                         logger.warning(f"Video compression failed for {filename}, uploading original")
                 else:
@@ -1442,11 +1737,11 @@ class QueueManager:
             )
             
             # Update cache
-            file_hash = task.get('file_hash')
-            if not file_hash:
-                file_hash = compute_sha256(file_path)
-            
-            size_bytes = os.path.getsize(file_path) if os.path.exists(file_path) else task.get('size_bytes', 0)
+            self._remember_uploaded_hash(target_key, file_hash)
+            if source_hash != file_hash:
+                # Remember the uncompressed original too, so a re-forward of it is skipped
+                self._remember_uploaded_hash(target_key, source_hash)
+            size_bytes = _safe_size(file_path, task.get('size_bytes', 0))
             await cache_manager.add_to_cache(file_hash, {
                 'filename': filename,
                 'size': size_bytes,
@@ -1462,27 +1757,7 @@ class QueueManager:
             logger.info(f"Upload completed successfully: {filename}")
             
             # Clean up file only on successful upload
-            try:
-                if file_path and os.path.exists(file_path):
-                    os.remove(file_path)
-                    logger.info(f"Cleaned up file: {file_path}")
-                for extra_path in task.get('cleanup_after_upload', []):
-                    if extra_path and os.path.exists(extra_path):
-                        try:
-                            os.remove(extra_path)
-                            logger.info(f"Cleaned up related file after upload: {extra_path}")
-                        except Exception as cleanup_extra_e:
-                            logger.warning(f"Failed to clean up related file {extra_path}: {cleanup_extra_e}")
-            except Exception as e:
-                logger.warning(f"Failed to clean up file {file_path}: {e}")
-            
-            # Check if we should clean up extraction folder
-            extraction_folder = task.get('extraction_folder')
-            if extraction_folder:
-                is_last_file = await self.extraction_cleanup_registry.mark_file_uploaded(extraction_folder)
-                if is_last_file:
-                    logger.info(f"All files uploaded from {extraction_folder}, cleaning up folder...")
-                    await self.extraction_cleanup_registry.cleanup_folder(extraction_folder)
+            await self._finish_uploaded_file(task, file_path)
             
         except FloodWaitError as e:
             # Extract wait time from FloodWaitError
@@ -1491,22 +1766,22 @@ class QueueManager:
             
             logger.warning(f"⏳ FloodWaitError for {filename}: Telegram requires waiting {wait_seconds} seconds (attempt {retry_count})")
             logger.info(f"📊 This is a rate limit from Telegram. The bot will automatically retry after the required wait time.")
-            logger.info(f"💡 Upload processor will continue with other tasks in the queue while waiting.")
+            logger.info(f"💡 Upload processor will hold new uploads until the wait has passed, then continue with the queue.")
             
             # Always retry on FloodWaitError regardless of retry count
-            # Use Telegram's required wait time + 5 second buffer
-            retry_delay = wait_seconds + 5
+            # Use Telegram's required wait time + 5 second buffer as a floor for the backoff
+            retry_delay = self._compute_backoff(task.get('_last_delay', RETRY_BASE_INTERVAL), floor=wait_seconds + 5)
             
             logger.info(f"⏰ Scheduling upload retry for {filename} in {retry_delay}s (Telegram rate limit)")
             
             # Add to retry queue with Telegram's wait time
-            retry_task = task.copy()
-            retry_task['retry_count'] = retry_count
-            retry_task['retry_after'] = time.time() + retry_delay
-            retry_task['flood_wait'] = True  # Mark as flood wait for special handling
-            retry_task['telegram_wait_seconds'] = wait_seconds
+            task['retry_count'] = retry_count
+            task['retry_after'] = time.time() + retry_delay
+            task['flood_wait'] = True  # Mark as flood wait for special handling
+            task['telegram_wait_seconds'] = wait_seconds
             
-            await self._add_to_retry_queue(retry_task)
+            await self._add_to_retry_queue(task)
+            self.upload_limiter.on_backpressure(wait_seconds)
             
             # Send informative notification only if event is available
             if event and hasattr(event, 'reply'):
@@ -1536,7 +1811,7 @@ class QueueManager:
             
             # Keep file for retry - NEVER delete on FloodWaitError
             logger.info(f"💾 Keeping file for retry after rate limit: {file_path}")
-            logger.info(f"🔄 Upload processor continuing with next task in queue...")
+            logger.info(f"🔄 Upload processor will continue with next task in queue after the wait...")
             
         except Exception as e:
             retry_count = task.get('retry_count', 0) + 1
@@ -1545,19 +1820,19 @@ class QueueManager:
             
             if retry_count < MAX_RETRY_ATTEMPTS:
                 # Schedule retry with exponential backoff
-                retry_delay = RETRY_BASE_INTERVAL * (3 ** (retry_count - 1))
+                retry_delay = self._compute_backoff(task.get('_last_delay', RETRY_BASE_INTERVAL))
                 logger.info(f"Scheduling upload retry for {filename} in {retry_delay}s")
                 
                 # Add to retry queue
-                retry_task = task.copy()
-                retry_task['retry_count'] = retry_count
-                retry_task['retry_after'] = time.time() + retry_delay
+                task['retry_count'] = retry_count
+                task['retry_after'] = time.time() + retry_delay
+                task['_last_delay'] = retry_delay
                 
-                await self._add_to_retry_queue(retry_task)
+                await self._add_to_retry_queue(task)
                 
                 # Send retry notification only if event is available
                 if event and hasattr(event, 'reply'):
-                    await event.reply(f'⚠️ Upload failed for {filename}. Retrying in {retry_delay}s... (attempt {retry_count + 1}/{MAX_RETRY_ATTEMPTS})')
+                    await self._send_retry_notice(event, f'⚠️ Upload failed for {filename}. Retrying in {retry_delay}s... (attempt {retry_count + 1}/{MAX_RETRY_ATTEMPTS})')
                 
                 # Don't clean up file - keep it for retry
                 logger.info(f"Keeping file for retry: {file_path}")
@@ -1579,12 +1854,70 @@ class QueueManager:
                 except Exception as e:
                     logger.warning(f"Failed to clean up file {file_path}: {e}")
     
+    async def _send_retry_notice(self, event, message: str) -> bool:
+        """Reply with a retry notice, at most one per chat every RETRY_NOTICE_INTERVAL seconds.
+        
+        Notices inside the window are only logged and counted; the next one sent
+        mentions them. Returns True if a reply was sent.
+        """
+        chat_id = getattr(event, 'chat_id', None)
+        now = time.monotonic()
+        last_sent, suppressed = self._retry_notices.get(chat_id, (None, 0))
+        if last_sent is not None and now - last_sent < RETRY_NOTICE_INTERVAL:
+            self._retry_notices[chat_id] = (last_sent, suppressed + 1)
+            logger.info(f"🔕 Retry notice coalesced: {message.splitlines()[0]}")
+            return False
+        
+        if suppressed:
+            message += f'\n(+{suppressed} more retries scheduled)'
+        self._retry_notices[chat_id] = (now, 0)
+        await event.reply(message)
+        return True
+    
+    @staticmethod
+    def _upload_target_key(target):
+        """Peer id of an upload target, used with the file hash to recognise repeat uploads."""
+        try:
+            return telethon_utils.get_peer_id(target)
+        except Exception:
+            return getattr(target, 'id', None)
+    
+    def _remember_uploaded_hash(self, target_key, file_hash: str):
+        """Record a file uploaded to a target, evicting the oldest beyond RECENT_UPLOAD_HASHES_MAX."""
+        key = (target_key, file_hash)
+        self._recent_hashes[key] = True
+        self._recent_hashes.move_to_end(key)
+        if len(self._recent_hashes) > RECENT_UPLOAD_HASHES_MAX:
+            self._recent_hashes.popitem(last=False)
+    
+    async def _finish_uploaded_file(self, task: dict, file_path: str):
+        """Remove an uploaded file and its related files, and release its extraction folder."""
+        try:
+            if file_path and os.path.exists(file_path):
+                # Unlinking a multi-GB video can block; do it in a worker thread
+                await asyncio.to_thread(os.remove, file_path)
+                logger.info(f"Cleaned up file: {file_path}")
+            for extra_path in task.get('cleanup_after_upload', []):
+                if extra_path and os.path.exists(extra_path):
+                    try:
+                        os.remove(extra_path)
+                        logger.info(f"Cleaned up related file after upload: {extra_path}")
+                    except Exception as cleanup_extra_e:
+                        logger.warning(f"Failed to clean up related file {extra_path}: {cleanup_extra_e}")
+        except Exception as e:
+            logger.warning(f"Failed to clean up file {file_path}: {e}")
+        
+        # Check if we should clean up extraction folder
+        extraction_folder = task.get('extraction_folder')
+        if extraction_folder:
+            is_last_file = await self.extraction_cleanup_registry.mark_file_uploaded(extraction_folder)
+            if is_last_file:
+                logger.info(f"All files uploaded from {extraction_folder}, cleaning up folder...")
+                await self.extraction_cleanup_registry.cleanup_folder(extraction_folder)
+    
     async def _execute_grouped_upload(self, task: dict):
         """Execute a grouped media upload (multiple files as one album)."""
         from .media_processing import needs_video_processing, compress_video_for_telegram
-        from .constants import VIDEO_EXTENSIONS
-        import os
-        import time
         
         logger.info(f"Executing grouped upload task: {task}")
         
@@ -1619,10 +1952,10 @@ class QueueManager:
             existing_files = existing_files[:TELEGRAM_ALBUM_MAX_FILES]
         
         try:
-            # Initialize components
+            # Reuse components across tasks
             client = get_client()
-            telegram_ops = TelegramOperations(client)
-            cache_manager = CacheManager()
+            telegram_ops = self._shared_telegram_ops()
+            cache_manager = self._shared_cache_manager()
             
             # Notify start of upload (suppress for WebDAV quiet mode)
             upload_msg = None
@@ -1774,11 +2107,12 @@ class QueueManager:
             
             # Update cache for all files
             cache_files = validated_files if upload_success else []
+            target_key = self._upload_target_key(target)
             for file_path in cache_files:
                 try:
-                    from .file_operations import compute_sha256
-                    file_hash = compute_sha256(file_path)
-                    size_bytes = os.path.getsize(file_path) if os.path.exists(file_path) else 0
+                    file_hash = await asyncio.to_thread(compute_sha256, file_path)
+                    self._remember_uploaded_hash(target_key, file_hash)
+                    size_bytes = _safe_size(file_path)
                     
                     await cache_manager.add_to_cache(file_hash, {
                         'filename': os.path.basename(file_path),
@@ -1851,22 +2185,22 @@ class QueueManager:
             
             logger.warning(f"⏳ FloodWaitError for grouped upload {filename}: Telegram requires waiting {wait_seconds} seconds (attempt {retry_count})")
             logger.info(f"📊 This is a rate limit from Telegram. The bot will automatically retry after the required wait time.")
-            logger.info(f"💡 Upload processor will continue with other tasks in the queue while waiting.")
+            logger.info(f"💡 Upload processor will hold new uploads until the wait has passed, then continue with the queue.")
             logger.info(f"📦 Grouped upload includes {len(existing_files)} files that will be preserved for retry")
             
-            # Use Telegram's required wait time + 5 second buffer
-            retry_delay = wait_seconds + 5
+            # Use Telegram's required wait time + 5 second buffer as a floor for the backoff
+            retry_delay = self._compute_backoff(task.get('_last_delay', RETRY_BASE_INTERVAL), floor=wait_seconds + 5)
             
             logger.info(f"⏰ Scheduling grouped upload retry for {filename} in {retry_delay}s (Telegram rate limit)")
             
             # Add to retry queue with Telegram's wait time
-            retry_task = task.copy()
-            retry_task['retry_count'] = retry_count
-            retry_task['retry_after'] = time.time() + retry_delay
-            retry_task['flood_wait'] = True
-            retry_task['telegram_wait_seconds'] = wait_seconds
+            task['retry_count'] = retry_count
+            task['retry_after'] = time.time() + retry_delay
+            task['flood_wait'] = True
+            task['telegram_wait_seconds'] = wait_seconds
             
-            await self._add_to_retry_queue(retry_task)
+            await self._add_to_retry_queue(task)
+            self.upload_limiter.on_backpressure(wait_seconds)
             
             # Send informative notification
             if event and hasattr(event, 'reply'):
@@ -1896,7 +2230,7 @@ class QueueManager:
             
             # Keep files for retry - do NOT delete
             logger.info(f"💾 Keeping {len(existing_files)} files for retry after rate limit")
-            logger.info(f"🔄 Upload processor continuing with next task in queue...")
+            logger.info(f"🔄 Upload processor will continue with next task in queue after the wait...")
         
         except Exception as e:
             retry_count = task.get('retry_count', 0) + 1
@@ -1905,7 +2239,6 @@ class QueueManager:
             
             # Check if this is Telegram's 10MB photo size limit error
             from .media_processing import is_telegram_photo_size_error, compress_image_for_telegram, is_ffprobe_available
-            from .constants import PHOTO_EXTENSIONS
             
             # Check if task was already compressed to avoid infinite loops
             already_compressed = task.get('compressed', False)
@@ -1970,13 +2303,12 @@ class QueueManager:
                     logger.info(f"✅ Found {len(valid_files)} valid video files out of {len(existing_files)}")
                     
                     # Retry with only valid files
-                    retry_task = task.copy()
-                    retry_task['file_paths'] = valid_files
-                    retry_task['retry_count'] = retry_count
-                    retry_task['retry_after'] = time.time() + 10  # Short delay
-                    retry_task['validated'] = True  # Mark as validated to avoid re-validation
+                    task['file_paths'] = valid_files
+                    task['retry_count'] = retry_count
+                    task['retry_after'] = time.time() + 10  # Short delay
+                    task['validated'] = True  # Mark as validated to avoid re-validation
                     
-                    await self._add_to_retry_queue(retry_task)
+                    await self._add_to_retry_queue(task)
                     
                     if event and hasattr(event, 'reply'):
                         await event.reply(f'🔧 Validated {len(valid_files)} video files. Retrying upload...')
@@ -2058,13 +2390,12 @@ class QueueManager:
                     # Update the task with compressed files and retry immediately
                     logger.info(f"✅ Successfully compressed all images, retrying upload with {len(compressed_files)} compressed files")
                     
-                    retry_task = task.copy()
-                    retry_task['file_paths'] = compressed_files
-                    retry_task['retry_count'] = retry_count
-                    retry_task['retry_after'] = time.time() + 5  # Short delay
-                    retry_task['compressed'] = True  # Mark as already compressed
+                    task['file_paths'] = compressed_files
+                    task['retry_count'] = retry_count
+                    task['retry_after'] = time.time() + 5  # Short delay
+                    task['compressed'] = True  # Mark as already compressed
                     
-                    await self._add_to_retry_queue(retry_task)
+                    await self._add_to_retry_queue(task)
                     
                     if event and hasattr(event, 'reply'):
                         await event.reply(f'🗜️ Compressed {len(compressed_files)} images. Retrying upload...')
@@ -2090,18 +2421,18 @@ class QueueManager:
                     return
                 else:
                     # Schedule retry with exponential backoff
-                    retry_delay = RETRY_BASE_INTERVAL * (3 ** (retry_count - 1))
+                    retry_delay = self._compute_backoff(task.get('_last_delay', RETRY_BASE_INTERVAL))
                     logger.info(f"Scheduling grouped upload retry for {filename} in {retry_delay}s")
                     
                     # Add to retry queue
-                    retry_task = task.copy()
-                    retry_task['retry_count'] = retry_count
-                    retry_task['retry_after'] = time.time() + retry_delay
+                    task['retry_count'] = retry_count
+                    task['retry_after'] = time.time() + retry_delay
+                    task['_last_delay'] = retry_delay
                     
-                    await self._add_to_retry_queue(retry_task)
+                    await self._add_to_retry_queue(task)
                     
                     if event and hasattr(event, 'reply'):
-                        await event.reply(f'⚠️ Upload failed for {filename}. Retrying in {retry_delay}s... (attempt {retry_count + 1}/{MAX_RETRY_ATTEMPTS})')
+                        await self._send_retry_notice(event, f'⚠️ Upload failed for {filename}. Retrying in {retry_delay}s... (attempt {retry_count + 1}/{MAX_RETRY_ATTEMPTS})')
                     
                     # Keep files for retry
                     logger.info(f"Keeping {len(existing_files)} files for retry")
@@ -2123,7 +2454,6 @@ class QueueManager:
     async def _execute_deferred_conversion(self, task: dict):
         """Process a deferred conversion task after all normal work is done."""
         from .media_processing import convert_video_for_recovery
-        import shutil
 
         original_path = task.get('file_path')
         filename = task.get('filename') or (os.path.basename(original_path) if original_path else 'unknown')
@@ -2158,7 +2488,7 @@ class QueueManager:
             'type': 'direct_media',
             'filename': os.path.basename(converted_path),
             'file_path': converted_path,
-            'size_bytes': os.path.getsize(converted_path) if os.path.exists(converted_path) else 0,
+            'size_bytes': _safe_size(converted_path),
             'archive_name': archive_name,
             'extraction_folder': extraction_folder,
             'event': None,  # Background task to avoid serialization issues
@@ -2173,7 +2503,7 @@ class QueueManager:
 
     async def _defer_incompatible_videos(self, task: dict, file_paths: list) -> bool:
         """Split compatible/incompatible videos and queue deferred conversions."""
-        from .media_processing import is_telegram_compatible_video
+        from .media_processing import is_telegram_compatible_video, probe_videos_async
 
         if not DEFERRED_VIDEO_CONVERSION:
             return False
@@ -2181,6 +2511,9 @@ class QueueManager:
         compatible_files = []
         incompatible_files = []
 
+        # Probe the batch concurrently up front so the per-file checks below hit the probe cache
+        await probe_videos_async([p for p in file_paths if p and os.path.exists(p)])
+
         for file_path in file_paths:
             if not file_path or not os.path.exists(file_path):
                 continue
@@ -2264,6 +2597,10 @@ class QueueManager:
                 await self.upload_task
             except asyncio.CancelledError:
                 pass
+        
+        # Write out any coalesced queue changes before shutdown
+        self.download_persistent.flush()
+        self.upload_persistent.flush()
     
     def clear_all_queues(self):
         """Clear all queues and persistent storage."""
@@ -2344,28 +2681,44 @@ class QueueManager:
         """
         logger.debug("stop_processing() called (legacy compatibility method)")
         await self.stop_all_tasks()
+
+    def _iter_serialized(self, tasks):
+        """
+        Yield JSON-ready copies of queued tasks. Document serializations are reused
+        from the previous snapshot; only documents still queued are remembered.
+        """
+        previous = self._serialized_docs
+        current = {}
+        for task in tasks:
+            item = task.copy() if isinstance(task, dict) else {}
+            # Serialize document if present
+            doc = item.get('document')
+            if doc is not None:
+                cached = previous.get(id(doc))
+                if cached is None or cached[0] is not doc:
+                    cached = (doc, make_serializable(doc))
+                current[id(doc)] = cached
+                item['document'] = cached[1]
+            yield item
+        self._serialized_docs = current
+
     def _queue_to_json_data(self):  # test helper
-        from .cache_manager import make_serializable
-        download_items = []
         # Extract current items without consuming queue (internal structure)
         try:
             dq_list = list(self.download_queue._queue)  # type: ignore
         except Exception:
             dq_list = []
-        for task in dq_list:
-            item = task.copy() if isinstance(task, dict) else {}
-            # Serialize document if present
-            doc = item.get('document')
-            if doc is not None:
-                item['document'] = make_serializable(doc)
-            download_items.append(item)
         return {
-            'download_queue': download_items,
+            'download_queue': list(self._iter_serialized(dq_list)),
             'upload_queue': []  # not needed for current tests
         }
 
     async def get_queue_stats(self):  # asynchronous interface expected by tests
         def _count(q, status):
+            # Queues kept their counts as tasks went in and out; scan only queues that don't
+            status_counts = getattr(q, 'status_counts', None)
+            if status_counts is not None:
+                return status_counts.get(status, 0)
             try:
                 return sum(1 for t in q._queue if isinstance(t, dict) and t.get('status') == status)  # type: ignore
             except Exception:
@@ -2462,7 +2815,7 @@ class QueueManager:
         if 'temp_path' in task and 'output_path' not in task:
             task['output_path'] = task['temp_path']
         
-        await self.download_queue.put(task)
+        await self._put_download_with_backpressure(task)
         self.download_persistent.add_item(task)
         
         logger.info(f"Task {filename} added to queue. New queue size: {self.download_queue.qsize()}")
@@ -2478,6 +2831,36 @@ class QueueManager:
         
         return was_queue_empty  # Return if this was the first item
 
+    async def _put_download_with_backpressure(self, task: dict):
+        """
+        Queue a download, applying DOWNLOAD_QUEUE_FULL_POLICY when the queue is full.
+        Download workers (e.g. a WebDAV walk) always enqueue at once: waiting on the
+        queue they drain would deadlock.
+        """
+        if not self.download_queue.full() or _in_download_worker.get():
+            self.download_queue.put_nowait(task)
+            return
+        
+        filename = task.get('filename', 'unknown')
+        if DOWNLOAD_QUEUE_FULL_POLICY == 'fail':
+            raise asyncio.QueueFull(f"Download queue is full ({self.download_queue.maxsize} tasks), rejected {filename}")
+        
+        # Make sure something is draining the queue before waiting on it
+        if (self.download_task is None or self.download_task.done()) and \
+                not getattr(self, '_disable_download_worker_start', False):
+            self.download_task = asyncio.create_task(self._process_download_queue())
+        
+        logger.info(f"⏳ Download queue full ({self.download_queue.maxsize} tasks), waiting to queue {filename}")
+        if DOWNLOAD_QUEUE_FULL_POLICY == 'timeout':
+            try:
+                await asyncio.wait_for(self.download_queue.put(task), DOWNLOAD_QUEUE_PUT_TIMEOUT)
+            except asyncio.TimeoutError:
+                raise asyncio.QueueFull(
+                    f"Download queue still full after {DOWNLOAD_QUEUE_PUT_TIMEOUT}s, rejected {filename}"
+                ) from None
+        else:
+            await self.download_queue.put(task)
+
     async def add_upload_task(self, *args, **kwargs):  # type: ignore[override]
         if args and not isinstance(args[0], dict):
             return await self.add_upload_task_legacy(*args, **kwargs)
@@ -2486,17 +2869,15 @@ class QueueManager:
             raise TypeError('add_upload_task expects dict or legacy signature (file_path, chat_id, ...)')
         
         filename = task.get('filename', 'unknown')
-        task_type = task.get('type', 'unknown')
-        
-        logger.info(f"Adding upload task: {filename} (type: {task_type})")
         
         # Check current queue state before adding
         was_queue_empty = self.upload_queue.qsize() == 0
-        processor_was_running = self.upload_task is not None and not self.upload_task.done()
-        
-        logger.info(f"Upload queue state before adding {filename}: empty={was_queue_empty}, processor_running={processor_was_running}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Adding upload task: %s (type: %s), queue empty=%s, processor running=%s",
+                         filename, task.get('type', 'unknown'), was_queue_empty,
+                         self.upload_task is not None and not self.upload_task.done())
         
-        await self.upload_queue.put(task)
+        await self._put_upload_with_backpressure(task)
         self.upload_persistent.add_item(task)
         
         logger.info(f"Upload task {filename} added to queue. New queue size: {self.upload_queue.qsize()}")
@@ -2508,10 +2889,46 @@ class QueueManager:
             logger.info(f"Starting upload processor for {filename} (processor was not running)")
             self.upload_task = asyncio.create_task(self._process_upload_queue())
         else:
-            logger.info(f"Upload processor already running for {filename}")
+            logger.debug("Upload processor already running for %s", filename)
         
         return was_queue_empty  # Return if this was the first item
 
+    async def _put_upload_with_backpressure(self, task: dict):
+        """Queue an upload, waiting for room when the queue is full (never inside an upload worker)."""
+        if not self.upload_queue.full() or _in_upload_worker.get():
+            self.upload_queue.put_nowait(task)
+            return
+        
+        # Make sure something is draining the queue before waiting on it
+        if (self.upload_task is None or self.upload_task.done()) and \
+                not getattr(self, '_disable_upload_worker_start', False):
+            self.upload_task = asyncio.create_task(self._process_upload_queue())
+        
+        logger.info(f"⏳ Upload queue full ({self.upload_queue.maxsize} tasks), waiting to queue {task.get('filename', 'unknown')}")
+        await self.upload_queue.put(task)
+
+    async def add_upload_tasks_batch(self, tasks: list):
+        """Queue several upload tasks at once, persisting them with a single write."""
+        if not tasks:
+            return False
+        
+        was_queue_empty = self.upload_queue.qsize() == 0
+        # Persist first: a large batch may wait below for the upload workers to make room
+        self.upload_persistent.add_items(tasks)
+        for task in tasks:
+            await self._put_upload_with_backpressure(task)
+        
+        logger.info(f"Added {len(tasks)} upload tasks to queue. New queue size: {self.upload_queue.qsize()}")
+        
+        # Start processor if not running
+        if getattr(self, '_disable_upload_worker_start', False):
+            logger.info("Upload worker start disabled (test mode)")
+        elif self.upload_task is None or self.upload_task.done():
+            logger.info("Starting upload processor for batch (processor was not running)")
+            self.upload_task = asyncio.create_task(self._process_upload_queue())
+        
+        return was_queue_empty
+
     async def _wait_for_upload_idle(self):
         """Wait until the upload queue and worker are idle."""
         if getattr(self, '_skip_upload_idle_wait', False):
@@ -2565,44 +2982,24 @@ class QueueManager:
     
     async def _add_to_retry_queue(self, task: dict):
         """Add a failed task to the retry queue."""
-        from .cache_manager import make_serializable
-        import json
-        
-        # Load existing retry queue
-        retry_queue = []
-        if os.path.exists(self.retry_queue_file):
-            try:
-                with open(self.retry_queue_file, 'r') as f:
-                    retry_queue = json.load(f)
-            except Exception as e:
-                logger.error(f"Failed to load retry queue: {e}")
-        
-        # Add new task (make it serializable)
-        serializable_task = make_serializable(task)
-        retry_queue.append(serializable_task)
         
-        # Save updated retry queue
         try:
-            with open(self.retry_queue_file, 'w') as f:
-                json.dump(retry_queue, f, indent=2)
+            # File I/O runs in a worker thread so retry bookkeeping doesn't stall the loop
+            await asyncio.to_thread(append_retry_task, self.retry_queue_file, task)
             logger.info(f"Added task to retry queue: {task.get('filename')}")
         except Exception as e:
             logger.error(f"Failed to save retry queue: {e}")
     
     async def process_retry_queue(self):
         """Process tasks from the retry queue."""
-        import json
-        import time
-        
-        if not os.path.exists(self.retry_queue_file):
-            return
         
         try:
-            with open(self.retry_queue_file, 'r') as f:
-                retry_queue = json.load(f)
+            retry_queue, log_offset = await asyncio.to_thread(load_retry_tasks, self.retry_queue_file)
         except Exception as e:
             logger.error(f"Failed to load retry queue: {e}")
             return
+        if not retry_queue:
+            return
         
         current_time = time.time()
         remaining_tasks = []
@@ -2624,10 +3021,12 @@ class QueueManager:
                         await self.add_upload_task(task)
                     else:
                         # Processing task
-                        from . import queue_manager as qm
-                        processing_queue = qm.get_processing_queue()
+                        processing_queue = get_processing_queue()
                         await processing_queue.add_processing_task(task)
                         
+                except asyncio.QueueFull as e:
+                    logger.warning(f"⏳ Retry of {filename} postponed, queue is full: {e}")
+                    remaining_tasks.append(task)
                 except Exception as e:
                     logger.error(f"Failed to retry task {filename}: {e}")
                     remaining_tasks.append(task)
@@ -2635,13 +3034,9 @@ class QueueManager:
                 # Not ready to retry yet
                 remaining_tasks.append(task)
         
-        # Update retry queue file
+        # Compact the retry log to the tasks still waiting
         try:
-            with open(self.retry_queue_file, 'w') as f:
-                # Make sure remaining tasks are serializable
-                from .cache_manager import make_serializable
-                serializable_tasks = make_serializable(remaining_tasks)
-                json.dump(serializable_tasks, f, indent=2)
+            await asyncio.to_thread(rewrite_retry_tasks, self.retry_queue_file, remaining_tasks, log_offset)
         except Exception as e:
             logger.error(f"Failed to update retry queue: {e}")
 
@@ -2653,7 +3048,6 @@ class QueueManager:
         extractor = None
 
         try:
-            from .constants import MEDIA_EXTENSIONS, PHOTO_EXTENSIONS, VIDEO_EXTENSIONS
             extractor = StreamingExtractor(
                 archive_path=temp_archive_path,
                 temp_dir=os.path.dirname(temp_archive_path),
@@ -2715,7 +3109,6 @@ class QueueManager:
         
         try:
             # Create extraction directory
-            import time
             
             # Check if this is a Torbox file (file exists in TORBOX_DIR)
             is_torbox_file = temp_archive_path and TORBOX_DIR in temp_archive_path
@@ -2731,8 +3124,8 @@ class QueueManager:
             
             # Extract the archive using extract_archive_async
             from .file_operations import extract_archive_async
-            loop = asyncio.get_event_loop()
-            success, error_msg = await loop.run_in_executor(None, extract_archive_async, temp_archive_path, extract_path, filename)
+            success, error_msg = await asyncio.get_running_loop().run_in_executor(
+                _EXTRACT_POOL, extract_archive_async, temp_archive_path, extract_path, filename)
             
             if not success:
                 await self._handle_extraction_failure(
@@ -2744,22 +3137,14 @@ class QueueManager:
                 )
                 return
             
-            # Find extracted media files
-            from .constants import MEDIA_EXTENSIONS
-            extracted_files = []
-            for root, dirs, files in os.walk(extract_path):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    file_ext = os.path.splitext(file)[1].lower()
-                    if file_ext in MEDIA_EXTENSIONS:
-                        extracted_files.append(file_path)
+            # Find extracted media files off the event loop so queued uploads keep running
+            extracted_files = [entry.path for entry in await asyncio.to_thread(_scan_media_files, extract_path)]
             
             if not extracted_files:
                 logger.warning(f"No media files extracted from {filename}")
                 # Clean up extraction directory if no media files
                 try:
-                    import shutil
-                    shutil.rmtree(extract_path, ignore_errors=True)
+                    await asyncio.to_thread(shutil.rmtree, extract_path, ignore_errors=True)
                 except Exception:
                     pass
                 return
@@ -2767,16 +3152,15 @@ class QueueManager:
             logger.info(f"Extracted {len(extracted_files)} media files from {filename}")
             
             # Batch files by type for grouped upload (reduces rate limiting)
-            from .constants import PHOTO_EXTENSIONS, VIDEO_EXTENSIONS
             
             image_files = []
             video_files = []
             
             for extracted_file in extracted_files:
-                file_ext = os.path.splitext(extracted_file)[1].lower()
-                if file_ext in PHOTO_EXTENSIONS:
+                file_ext = _file_ext(extracted_file)
+                if file_ext in _PHOTO_EXTS:
                     image_files.append(extracted_file)
-                elif file_ext in VIDEO_EXTENSIONS:
+                elif file_ext in _VIDEO_EXTS:
                     video_files.append(extracted_file)
             
             logger.info(f"Grouped files: {len(image_files)} images, {len(video_files)} videos")
@@ -2871,7 +3255,6 @@ class QueueManager:
         
         except Exception as e:
             logger.error(f"Error during extraction and upload processing for {filename}: {e}")
-            import traceback
             logger.error(traceback.format_exc())
             if event:
                 await event.reply(f"❌ Error processing {filename}: {e}")
@@ -2898,8 +3281,7 @@ class QueueManager:
         # Clean up extraction directory if it exists
         if extract_path and os.path.exists(extract_path):
             try:
-                import shutil
-                shutil.rmtree(extract_path, ignore_errors=True)
+                await asyncio.to_thread(shutil.rmtree, extract_path, ignore_errors=True)
                 logger.info(f"🧹 Removed extraction directory: {extract_path}")
             except Exception as cleanup_error:
                 logger.warning(f"Failed to clean extraction folder {extract_path}: {cleanup_error}")
@@ -3028,8 +3410,6 @@ class QueueManager:
     async def _validate_video_file(self, file_path: str) -> bool:
         """Validate video file format and metadata."""
         try:
-            import subprocess
-            import json
             
             # First check: basic file info
             if not os.path.exists(file_path):
@@ -3104,7 +3484,6 @@ class QueueManager:
             
             # Basic validation fallback - check file extension and size
             file_ext = os.path.splitext(file_path)[1].lower()
-            from .constants import VIDEO_EXTENSIONS
             
             if file_ext not in VIDEO_EXTENSIONS:
                 logger.error(f"Unsupported video extension: {file_path} ({file_ext})")
@@ -3142,8 +3521,7 @@ class QueueManager:
                 file_size = os.path.getsize(file_path)
                 
                 # Create hash for cache
-                from .file_operations import compute_sha256
-                file_hash = compute_sha256(file_path)
+                file_hash = await asyncio.to_thread(compute_sha256, file_path)
                 
                 individual_task = {
                     'type': 'direct_media',
@@ -3181,13 +3559,13 @@ class QueueManager:
         Returns:
             Number of files removed
         """
-        import shutil
         
         removed_count = 0
         cutoff_time = time.time() - (max_age_hours * 3600)
         protected_names = {
             'processed_archives.json', 'download_queue.json', 'upload_queue.json',
-            'retry_queue.json', 'current_process.json'
+            'retry_queue.json', 'retry_queue.json.log', 'current_process.json',
+            'ffprobe_cache.sqlite', 'ffprobe_cache.sqlite-wal', 'ffprobe_cache.sqlite-shm'
         }
         
         try:
@@ -3225,7 +3603,6 @@ class QueueManager:
         Returns:
             List of removed directory paths
         """
-        import shutil
         
         removed_dirs = []
         
@@ -3264,18 +3641,41 @@ class QueueManager:
 class ProcessingQueue:
     """Manages the main processing queue for extracted files."""
     
-    def __init__(self):
+    def __init__(self, worker_count: int = None):
         self.processing_queue = asyncio.Queue()
-        self.processing_task = None
         self.current_processing = None
+        # Fixed pool of long-lived consumers instead of a task-per-item + semaphore.
+        # Memory scales with in-flight work, and FIFO order is preserved.
+        self.worker_count = max(1, worker_count if worker_count is not None else MAX_CONCURRENT)
+        self._workers = []
+        self._busy_workers = {}
         
     async def add_processing_task(self, task: dict):
         """Add a task to the processing queue."""
         await self.processing_queue.put(task)
         
-        # Start processor if not running
-        if self.processing_task is None or self.processing_task.done():
-            self.processing_task = asyncio.create_task(self._process_queue())
+        # Start workers if not running
+        self._ensure_workers()
+    
+    def _ensure_workers(self):
+        """Spawn consumers until the pool matches worker_count."""
+        self._workers = [w for w in self._workers if not w.done()]
+        while len(self._workers) < self.worker_count:
+            self._workers.append(asyncio.create_task(self._worker()))
+    
+    def set_worker_count(self, count: int):
+        """Resize the worker pool. Idle workers are retired immediately, busy ones after their current task."""
+        self.worker_count = max(1, int(count))
+        self._workers = [w for w in self._workers if not w.done()]
+        excess = len(self._workers) - self.worker_count
+        if excess > 0:
+            idle = [w for w in self._workers if w not in self._busy_workers]
+            for worker in idle[:excess]:
+                worker.cancel()
+                self._workers.remove(worker)
+        elif self._workers:
+            self._ensure_workers()
+        logger.info(f"Processing queue worker count set to {self.worker_count}")
     
     def get_queue_size(self) -> int:
         """Return the current size of the processing queue."""
@@ -3285,42 +3685,43 @@ class ProcessingQueue:
         """Return the task currently being processed."""
         return self.current_processing
     
-    async def _process_queue(self):
-        """Process the main processing queue."""
-        logger.info("Starting main processing queue")
+    async def _worker(self):
+        """Consume tasks from the processing queue until cancelled or retired."""
+        me = asyncio.current_task()
+        logger.info("Starting main processing queue worker")
         
         while True:
             try:
                 # Get next processing task
                 task = await self.processing_queue.get()
-                self.current_processing = task
-                
+            except asyncio.CancelledError:
+                logger.info("Processing queue worker cancelled")
+                break
+            
+            self._busy_workers[me] = task
+            self.current_processing = task
+            try:
                 # Execute the task
                 await self._execute_processing_task(task)
-                
-                self.current_processing = None
-                self.processing_queue.task_done()
-                
             except asyncio.CancelledError:
-                logger.info("Processing queue cancelled")
+                logger.info("Processing queue worker cancelled")
                 break
             except Exception as e:
                 logger.error(f"Error in processing queue: {e}")
-                self.current_processing = None
-                continue
+            finally:
+                self._busy_workers.pop(me, None)
+                if self.current_processing is task:
+                    self.current_processing = None
+                self.processing_queue.task_done()
+            
+            # Retire if the pool was shrunk while this worker was busy
+            if len(self._workers) > self.worker_count and me in self._workers:
+                self._workers.remove(me)
+                logger.info("Processing queue worker retired after pool resize")
+                break
     
     async def _execute_processing_task(self, task: dict):
         """Execute a processing task (extraction and upload) with retry mechanism."""
-        from .file_operations import extract_archive_async, compute_sha256
-        from .media_processing import needs_video_processing, compress_video_for_telegram
-        from .telegram_operations import TelegramOperations, ensure_target_entity
-        from .cache_manager import CacheManager
-        from .constants import MAX_RETRY_ATTEMPTS, RETRY_BASE_INTERVAL, MEDIA_EXTENSIONS, PHOTO_EXTENSIONS, VIDEO_EXTENSIONS
-        import os
-        import shutil
-        import asyncio
-        import time
-        
         task_type = task.get('type')
         filename = task.get('filename', 'unknown')
         retry_count = task.get('retry_count', 0)
@@ -3353,15 +3754,16 @@ class ProcessingQueue:
             
             if retry_count < MAX_RETRY_ATTEMPTS:
                 # Schedule retry with exponential backoff
-                retry_delay = RETRY_BASE_INTERVAL * (3 ** (retry_count - 1))
+                retry_delay = QueueManager._compute_backoff(task.get('_last_delay', RETRY_BASE_INTERVAL))
                 logger.info(f"Scheduling processing retry for {filename} in {retry_delay}s")
                 
                 # Add to retry queue
-                retry_task = task.copy()
-                retry_task['retry_count'] = retry_count
-                retry_task['retry_after'] = time.time() + retry_delay
+                task['retry_count'] = retry_count
+                task['retry_after'] = time.time() + retry_delay
+                task['_last_delay'] = retry_delay
                 
-                await self._add_to_retry_queue(retry_task)
+                # The retry queue lives on the QueueManager
+                await get_queue_manager()._add_to_retry_queue(task)
                 
                 event = task.get('event')
                 if event:
@@ -3375,9 +3777,6 @@ class ProcessingQueue:
 
     async def _process_streaming_archive(self, task: dict):
         """Stream archive extraction to minimize disk usage."""
-        import time
-        import shutil
-        from .constants import MEDIA_EXTENSIONS, PHOTO_EXTENSIONS, VIDEO_EXTENSIONS
         
         temp_archive_path = task.get('temp_archive_path')
         filename = task.get('filename')
@@ -3406,7 +3805,8 @@ class ProcessingQueue:
             min_free_bytes=min_free_bytes,
             check_interval=STREAMING_LOW_SPACE_CHECK_INTERVAL
         )
-        batch_builder = StreamingBatchBuilder(self, extractor, event, filename)
+        queue_manager = get_queue_manager()
+        batch_builder = StreamingBatchBuilder(queue_manager, extractor, event, filename, temp_archive_path)
         processed = 0
         try:
             async for entry in extractor.stream_entries(event):
@@ -3418,7 +3818,7 @@ class ProcessingQueue:
                     except Exception as exc:
                         logger.debug(f"Skipping streaming progress message: {exc}")
             await batch_builder.flush()
-            await self._wait_for_upload_idle()
+            await queue_manager._wait_for_upload_idle()
             extractor.finalize()
             if processed == 0:
                 msg = f'ℹ️ No media files found in {filename}'
@@ -3430,7 +3830,7 @@ class ProcessingQueue:
                 except Exception as exc:
                     logger.warning(f"Failed to send streaming completion message: {exc}")
         except Exception as exc:
-            await self._handle_extraction_failure(
+            await queue_manager._handle_extraction_failure(
                 filename=filename,
                 error_msg=str(exc),
                 temp_archive_path=temp_archive_path,
@@ -3445,15 +3845,13 @@ class ProcessingQueue:
             except Exception as cleanup_error:
                 logger.warning(f"Could not remove archive {temp_archive_path}: {cleanup_error}")
             try:
-                shutil.rmtree(extract_path, ignore_errors=True)
+                await asyncio.to_thread(shutil.rmtree, extract_path, ignore_errors=True)
             except Exception as cleanup_error:
                 logger.warning(f"Failed to clean streaming directory {extract_path}: {cleanup_error}")
 
     async def _process_archive_extraction(self, task: dict):
         """Process archive extraction and media upload."""
         from .file_operations import extract_archive_async
-        from .utils import human_size
-        import tempfile
         
         temp_archive_path = task.get('temp_archive_path')
         filename = task.get('filename')
@@ -3472,16 +3870,17 @@ class ProcessingQueue:
         if is_torbox_file:
             logger.info(f"🗂️ Creating Torbox extraction directory: {extract_path}")
         
+        extraction_queued = False
         try:
             # Update status
             await event.reply(f'📦 Extracting {filename}...')
             
             # Extract archive
-            loop = asyncio.get_event_loop()
-            success, error_msg = await loop.run_in_executor(None, extract_archive_async, temp_archive_path, extract_path, filename)
+            success, error_msg = await asyncio.get_running_loop().run_in_executor(
+                _EXTRACT_POOL, extract_archive_async, temp_archive_path, extract_path, filename)
             
             if not success:
-                await self._handle_extraction_failure(
+                await get_queue_manager()._handle_extraction_failure(
                     filename=filename,
                     error_msg=error_msg,
                     temp_archive_path=temp_archive_path,
@@ -3490,14 +3889,8 @@ class ProcessingQueue:
                 )
                 return
             
-            # Find media files
-            media_files = []
-            for root, dirs, files in os.walk(extract_path):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    file_ext = os.path.splitext(file)[1].lower()
-                    if file_ext in MEDIA_EXTENSIONS:
-                        media_files.append(file_path)
+            # Find media files off the event loop so queued uploads keep running
+            media_files = await asyncio.to_thread(_scan_media_files, extract_path)
             
             if not media_files:
                 await event.reply(f'ℹ️ No media files found in {filename}')
@@ -3505,21 +3898,22 @@ class ProcessingQueue:
             
             await event.reply(f'📤 Found {len(media_files)} media files. Starting upload...')
             
-            # Process and upload media files
-            for media_file in media_files:
-                media_filename = os.path.basename(media_file)
-                
-                # Add each media file to upload queue
-                upload_task = {
-                    'type': 'extracted_media',
-                    'event': event,
-                    'file_path': media_file,
-                    'filename': media_filename,
-                    'archive_name': filename,
-                    'size_bytes': os.path.getsize(media_file)
-                }
-                
-                await self.add_upload_task(upload_task)
+            # Queue all media files for upload in one batch
+            upload_tasks = [{
+                'type': 'extracted_media',
+                'event': event,
+                'file_path': media_file.path,
+                'filename': media_file.name,
+                'archive_name': filename,
+                'extraction_folder': extract_path,
+                'size_bytes': media_file.stat().st_size
+            } for media_file in media_files]
+            
+            # The upload workers remove the folder once its last file is uploaded
+            queue_manager = get_queue_manager()
+            await queue_manager.extraction_cleanup_registry.register_extraction(extract_path, len(upload_tasks))
+            await queue_manager.add_upload_tasks_batch(upload_tasks)
+            extraction_queued = True
             
             await event.reply(f'✅ Queued {len(media_files)} media files from {filename} for upload')
             
@@ -3528,7 +3922,8 @@ class ProcessingQueue:
             try:
                 if os.path.exists(temp_archive_path):
                     os.remove(temp_archive_path)
-                shutil.rmtree(extract_path, ignore_errors=True)
+                if not extraction_queued:
+                    await asyncio.to_thread(shutil.rmtree, extract_path, ignore_errors=True)
             except Exception as e:
                 logger.warning(f"Cleanup error for {filename}: {e}")
     
@@ -3550,7 +3945,7 @@ class ProcessingQueue:
             'size_bytes': os.path.getsize(file_path)
         }
         
-        await self.add_upload_task(upload_task)
+        await get_queue_manager().add_upload_task(upload_task)
     
     def get_current_processing(self):
         """Get currently processing task."""
@@ -3568,8 +3963,6 @@ class ProcessingQueue:
             max_age_hours: Remove files older than this many hours (default 24)
             dry_run: If True, only log what would be deleted without actually deleting
         """
-        import time
-        import shutil
         
         current_time = time.time()
         max_age_seconds = max_age_hours * 3600
@@ -3645,7 +4038,6 @@ class ProcessingQueue:
 
     async def cleanup_failed_upload_files(self):
         """Clean up files that failed to upload and are stuck in the system."""
-        from .constants import TORBOX_DIR, DATA_DIR
         
         # Get list of files in upload queue to avoid deleting active files
         active_files = set()
@@ -3696,7 +4088,6 @@ class ProcessingQueue:
             
             for dir_path in orphaned_dirs:
                 try:
-                    import shutil
                     dir_size = sum(os.path.getsize(os.path.join(dirpath, filename))
                                  for dirpath, dirnames, filenames in os.walk(dir_path)
                                  for filename in filenames)
@@ -3712,13 +4103,17 @@ class ProcessingQueue:
     
     async def cancel_current_processing(self):
         """Cancel current processing task."""
-        if self.processing_task and not self.processing_task.done():
-            self.processing_task.cancel()
+        busy = [w for w in self._busy_workers if not w.done()]
+        for worker in busy:
+            worker.cancel()
+        for worker in busy:
             try:
-                await self.processing_task
+                await worker
             except asyncio.CancelledError:
                 pass
-            self.current_processing = None
+            if worker in self._workers:
+                self._workers.remove(worker)
+        self.current_processing = None
 
 
 # Global instances
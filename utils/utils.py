@@ -3,8 +3,31 @@ General utility functions for the Telegram Compressed File Extractor.
 """
 
 import logging
+import shutil
 from datetime import datetime, timedelta
 
+# External tools looked up on PATH, with alternative executable names in order of preference
+_BINARY_CANDIDATES = {
+    '7z': ('7z', '7za'),
+    'unrar': ('unrar',),
+    'ffmpeg': ('ffmpeg',),
+    'ffprobe': ('ffprobe',),
+    'file': ('file',),
+    'jpegtran': ('jpegtran',),
+}
+
+
+def _which_any(names) -> str:
+    for name in names:
+        path = shutil.which(name)
+        if path:
+            return path
+    return None
+
+
+# Resolved once at import instead of walking PATH on every call
+BINARIES = {key: _which_any(names) for key, names in _BINARY_CANDIDATES.items()}
+
 
 def human_size(num_bytes: int) -> str:
     """Convert bytes to human readable format."""
@@ -59,3 +82,16 @@ def setup_logger(name: str, log_file: str) -> logging.Logger:
 def get_bot_start_time() -> datetime:
     """Get the bot start time."""
     return datetime.now()
+
+
+def resolve_binary(name: str) -> str:
+    """Return the path of an external tool, or None if it is not installed.
+    
+    Missing tools are looked up again on each call so one installed while
+    the bot is running is picked up.
+    """
+    path = BINARIES.get(name)
+    if path is None:
+        path = _which_any(_BINARY_CANDIDATES.get(name, (name,)))
+        BINARIES[name] = path
+    return path